@@ -1,36 +1,43 @@
-import pyodbc
 from flask import Blueprint, jsonify, request
-from config import DB_CONFIG
+import queries
+from db import get_db_connection
+from pagination import parse_list_args, fetch_page, rows_response
+from streaming import stream_format, stream_rows
+from bulk import parse_bulk_body, run_bulk_insert
+from cache import cached, invalidate
+from cascade import delete_response
+from search import index, index_bulk, remove_cascaded, CASCADE_COLLECT
+from versions import bump, versioned
+from playlist_routes import touch_playlists_containing
+import recommend
 
 albums_routes = Blueprint('albums_routes', __name__)
 
+ALBUM_COLUMNS = ["album_id", "title", "artist_id", "release_date", "cover_image_url"]
+ALBUM_FILTERS = ["artist_id"]
 
-def get_db_connection():
-    return pyodbc.connect(
-        f"DRIVER={{{DB_CONFIG['DRIVER']}}};SERVER={DB_CONFIG['SERVER']};"
-        f"DATABASE={DB_CONFIG['DATABASE']};UID={DB_CONFIG['UID']};PWD={DB_CONFIG['PWD']}"
-    )
 
-
-# GET: Fetch all albums
+# GET: Fetch albums, one keyset page at a time (?after=<album_id>&limit=N&fields=...&artist_id=...)
 @albums_routes.route("/albums", methods=["GET"])
+@versioned("Albums")
+@cached("albums")
 def get_albums():
+    try:
+        list_args = parse_list_args(request.args, ALBUM_COLUMNS, filterable=ALBUM_FILTERS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Albums")
-        albums = cursor.fetchall()
-        conn.close()
-
-        return jsonify([
-            {
-                "album_id": row[0],
-                "title": row[1],
-                "artist_id": row[2],
-                "release_date": row[3],
-                "cover_image_url": row[4]
-            } for row in albums
-        ])
+
+        fmt = stream_format(request)
+        if fmt:
+            limit = list_args.limit if "limit" in request.args else None
+            return stream_rows(cursor, "Albums", list_args, fmt, limit)
+
+        albums, next_after = fetch_page(cursor, "Albums", list_args)
+        return rows_response(list_args.fields, albums, next_after)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch albums: {e}"}), 500
 
@@ -39,23 +46,55 @@ def get_albums():
 @albums_routes.route("/albums", methods=["POST"])
 def create_album():
     data = request.get_json()
-    if "title" not in data or "artist_id" not in data:
-        return jsonify({"error": "title and artist_id are required fields"}), 400
+    if "album_id" not in data or "title" not in data or "artist_id" not in data:
+        return jsonify({"error": "album_id, title and artist_id are required fields"}), 400
 
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Albums (title, artist_id, release_date, cover_image_url) VALUES (?, ?, ?, ?)",
-            (data["title"], data["artist_id"], data.get("release_date"), data.get("cover_image_url"))
+        queries.run(
+            cursor, "albums.insert",
+            (data["album_id"], data["title"], data["artist_id"], data.get("release_date"), data.get("cover_image_url"))
         )
+        bump(cursor, "Albums")
         conn.commit()
-        conn.close()
+        invalidate("albums")
+        index.put("album", data["album_id"], data["title"])
         return jsonify({"message": "Album created successfully"}), 201
     except Exception as e:
         return jsonify({"error": f"Failed to create album: {e}"}), 500
 
 
+def bulk_album_params(data):
+    if data.get("title") is None:
+        raise ValueError("title is required")
+    return (int(data["album_id"]), data["title"], int(data["artist_id"]),
+            data.get("release_date"), data.get("cover_image_url"))
+
+
+# POST: Add many albums at once (JSON array or NDJSON body)
+@albums_routes.route("/albums/bulk", methods=["POST"])
+def create_albums_bulk():
+    try:
+        rows = parse_bulk_body(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db_connection()
+        report, status = run_bulk_insert(
+            conn, rows, "albums.insert", bulk_album_params
+        )
+        if report["inserted"]:
+            bump(conn.cursor(), "Albums")
+            conn.commit()
+            invalidate("albums")
+            index_bulk("album", rows, report, "album_id", "title")
+        return jsonify(report), status
+    except Exception as e:
+        return jsonify({"error": f"Failed to create albums: {e}"}), 500
+
+
 # PUT: Update an existing album
 @albums_routes.route("/albums/<int:album_id>", methods=["PUT"])
 def update_album(album_id):
@@ -67,14 +106,17 @@ def update_album(album_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Albums SET title = COALESCE(?, title), artist_id = COALESCE(?, artist_id), "
-            "release_date = COALESCE(?, release_date), cover_image_url = COALESCE(?, cover_image_url) "
-            "WHERE album_id = ?",
+        updated = queries.run(
+            cursor, "albums.update",
             (data.get("title"), data.get("artist_id"), data.get("release_date"), data.get("cover_image_url"), album_id)
         )
+        playlist_tags = touch_playlists_containing(cursor, "albums", album_id) if updated else []
+        if updated:
+            bump(cursor, "Albums")
         conn.commit()
-        conn.close()
+        invalidate("albums", f"album:{album_id}", *playlist_tags)
+        if updated and data.get("title") is not None:
+            index.put("album", album_id, data["title"])
         return jsonify({"message": "Album updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Failed to update album: {e}"}), 500
@@ -85,39 +127,24 @@ def update_album(album_id):
 def delete_album(album_id):
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Delete related records in Songs table
-        cursor.execute("DELETE FROM Songs WHERE album_id = ?", (album_id,))
-
-        # Delete the album itself
-        cursor.execute("DELETE FROM Albums WHERE album_id = ?", (album_id,))
-
-        conn.commit()
-        conn.close()
-        return jsonify({"message": "Album and related songs deleted successfully"}), 200
+        return delete_response(conn, "Albums", album_id, "Album and related songs deleted successfully",
+                               ["albums", f"album:{album_id}", "songs"],
+                               CASCADE_COLLECT, [remove_cascaded, recommend.remove_cascaded])
     except Exception as e:
         return jsonify({"error": f"Failed to delete album: {e}"}), 500
 
 
 # GET: Fetch a specific album by ID
 @albums_routes.route("/albums/<int:album_id>", methods=["GET"])
+@cached("album", tags=lambda kwargs, album: [f"album:{kwargs['album_id']}", f"artist:{album['artist_id']}"])
 def get_album_by_id(album_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Albums WHERE album_id = ?", (album_id,))
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            return jsonify({
-                "album_id": row[0],
-                "title": row[1],
-                "artist_id": row[2],
-                "release_date": row[3],
-                "cover_image_url": row[4]
-            })
+        album = queries.fetch_one(cursor, "albums.get", (album_id,))
+
+        if album:
+            return jsonify(album._asdict())
         else:
             return jsonify({"error": "Album not found"}), 404
     except Exception as e:
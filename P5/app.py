@@ -1,18 +1,93 @@
-from flask import Flask
+from flask import Flask, Response, jsonify, request
+import compression
+import db
+import metrics
+import queries
+import serializer
+from cache import cache
+from jobs import jobs
+from notifications import notifier
 from user_routes import api
 from playlist_routes import playlist_routes
 from artist_routes import artist_routes
 from song_routes import song_routes
 from albums_routes import albums_routes
+from search_routes import search_routes
+from stats_routes import stats_routes
+from batch_routes import batch_routes
+from events_routes import events_routes
 
 app = Flask(__name__)
+db.init_app(app)
+serializer.init_app(app)
+metrics.init_app(app)
+compression.init_app(app)
 
 app.register_blueprint(api, url_prefix="/api")
 app.register_blueprint(playlist_routes, url_prefix="/api/playlists")
 app.register_blueprint(artist_routes, url_prefix="/api/artists")
 app.register_blueprint(song_routes, url_prefix="/api/songs")
 app.register_blueprint(albums_routes, url_prefix="/api/albums")
+app.register_blueprint(search_routes, url_prefix="/api/search")
+app.register_blueprint(stats_routes, url_prefix="/api/stats")
+app.register_blueprint(batch_routes, url_prefix="/api/batch")
+app.register_blueprint(events_routes, url_prefix="/api/events")
 
 
+# GET: Connection pool stats
+@app.route("/api/db/stats", methods=["GET"])
+def get_pool_stats():
+    return jsonify(db.pool.stats())
+
+
+# GET: Read replica health (ejections, consecutive failures) and per-replica pool stats
+@app.route("/api/db/replicas", methods=["GET"])
+def get_replica_stats():
+    return jsonify(db.replica_stats())
+
+
+# GET: Most recent statements slower than METRICS_CONFIG["slow_query_ms"], newest first
+@app.route("/api/db/slow_queries", methods=["GET"])
+def get_slow_queries():
+    return jsonify(list(reversed(metrics.slow_queries)))
+
+
+# GET: Call count, rows and timings for each registered statement, most total time first (?reset=1 clears them)
+@app.route("/api/db/statements", methods=["GET"])
+def get_statement_stats():
+    entries = queries.stats()
+    if request.args.get("reset") == "1":
+        queries.reset_stats()
+    return jsonify(entries)
+
+
+# GET: Request, query and pool metrics in Prometheus text format
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# GET: Response cache hit/miss/eviction counters
+@app.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache.stats())
+
+
+# GET: Notification pipeline counters (queued, coalesced, written, dropped)
+@app.route("/api/notifications/stats", methods=["GET"])
+def get_notification_stats():
+    return jsonify(notifier.stats())
+
+
+# GET: Status of a background job (e.g. a DELETE sent with ?async=1)
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+# Development server only; production runs asgi.app via serve.py or gunicorn.conf.py
 if __name__ == "__main__":
     app.run(debug=True)
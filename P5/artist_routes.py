@@ -1,35 +1,42 @@
-import pyodbc
 from flask import Blueprint, jsonify, request
 from datetime import datetime
-from config import DB_CONFIG
+import queries
+from db import get_db_connection
+from pagination import parse_list_args, fetch_page, rows_response
+from streaming import stream_format, stream_rows
+from bulk import parse_bulk_body, run_bulk_insert
+from cache import cached, invalidate
+from cascade import delete_response
+from search import index, index_bulk, remove_cascaded, CASCADE_COLLECT
+from versions import bump, versioned
+from playlist_routes import touch_playlists_containing
+import recommend
 
 artist_routes = Blueprint('artist_routes', __name__)
 
-def get_db_connection():
-    return pyodbc.connect(
-        f"DRIVER={{{DB_CONFIG['DRIVER']}}};SERVER={DB_CONFIG['SERVER']};"
-        f"DATABASE={DB_CONFIG['DATABASE']};UID={DB_CONFIG['UID']};PWD={DB_CONFIG['PWD']}"
-    )
+ARTIST_COLUMNS = ["artist_id", "name", "bio", "image_url", "created_at", "updated_at"]
 
-# GET: Fetch all artists
+# GET: Fetch artists, one keyset page at a time (?after=<artist_id>&limit=N&fields=...)
 @artist_routes.route("/", methods=["GET"])
+@versioned("Artists")
+@cached("artists")
 def get_artists():
+    try:
+        list_args = parse_list_args(request.args, ARTIST_COLUMNS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Artists")
-        artists = cursor.fetchall()
-        conn.close()
-        return jsonify([
-            {
-                "artist_id": row[0],
-                "name": row[1],
-                "bio": row[2],
-                "image_url": row[3],
-                "created_at": row[4],
-                "updated_at": row[5]
-            } for row in artists
-        ])
+
+        fmt = stream_format(request)
+        if fmt:
+            limit = list_args.limit if "limit" in request.args else None
+            return stream_rows(cursor, "Artists", list_args, fmt, limit)
+
+        artists, next_after = fetch_page(cursor, "Artists", list_args)
+        return rows_response(list_args.fields, artists, next_after)
     except Exception as e:
         return jsonify({"error": f"Database Connection Error: {e}"}), 500
 
@@ -47,18 +54,49 @@ def create_artist():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Artists (artist_id, name, bio, image_url, created_at, updated_at) "
-            "VALUES (?, ?, ?, ?, ?, ?)",
+        queries.run(
+            cursor, "artists.insert",
             (data["artist_id"], data["name"], data.get("bio"), data.get("image_url"), created_at, updated_at)
         )
+        bump(cursor, "Artists")
         conn.commit()
-        conn.close()
+        invalidate("artists")
+        index.put("artist", data["artist_id"], data["name"])
         print("Artist added successfully")  # Debug confirmation
         return jsonify({"message": "Artist added successfully"}), 201
     except Exception as e:
         return jsonify({"error": f"Failed to add artist: {e}"}), 500
 
+
+# POST: Add many artists at once (JSON array or NDJSON body)
+@artist_routes.route("/bulk", methods=["POST"])
+def create_artists_bulk():
+    try:
+        rows = parse_bulk_body(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    created_at = datetime.now()
+
+    def artist_params(data):
+        if data.get("name") is None:
+            raise ValueError("name is required")
+        return (int(data["artist_id"]), data["name"], data.get("bio"), data.get("image_url"), created_at, created_at)
+
+    try:
+        conn = get_db_connection()
+        report, status = run_bulk_insert(
+            conn, rows, "artists.insert", artist_params
+        )
+        if report["inserted"]:
+            bump(conn.cursor(), "Artists")
+            conn.commit()
+            invalidate("artists")
+            index_bulk("artist", rows, report, "artist_id", "name")
+        return jsonify(report), status
+    except Exception as e:
+        return jsonify({"error": f"Failed to add artists: {e}"}), 500
+
 # PUT: Update an artist
 @artist_routes.route("/<int:artist_id>", methods=["PUT"])
 def update_artist(artist_id):
@@ -69,32 +107,28 @@ def update_artist(artist_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Artists SET name = ?, bio = ?, image_url = ?, updated_at = GETDATE() "
-            "WHERE artist_id = ?",
-            (data["name"], data.get("bio"), data.get("image_url"), artist_id)
+        updated = queries.run(
+            cursor, "artists.update", (data["name"], data.get("bio"), data.get("image_url"), artist_id)
         )
+        playlist_tags = touch_playlists_containing(cursor, "artists", artist_id) if updated else []
+        if updated:
+            bump(cursor, "Artists")
         conn.commit()
-        conn.close()
+        invalidate("artists", f"artist:{artist_id}", *playlist_tags)
+        if updated:
+            index.put("artist", artist_id, data["name"])
         return jsonify({"message": "Artist updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Failed to update artist: {e}"}), 500
 
 
-# DELETE: Remove an artist
+# DELETE: Remove an artist and everything that depends on it (?async=1 queues it as a job)
 @artist_routes.route("/<int:artist_id>", methods=["DELETE"])
 def delete_artist(artist_id):
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Songs WHERE artist_id = ?", (artist_id,))
-
-        cursor.execute("DELETE FROM Albums WHERE artist_id = ?", (artist_id,))
-        cursor.execute("DELETE FROM Contribution_Album_Table WHERE artist_id = ?", (artist_id,))
-        cursor.execute("DELETE FROM Contribution_Song_Table WHERE artist_id = ?", (artist_id,))
-        cursor.execute("DELETE FROM Artists WHERE artist_id = ?", (artist_id,))
-        conn.commit()
-        conn.close()
-        return jsonify({"message": "Artist deleted successfully"}), 200
+        return delete_response(conn, "Artists", artist_id, "Artist deleted successfully",
+                               ["artists", f"artist:{artist_id}", "albums", "songs"],
+                               CASCADE_COLLECT, [remove_cascaded, recommend.remove_cascaded])
     except Exception as e:
         return jsonify({"error": f"Failed to delete artist: {e}"}), 500
@@ -0,0 +1,230 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import db
+import events
+from app import app as flask_app
+from config import SERVER_CONFIG
+from jobs import jobs
+from notifications import notifier
+
+_DONE = object()
+
+
+class WsgiBridge:
+    """ASGI front end for the Flask app.
+
+    The event loop owns the sockets, so idle and keep-alive connections cost
+    no threads; each request's Flask handler (and its blocking database work)
+    runs on a bounded thread pool sized to the connection pool. Response
+    chunks are handed back through a small queue, which also applies
+    backpressure to streamed exports when a client reads slowly.
+    """
+
+    def __init__(self, wsgi_app, threads=10, max_pending=2000, max_body_bytes=64 * 1024 * 1024):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_pending = max_pending
+        self.max_body_bytes = max_body_bytes
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+        self._in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Replays events a previous process logged but never wrote
+                await asyncio.get_running_loop().run_in_executor(None, events.buffer.start)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # Flush buffered events and queued notifications and finish running jobs before connections close
+                await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        events.buffer.stop()
+        notifier.stop()
+        jobs.shutdown()
+        db.pool.close_all()
+
+    async def http(self, scope, receive, send):
+        if self._in_flight >= self.max_pending:
+            await self.send_error(send, 503, b"Server busy")
+            return
+        body = await self.read_body(receive)
+        if body is None:
+            await self.send_error(send, 413, b"Request body too large")
+            return
+
+        disconnected = threading.Event()
+        watcher = asyncio.ensure_future(self.watch_disconnect(receive, disconnected))
+        self._in_flight += 1
+        try:
+            await self.run(self.build_environ(scope, body), send, disconnected)
+        finally:
+            self._in_flight -= 1
+            watcher.cancel()
+
+    @staticmethod
+    async def watch_disconnect(receive, disconnected):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    async def read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    async def send_error(send, status, message):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(message)).encode())]})
+        await send({"type": "http.response.body", "body": message})
+
+    @staticmethod
+    def build_environ(scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+            "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin1").upper().replace("-", "_")
+            value = value.decode("latin1")
+            if name == "CONTENT_LENGTH":
+                continue
+            key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def run(self, environ, send, disconnected):
+        loop = asyncio.get_running_loop()
+        # Small bound: a streaming handler runs at most a few chunks ahead of the client
+        chunks = asyncio.Queue(maxsize=8)
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def call_app():
+            response = {}
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and response.get("sent"):
+                    raise exc_info[1].with_traceback(exc_info[2])
+                response["start"] = (int(status.split(" ", 1)[0]), headers)
+                return write
+
+            def write(data):
+                if data:
+                    send_start()
+                    put(bytes(data))
+
+            def send_start():
+                if not response.get("sent"):
+                    response["sent"] = True
+                    put(response["start"])
+
+            try:
+                iterable = self.wsgi_app(environ, start_response)
+                try:
+                    for data in iterable:
+                        if disconnected.is_set():
+                            break
+                        if data:
+                            send_start()
+                            put(data)
+                    send_start()
+                finally:
+                    # Runs Flask's teardown, which returns the pooled DB connection
+                    if hasattr(iterable, "close"):
+                        iterable.close()
+            finally:
+                put(_DONE)
+
+        future = loop.run_in_executor(self._executor, call_app)
+        started = False
+        failed = None
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _DONE:
+                    break
+                if disconnected.is_set():
+                    continue
+                try:
+                    if isinstance(item, tuple):
+                        status, headers = item
+                        await send({"type": "http.response.start", "status": status,
+                                    "headers": [(name.lower().encode("latin1"), value.encode("latin1"))
+                                                for name, value in headers]})
+                        started = True
+                    else:
+                        await send({"type": "http.response.body", "body": item, "more_body": True})
+                except OSError:
+                    # Client went away: stop the handler at its next chunk, keep draining until it exits
+                    disconnected.set()
+                except Exception as e:
+                    # The server rejected a message: same, so the handler's thread is never left blocked
+                    # on a full queue, and the error is raised once it has exited
+                    disconnected.set()
+                    failed = e
+            await future
+        except Exception:
+            if failed is not None:
+                raise failed
+            if not started:
+                await self.send_error(send, 500, b"Internal Server Error")
+                return
+            raise
+        if failed is not None:
+            raise failed
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+app = WsgiBridge(
+    flask_app,
+    threads=SERVER_CONFIG["threads"],
+    max_pending=SERVER_CONFIG["max_pending"],
+    max_body_bytes=SERVER_CONFIG["max_body_bytes"]
+)
@@ -0,0 +1,68 @@
+from flask import Blueprint, jsonify, request
+import queries
+from db import get_db_connection, read_only
+from config import BATCH_CONFIG
+
+batch_routes = Blueprint('batch_routes', __name__)
+
+# Entity type -> (statement, id column)
+BATCH_TYPES = {
+    "songs": ("songs.by_ids", "song_id"),
+    "artists": ("artists.by_ids", "artist_id"),
+    "albums": ("albums.by_ids", "album_id"),
+    "playlists": ("playlists.by_ids", "playlist_id"),
+}
+
+
+def parse_batch_ids(data):
+    """{type: [id, ...]} from a JSON body or query args; ids are ints, de-duplicated in request order."""
+    wanted = {}
+    for kind, ids in data.items():
+        if kind not in BATCH_TYPES:
+            raise ValueError(f"Unknown type {kind}; expected one or more of {', '.join(BATCH_TYPES)}")
+        if isinstance(ids, str):
+            ids = [part for part in ids.split(",") if part.strip()]
+        if not isinstance(ids, list):
+            raise ValueError(f"{kind} must be a list of ids")
+        try:
+            wanted[kind] = list(dict.fromkeys(int(entity_id) for entity_id in ids))
+        except (TypeError, ValueError):
+            raise ValueError(f"{kind} ids must be integers")
+    total = sum(len(ids) for ids in wanted.values())
+    if not total:
+        raise ValueError(f"At least one of {', '.join(BATCH_TYPES)} is required")
+    if total > BATCH_CONFIG["max_ids"]:
+        raise ValueError(f"At most {BATCH_CONFIG['max_ids']} ids per request")
+    return wanted
+
+
+# GET/POST: Fetch many songs, artists, albums and playlists in one round-trip
+# POST {"songs": [1, 2], "albums": [7]} or GET ?songs=1,2&albums=7; one IN query per type
+# Returns {"songs": {"1": {...}, ...}, ..., "missing": {"songs": [2]}}
+@batch_routes.route("/", methods=["GET", "POST"])
+@read_only
+def get_batch():
+    data = request.get_json(silent=True) if request.method == "POST" else request.args.to_dict()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid input"}), 400
+    try:
+        wanted = parse_batch_ids(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        result = {}
+        missing = {}
+        for kind, ids in wanted.items():
+            statement, id_column = BATCH_TYPES[kind]
+            found = {getattr(row, id_column): row._asdict() for row in queries.fetch_in(cursor, statement, ids)}
+            result[kind] = found
+            absent = [entity_id for entity_id in ids if entity_id not in found]
+            if absent:
+                missing[kind] = absent
+        result["missing"] = missing
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch batch: {e}"}), 500
@@ -0,0 +1,152 @@
+import argparse
+import json
+import random
+import statistics
+import time
+import db
+import migrate
+from config import SQLITE_CONFIG
+
+# Cascade deletes in the route modules, and how to pick an id for each
+CASCADES = [
+    ("delete_user", "/api/users/{}", "users"),
+    ("delete_artist", "/api/artists/{}", "artists"),
+    ("delete_album", "/api/albums/albums/{}", "albums"),
+    ("delete_song", "/api/songs/{}", "songs"),
+    ("delete_playlist", "/api/playlists/playlists/{}", "playlists"),
+]
+
+
+def seed(conn, users, artists, albums_per_artist, songs_per_album, playlists_per_user,
+         songs_per_playlist, follows_per_user, likes_per_user):
+    """Fill the sqlite schema with a synthetic MusicMedia catalog; returns row counts.
+
+    Rows are generated lazily so executemany streams them; tens of millions of
+    playlist entries never sit in memory at once.
+    """
+    rng = random.Random(42)
+    cursor = conn.cursor()
+    albums = artists * albums_per_artist
+    songs = albums * songs_per_album
+    playlists = users * playlists_per_user
+    cursor.executemany(
+        "INSERT INTO Users (user_id, username, email, password, bio) VALUES (?, ?, ?, ?, ?)",
+        ((u, f"user{u}", f"user{u}@example.com", "hashed", "bio") for u in range(1, users + 1))
+    )
+    cursor.executemany(
+        "INSERT INTO Artists (artist_id, name, bio) VALUES (?, ?, ?)",
+        ((a, f"Artist {a}", "bio") for a in range(1, artists + 1))
+    )
+    cursor.executemany(
+        "INSERT INTO Albums (album_id, title, artist_id) VALUES (?, ?, ?)",
+        ((album_id, f"Album {album_id}", (album_id - 1) // albums_per_artist + 1) for album_id in range(1, albums + 1))
+    )
+    cursor.executemany(
+        "INSERT INTO Songs (song_id, title, artist_id, album_id, release_date, duration) VALUES (?, ?, ?, ?, ?, ?)",
+        ((song_id, f"Song {song_id}", (album_id - 1) // albums_per_artist + 1, album_id, "2020-01-01",
+          rng.randint(60, 600))
+         for song_id, album_id in ((s, (s - 1) // songs_per_album + 1) for s in range(1, songs + 1)))
+    )
+
+    cursor.executemany(
+        "INSERT INTO Playlists (playlist_id, user_id, name) VALUES (?, ?, ?)",
+        ((p, (p - 1) // playlists_per_user + 1, f"Playlist {p}") for p in range(1, playlists + 1))
+    )
+    entries = playlists * songs_per_playlist
+    cursor.executemany(
+        "INSERT INTO Playlist_Songs (playlist_song_id, playlist_id, song_id) VALUES (?, ?, ?)",
+        ((n, (n - 1) // songs_per_playlist + 1, rng.randint(1, songs)) for n in range(1, entries + 1))
+    )
+
+    follows = users * follows_per_user
+    cursor.executemany(
+        "INSERT INTO Follows (follow_id, follower_id, followed_id) VALUES (?, ?, ?)",
+        ((n, (n - 1) // follows_per_user + 1, rng.randint(1, users)) for n in range(1, follows + 1))
+    )
+    likes = users * likes_per_user
+    cursor.executemany(
+        "INSERT INTO Likes (like_id, user_id, item_id, item_type) VALUES (?, ?, ?, ?)",
+        ((n, (n - 1) // likes_per_user + 1, rng.randint(1, songs), "Song") for n in range(1, likes + 1))
+    )
+    conn.commit()
+    return {"users": users, "artists": artists, "albums": albums, "songs": songs,
+            "playlists": playlists, "playlist_songs": entries, "follows": follows, "likes": likes}
+
+
+def time_cascades(client, counts, samples, rng):
+    results = {}
+    for name, path, table in CASCADES:
+        ids = rng.sample(range(1, counts[table] + 1), samples)
+        timings = []
+        for entity_id in ids:
+            started = time.perf_counter()
+            response = client.delete(path.format(entity_id))
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"{name}({entity_id}) failed: {response.get_json()}")
+        results[name] = {"median_ms": statistics.median(timings), "max_ms": max(timings)}
+    return results
+
+
+def drop_indexes(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'IX_%'")
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"DROP INDEX {name}")
+    conn.commit()
+
+
+def run_phase(phase, sizes, samples, with_indexes):
+    SQLITE_CONFIG["DATABASE"] = f"file:cascade_{phase}?mode=memory&cache=shared"
+    # Keeps the shared in-memory database alive for the whole phase
+    anchor = db.connect_sqlite()
+    try:
+        migrate.create_base_schema(anchor)
+        counts = seed(anchor, **sizes)
+        # Later migrations add tables the routes rely on, so always migrate and
+        # measure "before" by dropping the indexes again
+        migrate.migrate(anchor, "sqlite")
+        if not with_indexes:
+            drop_indexes(anchor)
+        db.configure_pool("sqlite")
+        from app import app
+        with app.test_client() as client:
+            return counts, time_cascades(client, counts, samples, random.Random(7))
+    finally:
+        db.pool.close_all()
+        anchor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the cascade-delete routes before and after the index migrations")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--artists", type=int, default=500)
+    parser.add_argument("--albums-per-artist", type=int, default=4)
+    parser.add_argument("--songs-per-album", type=int, default=10)
+    parser.add_argument("--playlists-per-user", type=int, default=3)
+    parser.add_argument("--songs-per-playlist", type=int, default=20)
+    parser.add_argument("--follows-per-user", type=int, default=10)
+    parser.add_argument("--likes-per-user", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=20, help="deletes timed per route")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    sizes = {name: getattr(args, name) for name in (
+        "users", "artists", "albums_per_artist", "songs_per_album", "playlists_per_user",
+        "songs_per_playlist", "follows_per_user", "likes_per_user")}
+    counts, before = run_phase("before", sizes, args.samples, with_indexes=False)
+    _, after = run_phase("after", sizes, args.samples, with_indexes=True)
+
+    print("Rows: " + ", ".join(f"{table}={count}" for table, count in counts.items()))
+    print(f"{'route':<18}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, _, _ in CASCADES:
+        b, a = before[name]["median_ms"], after[name]["median_ms"]
+        print(f"{name:<18}{b:>12.2f}{a:>12.2f}{b / a if a else float('inf'):>9.1f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": counts, "samples": args.samples, "before": before, "after": after}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+import db
+import migrate
+from bench_cascade_deletes import seed
+from config import SQLITE_CONFIG, CACHE_CONFIG
+
+# Dataset shapes scaled from Intial.sql; "large" is 10k users, 1M songs, 10M playlist entries
+SCALES = {
+    "small": {"users": 1000, "artists": 200, "albums_per_artist": 5, "songs_per_album": 10,
+              "playlists_per_user": 3, "songs_per_playlist": 20, "follows_per_user": 10, "likes_per_user": 20},
+    "medium": {"users": 10000, "artists": 2000, "albums_per_artist": 5, "songs_per_album": 10,
+               "playlists_per_user": 5, "songs_per_playlist": 40, "follows_per_user": 20, "likes_per_user": 50},
+    "large": {"users": 10000, "artists": 20000, "albums_per_artist": 5, "songs_per_album": 10,
+              "playlists_per_user": 20, "songs_per_playlist": 50, "follows_per_user": 20, "likes_per_user": 50},
+}
+
+_ids = itertools.count(10 ** 9)
+
+
+def next_id():
+    # Fresh keys for write scenarios, well above anything seed() generates
+    return next(_ids)
+
+
+# (name, method, path, body, accepted statuses); {user}, {song}, ... are random existing ids
+SCENARIOS = [
+    ("users.list", "GET", "/api/users?limit=50&after={user}", None, (200,)),
+    ("users.feed", "GET", "/api/users/{user}/feed", None, (200,)),
+    ("users.notifications", "GET", "/api/users/{user}/notifications", None, (200,)),
+    ("users.unread_count", "GET", "/api/users/{user}/notifications/unread_count", None, (200,)),
+    ("users.like", "POST", "/api/users/{user}/likes",
+     lambda ids: {"like_id": next_id(), "item_id": ids["song"], "item_type": "Song"}, (201,)),
+    ("users.follow", "POST", "/api/users/{user}/follows",
+     lambda ids: {"follow_id": next_id(), "followed_id": ids["other_user"]}, (201, 409)),
+    ("songs.list", "GET", "/api/songs/?limit=100&after={song}", None, (200,)),
+    ("songs.by_artist", "GET", "/api/songs/?artist_id={artist}", None, (200,)),
+    ("songs.update", "PUT", "/api/songs/{song}",
+     lambda ids: {"title": f"Song {ids['song']}", "artist_id": ids["artist"], "album_id": None,
+                  "genre_id": None, "release_date": "2020-01-01", "duration": 200}, (200,)),
+    ("artists.list", "GET", "/api/artists/?limit=100&after={artist}", None, (200,)),
+    ("albums.list", "GET", "/api/albums/albums?limit=100&after={album}", None, (200,)),
+    ("albums.get", "GET", "/api/albums/albums/{album}", None, (200, 404)),
+    ("playlists.list", "GET", "/api/playlists/playlists?limit=100&after={playlist}", None, (200,)),
+    ("playlists.get", "GET", "/api/playlists/playlists/{playlist}", None, (200, 404)),
+    ("playlists.songs", "GET", "/api/playlists/playlists/{playlist}/songs", None, (200, 304)),
+    ("search", "GET", "/api/search/?q={song}", None, (200,)),
+    ("stats.duration", "GET", "/api/stats/songs/duration", None, (200,)),
+    ("stats.followers", "GET", "/api/stats/users/followers", None, (200,)),
+]
+
+
+def random_ids(rng, counts):
+    return {"user": rng.randint(1, counts["users"]), "other_user": rng.randint(1, counts["users"]),
+            "song": rng.randint(1, counts["songs"]), "artist": rng.randint(1, counts["artists"]),
+            "album": rng.randint(1, counts["albums"]), "playlist": rng.randint(1, counts["playlists"])}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))]
+
+
+def rss_mb():
+    # Current resident set size (Linux); elsewhere fall back to the peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Client:
+    """One keep-alive HTTP connection per load thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            if response.getheader("Connection", "").lower() == "close":
+                self.close()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def run_scenario(base_url, scenario, counts, concurrency, duration, seed_value):
+    """Hammer one endpoint from `concurrency` threads for `duration` seconds."""
+    name, method, path, body, accepted = scenario
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(number):
+        rng = random.Random(seed_value * 1000 + number)
+        client = Client(base_url)
+        mine, bad = [], 0
+        while time.perf_counter() < deadline:
+            ids = random_ids(rng, counts)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path.format(**ids), body(ids) if body else None)
+            except (OSError, http.client.HTTPException):
+                status = None
+            mine.append((time.perf_counter() - started) * 1000)
+            if status not in accepted:
+                bad += 1
+        client.close()
+        with lock:
+            latencies.extend(mine)
+            failures.append(bad)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(failures),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 3) if latencies else None,
+        "max_ms": round(latencies[-1], 3) if latencies else None,
+        "rss_mb": round(rss_mb(), 1),
+    }
+
+
+def prepare_database(path, sizes):
+    """Create, seed and migrate a file-backed sqlite database (WAL, so readers and writers overlap)."""
+    if os.path.exists(path):
+        os.remove(path)
+    SQLITE_CONFIG["DATABASE"] = f"file:{path}"
+    conn = db.connect_sqlite()
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        migrate.create_base_schema(conn)
+        counts = seed(conn, **sizes)
+        # Index and summary-table migrations run after the load, like on a restored production copy
+        migrate.migrate(conn, "sqlite")
+    finally:
+        conn.close()
+    return counts
+
+
+def start_local_server(pool_size):
+    """Serve app.py on an ephemeral port with a threaded, keep-alive WSGI server."""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    db.configure_pool("sqlite", max_size=pool_size)
+    from app import app
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous, current):
+    print(f"\nChange vs {previous.get('commit') or 'previous run'} (p95 latency, throughput):")
+    for name, levels in current["results"].items():
+        for concurrency, now in levels.items():
+            before = previous.get("results", {}).get(name, {}).get(concurrency)
+            if not before or not before.get("p95_ms") or not now.get("p95_ms"):
+                continue
+            p95 = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            rps = (now["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100
+            print(f"{name:<22}c={concurrency:<4}p95 {p95:+7.1f}%   rps {rps:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test every blueprint's endpoints and record latency percentiles")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for size in SCALES["small"]:
+        parser.add_argument(f"--{size.replace('_', '-')}", type=int, help=f"override the scale's {size}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client thread counts")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per endpoint first")
+    parser.add_argument("--only", help="comma-separated scenario name prefixes, e.g. songs,search")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--db", help="sqlite file to seed (default: a temporary file)")
+    parser.add_argument("--url", help="load an already running server instead (its data must match --scale)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="earlier --json output to diff against")
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for size in sizes:
+        if getattr(args, size) is not None:
+            sizes[size] = getattr(args, size)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    scenarios = [scenario for scenario in SCENARIOS
+                 if not args.only or any(scenario[0].startswith(prefix) for prefix in args.only.split(","))]
+    if args.no_cache:
+        CACHE_CONFIG["enabled"] = False
+
+    counts = {"users": sizes["users"], "artists": sizes["artists"],
+              "albums": sizes["artists"] * sizes["albums_per_artist"],
+              "songs": sizes["artists"] * sizes["albums_per_artist"] * sizes["songs_per_album"],
+              "playlists": sizes["users"] * sizes["playlists_per_user"]}
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_load_"), "music.db")
+        started = time.perf_counter()
+        counts = prepare_database(path, sizes)
+        print(f"Seeded {path} in {time.perf_counter() - started:.1f}s: "
+              + ", ".join(f"{table}={count}" for table, count in counts.items()))
+        server, base_url = start_local_server(max(levels))
+
+    results = {}
+    try:
+        for number, scenario in enumerate(scenarios):
+            # Warm caches and lazily built structures (e.g. the search index) before timing
+            client, rng = Client(base_url), random.Random(number)
+            for _ in range(args.warmup):
+                ids = random_ids(rng, counts)
+                client.request(scenario[1], scenario[2].format(**ids), scenario[3](ids) if scenario[3] else None)
+            client.close()
+            results[scenario[0]] = {}
+            for level in levels:
+                stats = run_scenario(base_url, scenario, counts, level, args.duration, number)
+                results[scenario[0]][str(level)] = stats
+                print(f"{scenario[0]:<22}c={level:<4}{stats['throughput_rps']:>9.1f} rps  "
+                      f"p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms  "
+                      f"errors {stats['errors']:<5} rss {stats['rss_mb']:.0f} MB")
+    finally:
+        if server is not None:
+            server.shutdown()
+            db.pool.close_all()
+
+    report = {
+        "commit": git_commit(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": args.scale,
+        "dataset": counts,
+        "concurrency": levels,
+        "duration_seconds": args.duration,
+        "cache": not args.no_cache,
+        "target": args.url or "in-process werkzeug server, sqlite",
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import itertools
+import json
+import random
+import resource
+import statistics
+import time
+import db
+import migrate
+import search
+from config import SQLITE_CONFIG
+
+SYLLABLES = ["la", "mor", "ve", "sun", "ri", "ka", "do", "ne", "tra", "bel", "lo", "shi", "an", "go", "ru",
+             "mi", "sta", "zen", "qu", "el", "fa", "dre", "om", "pi", "cor", "vi", "ta", "hel", "us", "ni"]
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_titles(count, vocabulary, rng):
+    # Zipf-like word frequencies, like real titles ("love" is everywhere, most words are rare)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(vocabulary)
+    for start in range(0, count, 10000):
+        batch = min(10000, count - start)
+        lengths = [rng.randint(1, 5) for _ in range(batch)]
+        words = rng.choices(vocabulary, weights, k=sum(lengths))
+        position = 0
+        for offset, length in enumerate(lengths):
+            yield start + offset + 1, " ".join(words[position:position + length]).title()
+            position += length
+
+
+def make_queries(titles, count, rng):
+    """Word, prefix and two-word queries taken from real titles, so every one has matches."""
+    queries = []
+    for _ in range(count):
+        words = rng.choice(titles).lower().split()
+        kind = rng.randrange(3)
+        if kind == 0 or len(words) == 1:
+            queries.append(rng.choice(words))
+        elif kind == 1:
+            queries.append(rng.choice(words)[:3])
+        else:
+            first = rng.randrange(len(words) - 1)
+            queries.append(f"{words[first]} {words[first + 1][:3]}")
+    return queries
+
+
+def like_search(cursor, query, limit):
+    # What a LIKE-based endpoint would run: every word as a substring, no ranking
+    words = query.split()
+    where = " AND ".join("title LIKE ?" for _ in words)
+    cursor.execute(f"SELECT song_id, title FROM Songs WHERE {where} LIMIT {int(limit)}",
+                   [f"%{word}%" for word in words])
+    return cursor.fetchall()
+
+
+def like_search_ranked(cursor, query, limit):
+    # LIKE has to see every match before it can hand back the best ones (shortest titles here)
+    words = query.split()
+    where = " AND ".join("title LIKE ?" for _ in words)
+    cursor.execute(f"SELECT song_id, title FROM Songs WHERE {where} ORDER BY LENGTH(title) LIMIT {int(limit)}",
+                   [f"%{word}%" for word in words])
+    return cursor.fetchall()
+
+
+def time_queries(fn, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def max_rss_mb():
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /api/search's inverted index with LIKE '%q%' over song titles")
+    parser.add_argument("--titles", type=int, default=1000000)
+    parser.add_argument("--vocabulary", type=int, default=50000, help="distinct words used in titles")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    SQLITE_CONFIG["DATABASE"] = "file:search_bench?mode=memory&cache=shared"
+    conn = db.connect_sqlite()
+    migrate.create_base_schema(conn)
+    migrate.migrate(conn, "sqlite")
+    # Every generated song is by artist 1
+    conn.execute("INSERT INTO Artists (artist_id, name) VALUES (1, 'Bench')")
+    cursor = conn.cursor()
+    titles = []
+    generated = make_titles(args.titles, make_vocabulary(args.vocabulary, rng), rng)
+    while True:
+        rows = [(song_id, title, 1, "2020-01-01", 200) for song_id, title in itertools.islice(generated, 100000)]
+        if not rows:
+            break
+        cursor.executemany(
+            "INSERT INTO Songs (song_id, title, artist_id, release_date, duration) VALUES (?, ?, ?, ?, ?)", rows)
+        titles.extend(row[1] for row in rng.sample(rows, min(len(rows), 1000)))
+    conn.commit()
+    queries = make_queries(titles, args.queries, rng)
+
+    rss_before = max_rss_mb()
+    index = search.SearchIndex()
+    started = time.perf_counter()
+    index.rebuild(conn)
+    build_seconds = time.perf_counter() - started
+    results = {
+        "titles": args.titles,
+        "index": {**index.stats(), "build_seconds": round(build_seconds, 2),
+                  "max_rss_growth_mb": round(max_rss_mb() - rss_before, 1)},
+        "inverted_index": time_queries(lambda query: index.search(query, limit=args.limit), queries),
+        "like": time_queries(lambda query: like_search(cursor, query, args.limit), queries),
+        "like_ranked": time_queries(lambda query: like_search_ranked(cursor, query, args.limit), queries),
+    }
+    conn.close()
+
+    print(f"{args.titles} titles, {results['index']['tokens']} distinct words, "
+          f"index built in {results['index']['build_seconds']}s (+{results['index']['max_rss_growth_mb']} MB max RSS)")
+    print(f"{'method':<16}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name in ("inverted_index", "like", "like_ranked"):
+        timing = results[name]
+        print(f"{name:<16}{timing['p50_ms']:>10.3f}{timing['p95_ms']:>10.3f}{timing['max_ms']:>10.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
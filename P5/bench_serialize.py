@@ -0,0 +1,150 @@
+import argparse
+import itertools
+import json
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from flask.json.provider import DefaultJSONProvider
+import db
+import migrate
+import serializer
+from config import CACHE_CONFIG, SQLITE_CONFIG
+
+FIELDS = ["song_id", "title", "artist_id", "album_id", "genre_id", "release_date", "duration"]
+
+
+class DictBackend:
+    """The encoding get_songs used before serializer.py: a dict per row, then Flask's default provider."""
+
+    name = "flask-dicts"
+
+    def __init__(self, app):
+        self._provider = DefaultJSONProvider(app)
+        self.dumps = self._provider.dumps
+        self.loads = self._provider.loads
+
+    def dumps_bytes(self, obj):
+        return self._provider.dumps(obj).encode()
+
+    def join_rows(self, fields, rows, separator, prefix, suffix):
+        items = []
+        for row in rows:
+            song = dict(zip(fields, row))
+            release_date = song.get("release_date")
+            if hasattr(release_date, "strftime"):
+                song["release_date"] = release_date.strftime("%Y-%m-%d")
+            items.append(song)
+        if separator == ",":
+            return (prefix + self._provider.dumps(items)[1:-1] + suffix).encode()
+        return (prefix + separator.join(self._provider.dumps(item) for item in items) + suffix).encode()
+
+
+def make_rows(count):
+    # Shaped like pyodbc rows: dates as date objects, a third of album_ids NULL
+    start = date(2000, 1, 1)
+    return [(song_id, f"Song title {song_id}", song_id % 1000 + 1, None if song_id % 3 else song_id % 500 + 1,
+             song_id % 20 + 1, start + timedelta(days=song_id % 9000), 120 + song_id % 240)
+            for song_id in range(1, count + 1)]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"best_ms": round(min(timings), 1), "median_ms": round(statistics.median(timings), 1),
+            "bytes": size}
+
+
+def backends(app):
+    found = [DictBackend(app), serializer.StdlibBackend()]
+    try:
+        found.append(serializer.load_backend("orjson"))
+    except ImportError:
+        print("orjson not installed; skipping it")
+    return found
+
+
+def encode_only(app, rows, repeat):
+    """Encoding 100k in-memory rows into one JSON array, per backend."""
+    return {backend.name: best_of(lambda: len(backend.join_rows(FIELDS, rows, ",", "[", "]")), repeat)
+            for backend in backends(app)}
+
+
+def seed_songs(conn, count):
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO Artists (artist_id, name) VALUES (1, 'Bench Artist')")
+    rows = ((song_id, f"Song title {song_id}", 1, None, None, "2020-01-01", 120 + song_id % 240)
+            for song_id in range(1, count + 1))
+    while True:
+        batch = list(itertools.islice(rows, 50000))
+        if not batch:
+            break
+        cursor.executemany("INSERT INTO Songs (song_id, title, artist_id, album_id, genre_id, release_date, duration) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+
+
+def endpoint(app, repeat):
+    """GET /api/songs end to end: the full export as one JSON array, and every 1000-row page in turn."""
+    client = app.test_client()
+
+    def export():
+        return len(client.get("/api/songs/?stream=json").get_data())
+
+    def walk_pages():
+        after = ""
+        size = 0
+        while True:
+            response = client.get(f"/api/songs/?limit=1000{after}")
+            size += len(response.get_data())
+            next_after = response.headers.get("X-Next-After")
+            if not next_after:
+                return size
+            after = f"&after={next_after}"
+
+    results = {}
+    for backend in backends(app):
+        app.json.backend = backend
+        results[backend.name] = {"export": best_of(export, repeat), "pages": best_of(walk_pages, repeat)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON encoders for GET /api/songs")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    SQLITE_CONFIG["DATABASE"] = "file:serialize_bench?mode=memory&cache=shared"
+    CACHE_CONFIG["enabled"] = False
+    db.configure_pool("sqlite", max_size=2)
+    from app import app
+    keeper = db.connect_sqlite()
+    migrate.create_base_schema(keeper)
+    seed_songs(keeper, args.rows)
+
+    results = {
+        "rows": args.rows,
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "encode": encode_only(app, make_rows(args.rows), args.repeat),
+        "endpoint": endpoint(app, args.repeat),
+    }
+    keeper.close()
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'backend':<14}{'encode ms':>12}{'export ms':>12}{'1000-row pages ms':>20}")
+    for name, timing in results["encode"].items():
+        endpoint_timing = results["endpoint"][name]
+        print(f"{name:<14}{timing['best_ms']:>12.1f}{endpoint_timing['export']['best_ms']:>12.1f}"
+              f"{endpoint_timing['pages']['best_ms']:>20.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import json
+import time
+import queries
+from streaming import NDJSON_MIMETYPE
+
+BULK_CHUNK_SIZE = 1000
+MAX_BULK_ROWS = 50000
+
+
+def parse_bulk_body(request):
+    """Read a JSON array or NDJSON body into a list of dicts. Raises ValueError."""
+    if request.mimetype == NDJSON_MIMETYPE:
+        rows = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Invalid JSON on line {number}")
+    else:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            raise ValueError("Body must be a JSON array or NDJSON")
+
+    if not rows:
+        raise ValueError("No rows provided")
+    if len(rows) > MAX_BULK_ROWS:
+        raise ValueError(f"At most {MAX_BULK_ROWS} rows per request")
+    return rows
+
+
+def validate_rows(rows, to_params):
+    """Map each row through to_params; returns (valid [(index, params)], errors)."""
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"index": index, "error": "Row must be a JSON object"})
+            continue
+        try:
+            valid.append((index, to_params(row)))
+        except (KeyError, ValueError, TypeError) as e:
+            message = f"{e.args[0]} is required" if isinstance(e, KeyError) else str(e)
+            errors.append({"index": index, "error": message})
+    return valid, errors
+
+
+def bulk_insert(conn, statement, valid, chunk_size=BULK_CHUNK_SIZE):
+    """Insert validated rows in chunked transactions using a registered queries statement.
+
+    Each chunk goes through one executemany (with pyodbc's fast_executemany so
+    the whole chunk is sent as a single parameter array) and one commit. If a
+    chunk fails it is rolled back and retried row by row so the report can
+    name the offending rows.
+    """
+    cursor = conn.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+
+    inserted = 0
+    chunks = 0
+    errors = []
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        chunks += 1
+        try:
+            queries.run_many(cursor, statement, [params for _, params in chunk])
+            conn.commit()
+            inserted += len(chunk)
+            continue
+        except Exception:
+            conn.rollback()
+
+        for index, params in chunk:
+            try:
+                queries.run(cursor, statement, params)
+                conn.commit()
+                inserted += 1
+            except Exception as e:
+                conn.rollback()
+                errors.append({"index": index, "error": str(e)})
+    return inserted, chunks, errors
+
+
+def run_bulk_insert(conn, rows, statement, to_params, chunk_size=BULK_CHUNK_SIZE):
+    """Validate then insert; returns (report, status_code)."""
+    started = time.perf_counter()
+    valid, errors = validate_rows(rows, to_params)
+    inserted, chunks, insert_errors = bulk_insert(conn, statement, valid, chunk_size) if valid else (0, 0, [])
+    errors.extend(insert_errors)
+    errors.sort(key=lambda error: error["index"])
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "received": len(rows),
+        "inserted": inserted,
+        "failed": len(errors),
+        "chunks": chunks,
+        "elapsed_seconds": round(elapsed, 4),
+        "rows_per_second": round(inserted / elapsed, 1) if elapsed > 0 else None,
+        "errors": errors
+    }
+    if not inserted:
+        return report, 400
+    return report, 201 if not errors else 207
@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, make_response, request
+import db
+from config import CACHE_CONFIG, REPLICA_CONFIG
+from streaming import stream_format
+
+# Response headers worth replaying on a cache hit
+CACHED_HEADERS = ("X-Next-After",)
+
+
+class LRUCache:
+    """In-process LRU cache with a TTL, a size bound and tag-based invalidation."""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (value, expires_at, tags)
+        self._tags = {}                 # tag -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self._invalidated_at = 0.0
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._invalidated_at = time.time()
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self._stats["invalidations"] += 1
+
+    def recently_invalidated(self, seconds):
+        return time.time() - self._invalidated_at < seconds
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            # Like RedisCache.clear, which deletes the invalidated_at key with the rest
+            self._invalidated_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "max_entries": self.max_entries,
+                    "ttl": self.ttl, **self._stats}
+
+
+class RedisCache:
+    """Same interface as LRUCache, stored in Redis so every worker process shares it."""
+
+    def __init__(self, url, ttl=60, prefix="musicmedia:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(raw)
+
+    def set(self, key, value, tags=()):
+        pipe = self.client.pipeline()
+        pipe.setex(self.prefix + key, self.ttl, json.dumps(value))
+        for tag in tags:
+            pipe.sadd(self.prefix + "tag:" + tag, key)
+            pipe.expire(self.prefix + "tag:" + tag, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, *tags):
+        # Shared so another worker's cache fill knows a write just happened
+        self.client.set(self.prefix + "invalidated_at", time.time())
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            keys = self.client.smembers(tag_key)
+            if keys:
+                self.client.delete(*[self.prefix + key.decode() for key in keys])
+                self._count("invalidations", len(keys))
+            self.client.delete(tag_key)
+
+    def recently_invalidated(self, seconds):
+        raw = self.client.get(self.prefix + "invalidated_at")
+        return raw is not None and time.time() - float(raw) < seconds
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "redis", "ttl": self.ttl, **self._stats}
+
+
+def create_cache(config):
+    if config["backend"] == "redis":
+        return RedisCache(config["redis_url"], config["ttl"])
+    return LRUCache(config["max_entries"], config["ttl"])
+
+
+cache = create_cache(CACHE_CONFIG)
+
+
+def invalidate(*tags):
+    """Evict every cached response carrying any of the given tags. Call after commit."""
+    if CACHE_CONFIG["enabled"]:
+        cache.invalidate(*tags)
+
+
+def cached(namespace, tags=None):
+    """Read-through cache for a GET view, keyed by path and query string.
+
+    Every entry is tagged with namespace; tags(kwargs, body) may add entity
+    tags such as "artist:3" so writes can evict precisely. Only plain 200
+    JSON responses are stored, streamed exports always go to the database.
+    With read replicas, a miss within sticky_seconds of an invalidation is
+    filled from the primary, so a lagging replica can't put the evicted
+    body straight back.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not CACHE_CONFIG["enabled"] or stream_format(request):
+                return view(*args, **kwargs)
+
+            key = namespace + ":" + request.path + "?" + "&".join(
+                f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+            # Views under @versioned are cached per table version, so a bump can't race an invalidate
+            if "table_version" in g:
+                key += f"#{g.table_version}"
+            hit = cache.get(key)
+            if hit is not None:
+                return Response(hit["body"], status=200, mimetype="application/json", headers=hit["headers"])
+
+            from_primary = bool(db.replicas) and cache.recently_invalidated(REPLICA_CONFIG["sticky_seconds"])
+            if from_primary:
+                db.prefer_primary()
+            response = make_response(view(*args, **kwargs))
+            # A connection taken from a replica before this view ran may still be behind; serve, don't store
+            if from_primary and g.get("db_pool", db.pool) is not db.pool:
+                return response
+            if response.status_code == 200 and not response.is_streamed:
+                body = response.get_data(as_text=True)
+                entry_tags = [namespace]
+                if tags is not None:
+                    entry_tags.extend(tags(kwargs, response.get_json()))
+                headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                cache.set(key, {"body": body, "headers": headers}, entry_tags)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,283 @@
+import time
+from flask import jsonify, request
+import db
+import versions
+from cache import invalidate
+from jobs import jobs
+from config import CASCADE_CONFIG
+
+# item_id/item_type columns point at Songs/Playlists/Users without a declared FK;
+# (child, column, item_type, parent, parent column)
+SOFT_REFERENCES = [
+    ("Likes", "item_id", "Song", "Songs", "song_id"),
+    ("Likes", "item_id", "Playlist", "Playlists", "playlist_id"),
+    ("Comments", "item_id", "Song", "Songs", "song_id"),
+    ("Comments", "item_id", "Playlist", "Playlists", "playlist_id"),
+    ("Reports", "item_id", "Song", "Songs", "song_id"),
+    ("Reports", "item_id", "Playlist", "Playlists", "playlist_id"),
+    ("Reports", "item_id", "Comment", "Comments", "comment_id"),
+    ("Activity_Feed", "item_id", "Song", "Songs", "song_id"),
+    ("Activity_Feed", "item_id", "Playlist", "Playlists", "playlist_id"),
+    ("Activity_Feed", "item_id", "User", "Users", "user_id"),
+]
+
+
+# Key columns from each dialect's catalog, tables in creation order:
+# (table, pk column) rows in key order, and (child, column, parent, parent column) rows
+CATALOG = {
+    "mssql": (
+        "SELECT t.name, c.name FROM sys.tables t "
+        "JOIN sys.indexes i ON i.object_id = t.object_id AND i.is_primary_key = 1 "
+        "JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id "
+        "JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id "
+        "ORDER BY t.create_date, t.name, ic.key_ordinal",
+        "SELECT child.name, cc.name, parent.name, pc.name FROM sys.foreign_key_columns fkc "
+        "JOIN sys.tables child ON child.object_id = fkc.parent_object_id "
+        "JOIN sys.columns cc ON cc.object_id = fkc.parent_object_id AND cc.column_id = fkc.parent_column_id "
+        "JOIN sys.tables parent ON parent.object_id = fkc.referenced_object_id "
+        "JOIN sys.columns pc ON pc.object_id = fkc.referenced_object_id AND pc.column_id = fkc.referenced_column_id "
+        "ORDER BY child.create_date, child.name, fkc.constraint_object_id",
+    ),
+    "sqlite": (
+        "SELECT m.name, p.name FROM sqlite_master m JOIN pragma_table_info(m.name) p "
+        "WHERE m.type = 'table' AND p.pk > 0 ORDER BY m.rowid, p.pk",
+        "SELECT m.name, f.\"from\", f.\"table\", f.\"to\" FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) f "
+        "WHERE m.type = 'table' ORDER BY m.rowid, f.id DESC, f.seq",
+    ),
+}
+
+_schema = None
+
+
+def load_schema(conn):
+    """Read ({table: [pk columns]}, [(child, column, parent, parent column)]) from the database's catalog."""
+    primary_keys_sql, foreign_keys_sql = CATALOG[db.dialect()]
+    cursor = conn.cursor()
+    primary_keys = {}
+    cursor.execute(primary_keys_sql)
+    for table, column in cursor.fetchall():
+        primary_keys.setdefault(table, []).append(column)
+    cursor.execute(foreign_keys_sql)
+    foreign_keys = [tuple(row) for row in cursor.fetchall()]
+    return primary_keys, foreign_keys
+
+
+def schema(conn=None):
+    """load_schema for the pool's database, read once per process (restart after running migrations)."""
+    global _schema
+    if _schema is None:
+        if conn is not None:
+            _schema = load_schema(conn)
+        else:
+            entry = db.pool.checkout()
+            try:
+                _schema = load_schema(entry.conn)
+            finally:
+                db.pool.release(entry)
+    return _schema
+
+
+def children_of(table, foreign_keys):
+    """Yield (child, condition template, parent column) for everything that references table."""
+    for child, column, parent, parent_column in foreign_keys:
+        if parent == table:
+            yield child, f"{column} {{}}", parent_column
+    for child, column, item_type, parent, parent_column in SOFT_REFERENCES:
+        if parent == table:
+            yield child, f"item_type = '{item_type}' AND {column} {{}}", parent_column
+
+
+def plan_delete(table, key_column=None, conn=None):
+    """Return [(table, where)] deleting one row of table and everything that depends on it.
+
+    Statements are in dependency order (deepest children first, the root row
+    last); each where clause has exactly one ? for the root key.
+    """
+    primary_keys, foreign_keys = schema(conn)
+    key_column = key_column or primary_keys[table][0]
+    steps = []
+    seen = set()
+
+    def visit(current, where, depth):
+        if depth > 10:
+            raise ValueError(f"Foreign key graph too deep at {current}")
+        for child, condition, parent_column in children_of(current, foreign_keys):
+            # A child of the root keyed on the root PK needs no subquery
+            if where == f"{parent_column} = ?":
+                child_where = condition.format("= ?")
+            else:
+                child_where = condition.format(f"IN (SELECT {parent_column} FROM {current} WHERE {where})")
+            visit(child, child_where, depth + 1)
+        if (current, where) not in seen:
+            seen.add((current, where))
+            steps.append((current, where))
+
+    visit(table, f"{key_column} = ?", 0)
+    return steps
+
+
+def estimate_rows(cursor, steps, key):
+    # One round trip: sum of every step's COUNT(*)
+    counts = " + ".join(f"(SELECT COUNT(*) FROM {table} WHERE {where})" for table, where in steps)
+    cursor.execute(f"SELECT {counts}", [key] * len(steps))
+    return cursor.fetchone()[0]
+
+
+def surviving_playlist_filter(steps):
+    """WHERE clause (and ? count) over Playlist_Songs rows removed from playlists that survive the delete."""
+    song_steps = [where for table, where in steps if table == "Playlist_Songs" and not where.startswith("playlist_id")]
+    return " OR ".join(f"({where})" for where in song_steps), len(song_steps)
+
+
+def affected_playlists(cursor, steps, key):
+    """Ids of playlists losing songs in this delete (their contents ETag must change)."""
+    where, count = surviving_playlist_filter(steps)
+    if not count:
+        return []
+    cursor.execute(f"SELECT DISTINCT playlist_id FROM Playlist_Songs WHERE {where}", [key] * count)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def touch_statement(steps):
+    where, count = surviving_playlist_filter(steps)
+    sql = ("UPDATE Playlists SET updated_at = GETDATE() "
+           f"WHERE playlist_id IN (SELECT playlist_id FROM Playlist_Songs WHERE {where})")
+    return sql, count
+
+
+def collect_keys(cursor, steps, key, collect):
+    """{table: [removed keys]} for the tables in collect ({table: key column}), read before deleting."""
+    removed = {}
+    for table, where in steps:
+        if table in collect:
+            cursor.execute(f"SELECT {collect[table]} FROM {table} WHERE {where}", (key,))
+            removed.setdefault(table, []).extend(row[0] for row in cursor.fetchall())
+    return removed
+
+
+def run_batched(conn, steps, key, touch=False):
+    """Every DELETE and the version bumps they call for in one transaction (the DELETEs in one round trip on SQL Server)."""
+    cursor = conn.cursor()
+    deleted = {}
+    if db.dialect() == "mssql":
+        statements = [f"DELETE FROM {table} WHERE {where}" for table, where in steps]
+        params = [key] * len(steps)
+        if touch:
+            sql, count = touch_statement(steps)
+            statements.insert(0, sql)
+            params = [key] * count + params
+        cursor.execute("; ".join(statements), params)
+        if touch:
+            cursor.nextset()
+        for table, _ in steps:
+            deleted[table] = deleted.get(table, 0) + max(cursor.rowcount, 0)
+            cursor.nextset()
+    else:
+        if touch:
+            sql, count = touch_statement(steps)
+            cursor.execute(sql, [key] * count)
+        for table, where in steps:
+            cursor.execute(f"DELETE FROM {table} WHERE {where}", (key,))
+            deleted[table] = deleted.get(table, 0) + max(cursor.rowcount, 0)
+    versions.bump(cursor, *[table for table, count in deleted.items() if count])
+    conn.commit()
+    return deleted
+
+
+def run_chunked(conn, steps, key, chunk_size, touch=False):
+    """Delete each step chunk_size rows at a time, committing between chunks.
+
+    Keeps row locks under the escalation threshold and the log from growing
+    with one huge transaction. Children always go before parents, so an
+    interrupted run leaves consistent data and can simply be re-run. Each
+    chunk that deletes rows of a versioned table bumps its version in the
+    same transaction.
+    """
+    cursor = conn.cursor()
+    deleted = {}
+    if touch:
+        sql, count = touch_statement(steps)
+        cursor.execute(sql, [key] * count)
+        conn.commit()
+    for table, where in steps:
+        if db.dialect() == "mssql":
+            sql = f"DELETE TOP ({int(chunk_size)}) FROM {table} WHERE {where}"
+        else:
+            sql = f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT {int(chunk_size)})"
+        while True:
+            cursor.execute(sql, (key,))
+            count = max(cursor.rowcount, 0)
+            if count:
+                versions.bump(cursor, table)
+            conn.commit()
+            deleted[table] = deleted.get(table, 0) + count
+            if count < chunk_size:
+                break
+    return deleted
+
+
+def cascade_delete(conn, table, key, chunk_threshold=None, chunk_size=None, collect=None):
+    """Delete table's row with primary key `key` and all dependents; returns a summary.
+
+    collect ({table: key column}) adds a "removed" entry listing the keys
+    deleted from those tables, for in-memory structures that must follow.
+    """
+    chunk_threshold = CASCADE_CONFIG["chunk_threshold"] if chunk_threshold is None else chunk_threshold
+    chunk_size = chunk_size or CASCADE_CONFIG["chunk_size"]
+    started = time.perf_counter()
+    steps = plan_delete(table, conn=conn)
+    try:
+        cursor = conn.cursor()
+        estimated = estimate_rows(cursor, steps, key)
+        playlist_ids = affected_playlists(cursor, steps, key)
+        removed = collect_keys(cursor, steps, key, collect) if collect else {}
+        if estimated > chunk_threshold:
+            deleted = run_chunked(conn, steps, key, chunk_size, bool(playlist_ids))
+            mode = "chunked"
+        else:
+            deleted = run_batched(conn, steps, key, bool(playlist_ids))
+            mode = "batched"
+    except Exception:
+        conn.rollback()
+        raise
+    summary = {
+        "mode": mode,
+        "found": deleted.get(table, 0) > 0,
+        "deleted": {name: count for name, count in deleted.items() if count},
+        "touched_playlists": playlist_ids,
+        "elapsed_seconds": round(time.perf_counter() - started, 4)
+    }
+    if collect:
+        summary["removed"] = removed
+    return summary
+
+
+def finish_delete(summary, tags, on_removed):
+    invalidate(*tags, *[f"playlist:{playlist_id}" for playlist_id in summary["touched_playlists"]])
+    removed = summary.pop("removed", None)
+    for callback in on_removed or ():
+        callback(removed)
+    return summary
+
+
+def cascade_delete_job(table, key, tags, collect=None, on_removed=None):
+    # Background jobs run outside a request, so they check out their own connection
+    entry = db.pool.checkout()
+    try:
+        summary = cascade_delete(entry.conn, table, key, collect=collect)
+    finally:
+        db.pool.release(entry)
+    return finish_delete(summary, tags, on_removed)
+
+
+def delete_response(conn, table, key, message, tags, collect=None, on_removed=None):
+    """Shared body of the DELETE routes: run the cascade now, or queue it with ?async=1.
+
+    Each callable in on_removed is called after commit with the "removed" keys of collect.
+    """
+    if request.args.get("async", "").lower() in ("1", "true"):
+        job_id = jobs.submit(f"delete {table} {key}", cascade_delete_job, table, key, tags, collect, on_removed)
+        return jsonify({"message": "Delete queued", "job_id": job_id}), 202
+
+    summary = cascade_delete(conn, table, key, collect=collect)
+    return jsonify({"message": message, **finish_delete(summary, tags, on_removed)}), 200
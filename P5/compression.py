@@ -0,0 +1,105 @@
+import zlib
+from flask import request
+from config import COMPRESSION_CONFIG
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/plain", "text/csv")
+
+
+def negotiate(accept_encodings):
+    """Pick "br" or "gzip" from an Accept-Encoding header (highest q wins, br on ties), else None."""
+    best = None
+    best_quality = 0
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Gzip:
+    def __init__(self):
+        # wbits=31: zlib stream with a gzip header and trailer
+        self._compressor = zlib.compressobj(COMPRESSION_CONFIG["gzip_level"], zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_CONFIG["brotli_quality"])
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+COMPRESSORS = {"gzip": _Gzip, "br": _Brotli}
+
+
+class CompressedStream:
+    """A streamed body compressed chunk by chunk, flushing after each so the client isn't held back."""
+
+    def __init__(self, chunks, encoding):
+        self._chunks = chunks
+        self._compressor = COMPRESSORS[encoding]()
+
+    def __iter__(self):
+        compressor = self._compressor
+        for chunk in self._chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    def close(self):
+        # Closing the original iterable runs its teardown (and returns the pooled connection)
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+
+
+def compress_response(response):
+    if (response.status_code != 200 or request.method == "HEAD" or response.direct_passthrough
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = CompressedStream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_CONFIG["min_size"]:
+            return response
+        compressor = COMPRESSORS[encoding]()
+        response.set_data(compressor.compress(body) + compressor.finish())
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    if COMPRESSION_CONFIG["enabled"]:
+        app.after_request(compress_response)
@@ -6,3 +6,125 @@ DB_CONFIG = {
     "PWD": "YourPassword",
     "Timeout": 60
 }
+
+# Which driver db.py uses: "pyodbc" for SQL Server, "sqlite" for local/in-memory testing
+DB_BACKEND = "pyodbc"
+
+# Used when DB_BACKEND is "sqlite"; the shared-cache URI keeps one in-memory database across pooled connections
+SQLITE_CONFIG = {
+    "DATABASE": "file:MusicMedia?mode=memory&cache=shared"
+}
+
+# Read replicas for GET/HEAD requests; writes and background jobs always use the primary above.
+# Each entry overrides DB_CONFIG (or SQLITE_CONFIG) keys, e.g. {"name": "replica1", "SERVER": "db-replica-1"}
+REPLICA_CONFIG = {
+    "replicas": [],
+    "eject_after": 3,               # consecutive connection failures before a replica is taken out of rotation
+    "retry_after": 30,              # seconds an ejected replica sits out before it is tried again
+    "sticky_seconds": 5,            # after a client's own write, its reads go to the primary this long
+    "sticky_cookie": "db_primary_until"
+}
+
+POOL_CONFIG = {
+    "max_size": 10,           # hard cap on open connections
+    "checkout_timeout": 30,   # seconds a request waits for a free connection
+    "max_idle": 300,          # seconds an unused connection may sit in the pool
+    "max_lifetime": 3600,     # seconds before a connection is recycled regardless of use
+    "health_check": True      # run SELECT 1 on checkout before handing out a connection
+}
+
+CACHE_CONFIG = {
+    "enabled": True,
+    "backend": "memory",      # "memory" (per process) or "redis" (shared between workers)
+    "max_entries": 10000,     # LRU bound for the memory backend
+    "ttl": 60,                # seconds a cached response may be served
+    "redis_url": "redis://localhost:6379/0"
+}
+
+CASCADE_CONFIG = {
+    "chunk_threshold": 20000,   # rows across all tables before a delete switches to chunked commits
+    "chunk_size": 4000          # rows per DELETE chunk; stays under SQL Server's 5000-lock escalation point
+}
+
+JOB_CONFIG = {
+    "workers": 2,               # background threads for async jobs (e.g. ?async=1 deletes)
+    "retention": 1000           # finished jobs kept for GET /api/jobs/<id>
+}
+
+FEED_CONFIG = {
+    "fanout_limit": 5000,       # authors with more followers are read on demand instead of fanned out
+    "backfill": 50,             # recent activities copied into a timeline on follow
+    "default_limit": 50,
+    "max_limit": 200
+}
+
+NOTIFY_CONFIG = {
+    "flush_interval_ms": 200,   # longest a queued notification waits before being written
+    "batch_size": 500,          # flush early once this many are queued
+    "max_queue": 100000,        # beyond this, new notifications are dropped (and counted)
+    "retry_seconds": 5          # wait before retrying a batch when the database is unreachable
+}
+
+SEARCH_CONFIG = {
+    "build_on_first_search": True,  # otherwise POST /api/search/rebuild must run first
+    "refresh_seconds": 30,          # how often a search checks Table_Versions for other workers' writes
+    "min_prefix": 2,                # shorter query tokens only match whole words
+    "max_prefix_expansions": 200,   # words a single prefix may expand to
+    "default_limit": 20,
+    "max_limit": 100
+}
+
+RECOMMEND_CONFIG = {
+    "top_k": 50,                # neighbours kept per song
+    "max_basket": 500,          # longer playlists only contribute their newest songs
+    "max_seeds": 50,            # recent liked/playlisted songs a user's recommendations start from
+    "refresh_seconds": 900,     # older matrices are rebuilt in the background on the next read
+    "retry_after": 5,           # Retry-After seconds on the 503 served until the first build finishes
+    "default_limit": 20,
+    "max_limit": 50
+}
+
+BATCH_CONFIG = {
+    "max_ids": 1000             # ids per /api/batch request, across all entity types after de-duplication
+}
+
+EVENTS_CONFIG = {
+    "flush_interval_ms": 100,   # longest an accepted event waits before being written
+    "batch_size": 2000,         # flush early once this many are buffered
+    "max_buffer": 50000,        # beyond this POST /api/events answers 503 until the buffer drains
+    "aof_dir": None,            # directory for the append-only event log (None keeps events in memory only)
+    "aof_fsync": "interval",    # "always" (before acknowledging), "interval" (once per flush) or "never"
+    "aof_max_bytes": 64 * 1024 * 1024,  # the log is rewritten with only unflushed events past this size
+    "retry_seconds": 5          # wait after a flush fails on every event (database unreachable)
+}
+
+SERVER_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 8000,
+    "workers": 4,               # processes; each has its own connection pool, cache and background threads
+    "threads": 10,              # handlers running at once per process; keep <= POOL_CONFIG["max_size"]
+    "max_pending": 2000,        # requests waiting for a thread before new ones get 503
+    "max_body_bytes": 64 * 1024 * 1024,
+    "keep_alive": 5,            # seconds an idle keep-alive connection is held open
+    "backlog": 2048,
+    "limit_concurrency": 10000  # open connections per process before uvicorn answers 503
+}
+
+METRICS_CONFIG = {
+    "enabled": True,            # False leaves connections unwrapped and skips the request hooks entirely
+    "server_timing": True,      # add a Server-Timing header with the per-phase breakdown
+    "slow_query_ms": 200,       # queries slower than this are logged and kept for /api/db/slow_queries
+    "slow_query_log_size": 100,
+    "max_sql_length": 500       # SQL text kept per slow query
+}
+
+SERIALIZER_CONFIG = {
+    "backend": "auto"           # "orjson", "json" (stdlib) or "auto": orjson when installed, else json
+}
+
+COMPRESSION_CONFIG = {
+    "enabled": True,
+    "min_size": 1024,           # smaller bodies go out as-is; streamed exports are always compressed
+    "gzip_level": 6,
+    "brotli_quality": 5         # used when the brotli package is installed and the client accepts br
+}
@@ -0,0 +1,460 @@
+import itertools
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from flask import current_app, g, has_request_context, request
+from config import DB_CONFIG, DB_BACKEND, SQLITE_CONFIG, POOL_CONFIG, REPLICA_CONFIG
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Backends: each one knows how to open a raw DB-API connection (to the primary unless given settings)
+def connect_pyodbc(settings=None):
+    import pyodbc
+    settings = settings or DB_CONFIG
+    return pyodbc.connect(
+        f"DRIVER={{{settings['DRIVER']}}};SERVER={settings['SERVER']};"
+        f"DATABASE={settings['DATABASE']};UID={settings['UID']};PWD={settings['PWD']}",
+        timeout=settings.get("Timeout", 0)
+    )
+
+
+def connect_sqlite(settings=None):
+    settings = settings or SQLITE_CONFIG
+    conn = sqlite3.connect(settings["DATABASE"], uri=True, check_same_thread=False)
+    # Routes use SQL Server's GETDATE(); give sqlite the same function. Microseconds keep
+    # updated_at-based ETags distinct for changes made within the same second.
+    conn.create_function("GETDATE", 0, lambda: datetime.now().isoformat(" "))
+    # sqlite ignores the schema's FOREIGN KEY constraints unless asked, per connection
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+# Store datetimes in sqlite as ISO text (the implicit adapter is deprecated)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+def to_datetime(value):
+    # pyodbc hands back datetime objects; sqlite hands back text
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+BACKENDS = {
+    "pyodbc": connect_pyodbc,
+    "sqlite": connect_sqlite
+}
+
+# Settings a REPLICA_CONFIG entry overrides for each backend
+BACKEND_SETTINGS = {
+    "pyodbc": DB_CONFIG,
+    "sqlite": SQLITE_CONFIG
+}
+
+# SQL flavour spoken by each backend (TOP vs LIMIT, etc.)
+DIALECTS = {
+    "pyodbc": "mssql",
+    "sqlite": "sqlite"
+}
+
+
+def reachable(conn):
+    """True if a trivial query still works on conn."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of DB-API connections."""
+
+    def __init__(self, connect, max_size=10, checkout_timeout=30, max_idle=300,
+                 max_lifetime=3600, health_check=True, name="primary"):
+        self.connect = connect
+        self.name = name
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+
+        self._idle = []
+        self._in_use = {}
+        self._lock = threading.Condition()
+        self._waiters = 0
+        self._stats = {
+            "created": 0,
+            "checkouts": 0,
+            "evicted": 0,
+            "failed_health_checks": 0,
+            "timeouts": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0
+        }
+
+    def _expired(self, entry, now):
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            return True
+        if self.max_idle and now - entry.last_used > self.max_idle:
+            return True
+        return False
+
+    def _is_healthy(self, conn):
+        return reachable(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def checkout(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        stale = []
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    entry = self._idle.pop()
+                    if self._expired(entry, now):
+                        self._stats["evicted"] += 1
+                        stale.append(entry.conn)
+                        continue
+                    break
+                else:
+                    entry = None
+
+                if entry is None and len(self._in_use) + len(self._idle) < self.max_size:
+                    # Reserve the slot, connect outside the lock
+                    entry = _PooledConnection(None)
+                if entry is not None:
+                    self._in_use[id(entry)] = entry
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    for conn in stale:
+                        self._discard(conn)
+                    raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+                self._waiters += 1
+                try:
+                    self._lock.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+            waited = time.monotonic() - started
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_time"] += waited
+            self._stats["max_wait_time"] = max(self._stats["max_wait_time"], waited)
+
+        for conn in stale:
+            self._discard(conn)
+
+        if entry.conn is not None and self.health_check and not self._is_healthy(entry.conn):
+            with self._lock:
+                self._stats["failed_health_checks"] += 1
+            self._discard(entry.conn)
+            entry.conn = None
+
+        if entry.conn is None:
+            try:
+                entry.conn = self.connect()
+                entry.created_at = time.monotonic()
+            except Exception:
+                with self._lock:
+                    del self._in_use[id(entry)]
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._stats["created"] += 1
+
+        entry.last_used = time.monotonic()
+        return entry
+
+    def release(self, entry, discard=False):
+        conn = entry.conn
+        if not discard:
+            try:
+                # Drop anything the handler left uncommitted (e.g. after an exception)
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._lock:
+            self._in_use.pop(id(entry), None)
+            if discard:
+                self._stats["evicted"] += 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._lock.notify()
+
+        if discard:
+            self._discard(conn)
+
+    def active(self):
+        """Connections checked out or being waited for; what least-connections routing compares."""
+        return len(self._in_use) + self._waiters
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._discard(entry.conn)
+
+    def stats(self):
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            connect = getattr(self.connect, "func", self.connect)
+            return {
+                "name": self.name,
+                "backend": getattr(connect, "__name__", str(connect)),
+                "max_size": self.max_size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "avg_wait_time": self._stats["total_wait_time"] / checkouts if checkouts else 0.0,
+                **self._stats
+            }
+
+
+class Replica:
+    """A read replica's pool and health.
+
+    Connection failures are counted; after REPLICA_CONFIG["eject_after"] in a
+    row the replica is skipped for "retry_after" seconds, then given another
+    chance (one more failure ejects it again, a success clears the count).
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.reads = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.pool.name
+
+    def available(self, now):
+        return self.ejected_until <= now
+
+    def succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self.reads += 1
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= REPLICA_CONFIG["eject_after"]:
+                self.ejected_until = time.monotonic() + REPLICA_CONFIG["retry_after"]
+                self.ejections += 1
+
+    def stats(self):
+        with self._lock:
+            return {"name": self.name, "ejected": not self.available(time.monotonic()),
+                    "failures": self.failures, "ejections": self.ejections, "reads": self.reads,
+                    "pool": self.pool.stats()}
+
+
+backend = DB_BACKEND
+pool = ConnectionPool(BACKENDS[backend], **POOL_CONFIG)
+replicas = []
+_rotation = itertools.count()
+
+
+def configure_replicas(entries=None, **options):
+    """Replace the replica pools from REPLICA_CONFIG["replicas"] (or entries) for the current backend."""
+    global replicas
+    for replica in replicas:
+        replica.pool.close_all()
+    settings = dict(POOL_CONFIG, **options)
+    replicas = []
+    for number, entry in enumerate(REPLICA_CONFIG["replicas"] if entries is None else entries, 1):
+        overrides = dict(entry)
+        name = overrides.pop("name", f"replica{number}")
+        connect = partial(BACKENDS[backend], dict(BACKEND_SETTINGS[backend], **overrides))
+        replicas.append(Replica(ConnectionPool(connect, name=name, **settings)))
+    return replicas
+
+
+def configure_pool(backend_name=None, **options):
+    """Replace the shared pool (and the replica pools), e.g. configure_pool("sqlite") in tests."""
+    global pool, backend
+    pool.close_all()
+    backend = backend_name or DB_BACKEND
+    settings = dict(POOL_CONFIG, **options)
+    pool = ConnectionPool(BACKENDS[backend], **settings)
+    configure_replicas(**options)
+    return pool
+
+
+configure_replicas()
+
+
+def dialect():
+    return DIALECTS[backend]
+
+
+def allocate_ids(cursor, name, count):
+    """Reserve count consecutive ids from Id_Allocator; the caller's transaction holds the row lock."""
+    cursor.execute("UPDATE Id_Allocator SET next_id = next_id + ? WHERE name = ?", (count, name))
+    if cursor.rowcount == 0:
+        raise LookupError(f"No Id_Allocator row for {name}")
+    cursor.execute("SELECT next_id FROM Id_Allocator WHERE name = ?", (name,))
+    end = cursor.fetchone()[0]
+    return range(end - count, end)
+
+
+# Key column of each Id_Allocator table
+ALLOCATED_KEYS = {"Notifications": "notification_id", "Likes": "like_id", "Activity_Feed": "activity_id"}
+
+
+def advance_ids(cursor, name, used_id):
+    """Move Id_Allocator past an id a client chose itself, so allocate_ids never hands it out.
+
+    Call it before the insert: the row lock then makes a concurrent
+    allocate_ids wait for this transaction instead of racing it to the id.
+    """
+    cursor.execute("UPDATE Id_Allocator SET next_id = ? WHERE name = ? AND next_id <= ?",
+                   (used_id + 1, name, used_id))
+
+
+def resync_ids(cursor, name):
+    """Move Id_Allocator past the table's highest key, e.g. after rows were inserted without advance_ids."""
+    column = ALLOCATED_KEYS[name]
+    cursor.execute(f"UPDATE Id_Allocator SET next_id = (SELECT MAX({column}) + 1 FROM {name}) "
+                   f"WHERE name = ? AND next_id <= (SELECT MAX({column}) FROM {name})", (name,))
+
+
+READ_METHODS = ("GET", "HEAD")
+
+
+def read_only(view):
+    """Mark a non-GET view that only reads (e.g. a POST carrying a query body) as safe for replicas."""
+    view.read_only = True
+    return view
+
+
+def is_read_request():
+    if request.method in READ_METHODS:
+        return True
+    return getattr(current_app.view_functions.get(request.endpoint), "read_only", False)
+
+
+def reads_from_primary():
+    """True while the client's sticky cookie says it wrote recently, so it reads its own writes."""
+    try:
+        return float(request.cookies.get(REPLICA_CONFIG["sticky_cookie"], 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def prefer_primary():
+    """Send this request's reads to the primary (e.g. to refill a cache entry a write just evicted)."""
+    g.read_from_primary = True
+
+
+def choose_replica(exclude=()):
+    """The available replica with the fewest active connections; ties rotate so idle replicas share load."""
+    now = time.monotonic()
+    candidates = [replica for replica in replicas if replica.available(now) and replica not in exclude]
+    if not candidates:
+        return None
+    offset = next(_rotation) % len(candidates)
+    return min(candidates[offset:] + candidates[:offset], key=lambda replica: replica.pool.active())
+
+
+def checkout_read():
+    """(pool, entry) from a replica, trying each in turn and falling back to the primary."""
+    tried = []
+    while True:
+        replica = choose_replica(tried)
+        if replica is None:
+            return pool, pool.checkout()
+        try:
+            entry = replica.pool.checkout()
+        except PoolTimeout:
+            # Busy rather than broken: try another without counting it against this one
+            tried.append(replica)
+            continue
+        except Exception:
+            replica.failed()
+            tried.append(replica)
+            continue
+        replica.succeeded()
+        return replica.pool, entry
+
+
+def _checkout_for_request():
+    if replicas and has_request_context() and is_read_request() and not reads_from_primary() \
+            and not g.get("read_from_primary"):
+        return checkout_read()
+    return pool, pool.checkout()
+
+
+# Set by metrics.init_app: wraps each request's connection as (conn, checkout seconds) -> conn
+connection_wrapper = None
+
+
+def get_db_connection():
+    # One pooled connection per request; returned to the pool on teardown.
+    # Read requests use a replica when any are configured; everything else uses the primary.
+    if "db_entry" not in g:
+        started = time.perf_counter()
+        g.db_pool, g.db_entry = _checkout_for_request()
+        conn = g.db_entry.conn
+        if connection_wrapper is not None:
+            conn = connection_wrapper(conn, time.perf_counter() - started)
+        g.db_conn = conn
+    return g.db_conn
+
+
+def release_db_connection(exception=None):
+    g.pop("db_conn", None)
+    entry = g.pop("db_entry", None)
+    owner = g.pop("db_pool", pool)
+    if entry is not None:
+        owner.release(entry)
+
+
+def mark_primary_read(response):
+    # After a successful write on the primary, the client's reads follow it there for sticky_seconds
+    if replicas and g.get("db_pool") is pool and response.status_code < 400 and not is_read_request():
+        sticky = REPLICA_CONFIG["sticky_seconds"]
+        response.set_cookie(REPLICA_CONFIG["sticky_cookie"], f"{time.time() + sticky:.3f}",
+                            max_age=sticky, httponly=True, samesite="Lax")
+    return response
+
+
+def replica_stats():
+    return [replica.stats() for replica in replicas]
+
+
+def init_app(app):
+    app.after_request(mark_primary_read)
+    app.teardown_appcontext(release_db_connection)
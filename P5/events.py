@@ -0,0 +1,406 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+import db
+import queries
+import recommend
+from config import EVENTS_CONFIG
+from feed import record_activities
+from notifications import notifier
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): every log in aof_dir is adopted at startup, so run one process
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Events are (type, user_id, item_id, item_type) tuples: likes of songs and
+# playlists, and song plays (item_type "Song").
+LIKE, PLAY = "like", "play"
+
+
+def parse_event(data):
+    """An event tuple from a request body object. Raises KeyError/ValueError/TypeError like bulk to_params."""
+    kind = data.get("type")
+    if kind == LIKE:
+        if data.get("item_type") not in ("Song", "Playlist"):
+            raise ValueError("item_type must be Song or Playlist")
+        return LIKE, int(data["user_id"]), int(data["item_id"]), data["item_type"]
+    if kind == PLAY:
+        return PLAY, int(data["user_id"]), int(data["song_id"]), "Song"
+    raise ValueError(f"type must be {LIKE} or {PLAY}")
+
+
+def write_events(conn, events):
+    """Write a batch in one transaction; returns (likes written, {song_id: plays}).
+
+    Repeated likes of an item by the same user within the batch are written
+    once, and plays are summed per song into one Play_Counts update.
+    """
+    likes = list(dict.fromkeys((user_id, item_id, item_type)
+                               for kind, user_id, item_id, item_type in events if kind == LIKE))
+    plays = Counter(item_id for kind, _, item_id, _ in events if kind == PLAY)
+    cursor = conn.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+    if likes:
+        like_ids = db.allocate_ids(cursor, "Likes", len(likes))
+        queries.run_many(cursor, "users.like", [(like_id, *like) for like_id, like in zip(like_ids, likes)])
+        song_likes = [(user_id, item_id) for user_id, item_id, item_type in likes if item_type == "Song"]
+        if song_likes:
+            now = datetime.now()
+            activity_ids = db.allocate_ids(cursor, "Activity_Feed", len(song_likes))
+            record_activities(cursor, [(activity_id, user_id, "liked_song", song_id, "Song", now)
+                                       for activity_id, (user_id, song_id) in zip(activity_ids, song_likes)])
+    if plays:
+        queries.run_many(cursor, f"plays.add.{db.dialect()}", list(plays.items()))
+    conn.commit()
+    return likes, plays
+
+
+def after_write(conn, likes):
+    """What create_like does once its row is committed: recommendations and playlist owner notifications."""
+    playlist_likes = []
+    for user_id, item_id, item_type in likes:
+        if item_type == "Song":
+            recommend.recommender.add_like(user_id, item_id)
+        else:
+            playlist_likes.append((user_id, item_id))
+    if playlist_likes:
+        owners = {row.playlist_id: row.user_id for row in queries.fetch_in(
+            conn.cursor(), "playlists.by_ids", list(dict.fromkeys(item_id for _, item_id in playlist_likes)))}
+        for user_id, playlist_id in playlist_likes:
+            if playlist_id in owners:
+                notifier.enqueue(owners[playlist_id], "Like", f"playlist {playlist_id}", user_id)
+
+
+class EventLog:
+    """Append-only file of accepted events, with markers for how far they have been written.
+
+    Lines are JSON: [seq, type, user_id, item_id, item_type] for an event
+    and [seq] once every event up to seq is in the database. Each process
+    writes its own events-<pid>.aof under an exclusive flock; at startup a
+    process adopts the logs no live process holds and replays whatever
+    they had not written yet. Replay is at-least-once: events written just
+    before a crash, ahead of their marker, are written again.
+    """
+
+    def __init__(self, directory, fsync="interval"):
+        self.directory = directory
+        self.fsync = fsync
+        self.path = os.path.join(directory, f"events-{os.getpid()}.aof")
+        self.size = 0
+        self._file = None
+
+    @staticmethod
+    def _lock(f):
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _unflushed(f):
+        events = []
+        flushed = 0
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # a line cut short by the crash; nothing after it was acknowledged
+            if len(entry) == 1:
+                flushed = entry[0]
+            else:
+                events.append(entry)
+        return [tuple(entry[1:]) for entry in events if entry[0] > flushed]
+
+    def open(self):
+        """Adopt orphaned logs (including an old one at this path) and start this process's log with their
+        unflushed events, renumbered from 1. Returns those (seq, event) entries, oldest first.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        adopted = []
+        events = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "events-*.aof")), key=os.path.getmtime):
+            f = open(path, "rb")
+            # A log another process already adopted and removed is skipped (st_nlink drops to 0)
+            if not self._lock(f) or os.fstat(f.fileno()).st_nlink == 0:
+                f.close()
+                continue
+            events.extend(self._unflushed(f))
+            adopted.append((path, f))
+        entries = list(enumerate(events, 1))
+        # The new log holds the events before the old logs go away
+        self.rewrite(entries)
+        for path, f in adopted:
+            if path != self.path:
+                os.remove(path)
+            f.close()
+        return entries
+
+    def rewrite(self, entries):
+        """Replace the log with just these (seq, event) entries, e.g. once it passes aof_max_bytes."""
+        temporary = self.path + ".tmp"
+        f = open(temporary, "ab")
+        self._lock(f)
+        f.truncate(0)
+        f.write(b"".join(self._line([seq, *event]) for seq, event in entries))
+        f.flush()
+        os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        if self._file is not None:
+            self._file.close()
+        self._file = f
+        self.size = f.tell()
+
+    @staticmethod
+    def _line(entry):
+        return json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+
+    def append(self, entries):
+        data = b"".join(self._line([seq, *event]) for seq, event in entries)
+        self._file.write(data)
+        self._file.flush()
+        self.size += len(data)
+
+    def mark_flushed(self, seq):
+        data = self._line([seq])
+        self._file.write(data)
+        self._file.flush()
+        self.size += len(data)
+
+    def sync(self):
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+
+    def close(self, remove=False):
+        if self._file is not None:
+            if remove:
+                os.remove(self.path)
+            self._file.close()
+            self._file = None
+
+
+class EventBuffer:
+    """Write-behind buffer for like and play events.
+
+    Accepted events wait in memory (and in the append-only log when
+    aof_dir is set) and a background thread writes them in batched
+    transactions every flush_interval_ms or batch_size events. Past
+    max_buffer, submit() refuses new events until the writer catches up.
+    """
+
+    def __init__(self, flush_interval_ms=100, batch_size=2000, max_buffer=50000, aof_dir=None,
+                 aof_fsync="interval", aof_max_bytes=64 * 1024 * 1024, retry_seconds=5):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.aof_max_bytes = aof_max_bytes
+        self.retry_seconds = retry_seconds
+        self._log = EventLog(aof_dir, aof_fsync) if aof_dir else None
+        self._log_opened = False
+        self._pending = deque()     # (seq, event), oldest first
+        self._in_flight = 0
+        self._seq = 0
+        self._done_seq = 0
+        self._urgent = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._stats = {"accepted": 0, "refused": 0, "written": 0, "coalesced": 0, "dropped": 0,
+                       "batches": 0, "failed_batches": 0, "replayed": 0}
+        self.last_error = None
+
+    def start(self):
+        """Start the writer, first replaying any events a previous process accepted but never wrote."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._log is not None and not self._log_opened:
+                replayed = self._log.open()
+                self._pending.extend(replayed)
+                self._seq = self._done_seq = 0
+                if replayed:
+                    self._seq = replayed[-1][0]
+                self._log_opened = True
+                self._stats["replayed"] += len(replayed)
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="events", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Write what is buffered and stop; with a log, anything left unwritten is replayed on next start."""
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            if self._log is not None and self._log_opened and not self._pending and not self._in_flight:
+                self._log.close(remove=True)
+                self._log_opened = False
+
+    def submit(self, events):
+        """Buffer events; returns False, buffering none of them, when they would overflow max_buffer."""
+        self.start()
+        with self._cond:
+            if len(self._pending) + self._in_flight + len(events) > self.max_buffer:
+                self._stats["refused"] += len(events)
+                return False
+            entries = list(zip(range(self._seq + 1, self._seq + len(events) + 1), events))
+            self._seq += len(events)
+            if self._log is not None:
+                # Appended under the lock so the file keeps seq order
+                self._log.append(entries)
+            self._pending.extend(entries)
+            self._stats["accepted"] += len(events)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        if self._log is not None and self._log.fsync == "always":
+            # Outside the lock: one fsync covers every append made before it, so concurrent requests share it
+            self._log.sync()
+        return True
+
+    def flush(self, timeout=30):
+        """Write everything accepted so far without waiting out the interval; False if it timed out."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._seq
+            self._urgent = True
+            self._cond.notify_all()
+            while self._done_seq < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None or not self._thread.is_alive():
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _count(self, name, amount=1):
+        with self._cond:
+            self._stats[name] += amount
+
+    def _take(self):
+        # Wait for the first event, then collect until the batch fills or the window closes
+        with self._cond:
+            deadline = None
+            while len(self._pending) < self.batch_size:
+                if self._pending and (self._urgent or self._stopping.is_set()):
+                    break
+                if not self._pending:
+                    if self._stopping.is_set():
+                        return None
+                    self._cond.wait(self.flush_interval)
+                    continue
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._in_flight = len(batch)
+            if not self._pending:
+                self._urgent = False
+            return batch
+
+    def _run(self):
+        batch = None
+        while True:
+            if batch is None:
+                batch = self._take()
+                if batch is None:
+                    return
+                if self._log is not None and self._log.fsync == "interval":
+                    self._log.sync()
+            if self._write([event for _, event in batch]):
+                self._done(batch[-1][0])
+                batch = None
+            elif self._stopping.is_set():
+                # Database still unreachable at shutdown: the log (if any) replays these on next start
+                return
+            else:
+                self._stopping.wait(self.retry_seconds)
+
+    def _write(self, events):
+        """Write a batch; True once it is done (every event written or dropped), False to retry it later."""
+        try:
+            entry = db.pool.checkout()
+        except Exception as e:
+            self.last_error = str(e)
+            self._count("failed_batches")
+            return False
+        try:
+            try:
+                likes, plays = write_events(entry.conn, events)
+                written = len(likes) + len(plays)
+                self._count("written", written)
+                self._count("coalesced", len(events) - written)
+                self._count("batches")
+                after_write(entry.conn, likes)
+                return True
+            except Exception as e:
+                entry.conn.rollback()
+                self.last_error = str(e)
+
+            # A like or activity id taken by a row written outside the allocator would fail every batch after it
+            try:
+                cursor = entry.conn.cursor()
+                db.resync_ids(cursor, "Likes")
+                db.resync_ids(cursor, "Activity_Feed")
+                entry.conn.commit()
+            except Exception:
+                entry.conn.rollback()
+
+            # One bad event (e.g. a like from a deleted user) fails the whole batch; find it one event at a time
+            written = 0
+            failed = []
+            for event in events:
+                try:
+                    likes, plays = write_events(entry.conn, [event])
+                    written += 1
+                    after_write(entry.conn, likes)
+                except Exception as e:
+                    entry.conn.rollback()
+                    self.last_error = str(e)
+                    failed.append(event)
+            if not written and not db.reachable(entry.conn):
+                self._count("failed_batches")
+                return False
+            self._count("written", written)
+            self._count("dropped", len(failed))
+            self._count("batches")
+            if failed:
+                log.warning("Dropped %d events the database rejected (%s)", len(failed), self.last_error)
+            return True
+        finally:
+            db.pool.release(entry)
+
+    def _done(self, seq):
+        with self._cond:
+            self._in_flight = 0
+            self._done_seq = seq
+            if self._log is not None:
+                self._log.mark_flushed(seq)
+                if self._log.size > self.aof_max_bytes:
+                    self._log.rewrite(self._pending)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"pending": len(self._pending), "in_flight": self._in_flight, "last_error": self.last_error,
+                    "aof": self._log.path if self._log is not None else None,
+                    "aof_bytes": self._log.size if self._log is not None else None, **self._stats}
+
+
+buffer = EventBuffer(**EVENTS_CONFIG)
+atexit.register(buffer.stop)
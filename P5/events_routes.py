@@ -0,0 +1,49 @@
+from flask import Blueprint, jsonify, request
+from bulk import parse_bulk_body, validate_rows
+from config import EVENTS_CONFIG
+from events import buffer, parse_event
+
+events_routes = Blueprint('events_routes', __name__)
+
+
+# POST: Buffer like/play events for batched writing (JSON array or NDJSON body)
+# {"type": "like", "user_id": 1, "item_id": 5, "item_type": "Song"} or {"type": "play", "user_id": 1, "song_id": 5}
+# Answers 202 once the events are buffered (and logged, with aof_dir set); 503 with Retry-After when the buffer is full
+@events_routes.route("/", methods=["POST"])
+def add_events():
+    try:
+        rows = parse_bulk_body(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    valid, errors = validate_rows(rows, parse_event)
+    report = {"received": len(rows), "accepted": 0, "failed": len(errors), "errors": errors}
+    if not valid:
+        return jsonify(report), 400
+
+    try:
+        if not buffer.submit([event for _, event in valid]):
+            response = jsonify({"error": "Event buffer is full, retry later"})
+            response.headers["Retry-After"] = str(max(1, round(EVENTS_CONFIG["flush_interval_ms"] / 1000)))
+            return response, 503
+        report["accepted"] = len(valid)
+        return jsonify(report), 202 if not errors else 207
+    except Exception as e:
+        return jsonify({"error": f"Failed to buffer events: {e}"}), 500
+
+
+# POST: Write every buffered event now and wait for it (e.g. before reading Likes back in a test)
+@events_routes.route("/flush", methods=["POST"])
+def flush_events():
+    try:
+        if not buffer.flush():
+            return jsonify({"error": "Timed out waiting for buffered events to be written", **buffer.stats()}), 504
+        return jsonify({"message": "Events written", **buffer.stats()}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to flush events: {e}"}), 500
+
+
+# GET: Buffer depth and counters (accepted, refused, written, coalesced, dropped, replayed)
+@events_routes.route("/stats", methods=["GET"])
+def get_event_stats():
+    return jsonify(buffer.stats())
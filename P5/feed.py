@@ -0,0 +1,183 @@
+import heapq
+from datetime import datetime
+from config import FEED_CONFIG
+from db import to_datetime, advance_ids
+from pagination import top_clause, limit_clause
+
+ACTIONS = ("created_playlist", "liked_song", "commented")
+ITEM_TYPES = ("Playlist", "Song", "User")
+
+FEED_COLUMNS = "a.activity_id, a.activity_time, a.user_id, a.action, a.item_id, a.item_type"
+
+
+def parse_cursor(token):
+    """Feed cursors are "<activity_time ISO>|<activity_id>"; returns (datetime, id) or None."""
+    if not token:
+        return None
+    try:
+        time_part, id_part = token.rsplit("|", 1)
+        return datetime.fromisoformat(time_part), int(id_part)
+    except ValueError:
+        raise ValueError("before must look like <activity_time>|<activity_id>")
+
+
+def format_cursor(activity_time, activity_id):
+    return f"{to_datetime(activity_time).isoformat()}|{activity_id}"
+
+
+def is_pull_user(cursor, user_id):
+    cursor.execute("SELECT 1 FROM Feed_Pull_Users WHERE user_id = ?", (user_id,))
+    return cursor.fetchone() is not None
+
+
+INSERT_ACTIVITY = ("INSERT INTO Activity_Feed (activity_id, user_id, action, item_id, item_type, activity_time) "
+                   "VALUES (?, ?, ?, ?, ?, ?)")
+FAN_OUT = ("INSERT INTO User_Timeline (user_id, activity_id, activity_time) "
+           "SELECT DISTINCT follower_id, ?, ? FROM Follows WHERE followed_id = ?")
+
+
+def pushes_to_timelines(cursor, user_id):
+    """False for fan-out-on-read authors; an author past FEED_CONFIG["fanout_limit"] followers is switched over here."""
+    if is_pull_user(cursor, user_id):
+        return False
+    cursor.execute("SELECT COUNT(*) FROM Follows WHERE followed_id = ?", (user_id,))
+    if cursor.fetchone()[0] > FEED_CONFIG["fanout_limit"]:
+        cursor.execute("INSERT INTO Feed_Pull_Users (user_id) VALUES (?)", (user_id,))
+        return False
+    return True
+
+
+def record_activity(conn, activity_id, user_id, action, item_id, item_type):
+    """Insert an Activity_Feed row and fan it out to the author's followers' timelines.
+
+    Authors above FEED_CONFIG["fanout_limit"] followers are switched to
+    fan-out-on-read instead: they go into Feed_Pull_Users and their activity
+    is merged into each follower's feed when it is read.
+    Returns the number of timelines written.
+    """
+    activity_time = datetime.now()
+    cursor = conn.cursor()
+    # Client-chosen id: keep the event buffer's Id_Allocator block from handing it out again
+    advance_ids(cursor, "Activity_Feed", int(activity_id))
+    cursor.execute(INSERT_ACTIVITY, (activity_id, user_id, action, item_id, item_type, activity_time))
+
+    fanned_out = 0
+    if pushes_to_timelines(cursor, user_id):
+        cursor.execute(FAN_OUT, (activity_id, activity_time, user_id))
+        fanned_out = max(cursor.rowcount, 0)
+    conn.commit()
+    return fanned_out
+
+
+def record_activities(cursor, activities):
+    """record_activity for many (activity_id, user_id, action, item_id, item_type, activity_time) rows at once.
+
+    The fan-out decision is made once per author. The caller commits.
+    """
+    cursor.executemany(INSERT_ACTIVITY, activities)
+    pushes = {user_id: pushes_to_timelines(cursor, user_id) for user_id in dict.fromkeys(row[1] for row in activities)}
+    fan_out = [(activity_id, activity_time, user_id)
+               for activity_id, user_id, _, _, _, activity_time in activities if pushes[user_id]]
+    if fan_out:
+        cursor.executemany(FAN_OUT, fan_out)
+
+
+def follow(conn, follow_id, follower_id, followed_id):
+    """Add a Follows row and backfill the followed user's recent activity. Returns False if already following."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM Follows WHERE follower_id = ? AND followed_id = ?", (follower_id, followed_id))
+    if cursor.fetchone():
+        return False
+
+    cursor.execute("INSERT INTO Follows (follow_id, follower_id, followed_id) VALUES (?, ?, ?)",
+                   (follow_id, follower_id, followed_id))
+    if not is_pull_user(cursor, followed_id):
+        backfill = FEED_CONFIG["backfill"]
+        cursor.execute(
+            f"INSERT INTO User_Timeline (user_id, activity_id, activity_time) "
+            f"SELECT {top_clause(backfill)}?, activity_id, activity_time FROM Activity_Feed WHERE user_id = ? "
+            f"ORDER BY activity_time DESC, activity_id DESC{limit_clause(backfill)}",
+            (follower_id, followed_id)
+        )
+    conn.commit()
+    return True
+
+
+def unfollow(conn, follower_id, followed_id):
+    """Remove the Follows row(s) and the followed user's entries from the follower's timeline."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Follows WHERE follower_id = ? AND followed_id = ?", (follower_id, followed_id))
+    removed = max(cursor.rowcount, 0)
+    cursor.execute(
+        "DELETE FROM User_Timeline WHERE user_id = ? "
+        "AND activity_id IN (SELECT activity_id FROM Activity_Feed WHERE user_id = ?)",
+        (follower_id, followed_id)
+    )
+    conn.commit()
+    return removed
+
+
+def _before_clause(alias, before):
+    if before is None:
+        return "", []
+    activity_time, activity_id = before
+    return (f" AND ({alias}.activity_time < ? OR ({alias}.activity_time = ? AND {alias}.activity_id < ?))",
+            [activity_time, activity_time, activity_id])
+
+
+def read_feed(conn, user_id, before=None, limit=None):
+    """Newest-first page of a user's feed; returns (activities, next cursor or None)."""
+    limit = limit or FEED_CONFIG["default_limit"]
+    cursor = conn.cursor()
+
+    # Pushed activities: one index range scan of the materialized timeline
+    where, params = _before_clause("t", before)
+    cursor.execute(
+        f"SELECT {top_clause(limit + 1)}{FEED_COLUMNS} FROM User_Timeline t "
+        "JOIN Activity_Feed a ON a.activity_id = t.activity_id "
+        f"WHERE t.user_id = ?{where} "
+        f"ORDER BY t.activity_time DESC, t.activity_id DESC{limit_clause(limit + 1)}",
+        [user_id] + params
+    )
+    pushed = cursor.fetchall()
+
+    # Pulled activities from followed authors too big to fan out
+    where, params = _before_clause("a", before)
+    cursor.execute(
+        f"SELECT {top_clause(limit + 1)}{FEED_COLUMNS} FROM Follows f "
+        "JOIN Feed_Pull_Users p ON p.user_id = f.followed_id "
+        "JOIN Activity_Feed a ON a.user_id = f.followed_id "
+        f"WHERE f.follower_id = ?{where} "
+        f"ORDER BY a.activity_time DESC, a.activity_id DESC{limit_clause(limit + 1)}",
+        [user_id] + params
+    )
+    pulled = cursor.fetchall()
+
+    def newest_first(row):
+        return to_datetime(row[1]), row[0]
+
+    activities = []
+    seen = set()
+    # An author switched to pull mode may still have older pushed entries, hence the de-duplication
+    for row in heapq.merge(pushed, pulled, key=newest_first, reverse=True):
+        if row[0] in seen:
+            continue
+        seen.add(row[0])
+        activities.append(row)
+        if len(activities) > limit:
+            break
+
+    next_before = None
+    if len(activities) > limit:
+        activities = activities[:limit]
+        next_before = format_cursor(activities[-1][1], activities[-1][0])
+    return [
+        {
+            "activity_id": row[0],
+            "activity_time": to_datetime(row[1]),
+            "user_id": row[2],
+            "action": row[3],
+            "item_id": row[4],
+            "item_type": row[5]
+        } for row in activities
+    ], next_before
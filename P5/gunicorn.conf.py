@@ -0,0 +1,17 @@
+# gunicorn -c gunicorn.conf.py asgi:app
+from config import SERVER_CONFIG
+
+bind = f"{SERVER_CONFIG['host']}:{SERVER_CONFIG['port']}"
+# uvicorn workers serve asgi.app: one event loop per process holds the connections,
+# SERVER_CONFIG["threads"] threads per process run the Flask handlers
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = SERVER_CONFIG["workers"]
+backlog = SERVER_CONFIG["backlog"]
+keepalive = SERVER_CONFIG["keep_alive"]
+worker_connections = SERVER_CONFIG["limit_concurrency"]
+# Streamed exports can run long; a worker is only killed after this much silence
+timeout = 120
+graceful_timeout = 30
+# Recycle workers now and then so slow leaks (e.g. the in-process caches) can't grow forever
+max_requests = 100000
+max_requests_jitter = 10000
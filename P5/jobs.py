@@ -0,0 +1,55 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import JOB_CONFIG
+
+
+class JobQueue:
+    """Runs functions on a small thread pool and remembers their outcome by job id."""
+
+    def __init__(self, workers=2, retention=1000):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, **kwargs):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {"job_id": job_id, "name": name, "status": "queued",
+                                  "submitted_at": time.time(), "finished_at": None,
+                                  "result": None, "error": None}
+            # Forget the oldest finished jobs once over the retention limit
+            while len(self._jobs) > self.retention:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest]["status"] in ("queued", "running"):
+                    break
+                del self._jobs[oldest]
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="running")
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+jobs = JobQueue(JOB_CONFIG["workers"], JOB_CONFIG["retention"])
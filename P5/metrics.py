@@ -0,0 +1,313 @@
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import deque
+from flask import has_request_context, request
+import db
+import serializer
+from config import METRICS_CONFIG
+
+log = logging.getLogger(__name__)
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Per-request phases, in Server-Timing order; "app" is whatever is left (routing, dict building, ...)
+PHASES = ("checkout", "execute", "fetch", "commit", "serialize")
+SERVER_TIMING_NAMES = {"checkout": "db-checkout", "execute": "db-execute", "fetch": "db-fetch",
+                       "commit": "db-commit", "serialize": "serialize"}
+
+
+class Metric:
+    """A counter or histogram with fixed label names, rendered in Prometheus' text format."""
+
+    def __init__(self, name, kind, help_text, labels=(), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def observe(self, value, *label_values):
+        # Counts are kept per bucket and made cumulative when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, [list(value[0]), value[1]] if self.kind == "histogram" else value)
+                           for key, value in self._values.items())
+        for label_values, value in items:
+            pairs = list(zip(self.labels, label_values))
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{format_labels(pairs)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(pairs + [('le', repr(float(bound)))])} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{format_labels(pairs + [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{format_labels(pairs)} {cumulative}")
+        return lines
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+REQUEST_SECONDS = Metric("http_request_duration_seconds", "histogram", "Request handling time by route",
+                         ("method", "route", "status"), BUCKETS)
+PHASE_SECONDS = Metric("http_request_phase_seconds_total", "counter", "Time spent per request phase by route",
+                       ("route", "phase"))
+QUERY_SECONDS = Metric("db_query_duration_seconds", "histogram",
+                       "Statement execution time by statement kind and table", ("statement",), BUCKETS)
+ROWS_FETCHED = Metric("db_rows_fetched_total", "counter", "Rows returned by fetch calls")
+ROWS_AFFECTED = Metric("db_rows_affected_total", "counter", "Rows changed by INSERT/UPDATE/DELETE", ("statement",))
+SLOW_QUERIES = Metric("db_slow_queries_total", "counter", "Statements slower than the slow-query threshold",
+                      ("statement",))
+CHECKOUT_SECONDS = Metric("db_checkout_duration_seconds", "histogram",
+                          "Time a request waited for a pooled connection", (), BUCKETS)
+METRICS = [REQUEST_SECONDS, PHASE_SECONDS, QUERY_SECONDS, ROWS_FETCHED, ROWS_AFFECTED, SLOW_QUERIES, CHECKOUT_SECONDS]
+
+slow_queries = deque(maxlen=METRICS_CONFIG["slow_query_log_size"])
+
+VERB = re.compile(r"(?:\s|--[^\n]*\n)*(\w+)")
+TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+(\w+)", re.IGNORECASE)
+_labels = {}
+
+
+def statement_label(sql):
+    """Low-cardinality label for a statement, e.g. "SELECT Songs" or "INSERT Likes"."""
+    label = _labels.get(sql)
+    if label is None:
+        verb = VERB.match(sql)
+        table = TABLE.search(sql)
+        label = f"{verb.group(1).upper() if verb else '?'} {table.group(1) if table else '-'}"
+        # IN lists make the SQL text itself unbounded; stop memoizing past a sane size
+        if len(_labels) < 10000:
+            _labels[sql] = label
+    return label
+
+
+# The current request's phase timings; a request runs on one thread from start to finish
+_current = threading.local()
+
+
+def add_phase(phase, seconds):
+    timings = getattr(_current, "timings", None)
+    if timings is not None:
+        timings[phase] += seconds
+
+
+def record_query(sql, seconds, rowcount):
+    statement = statement_label(sql)
+    QUERY_SECONDS.observe(seconds, statement)
+    if rowcount and rowcount > 0 and not statement.startswith("SELECT"):
+        ROWS_AFFECTED.inc(rowcount, statement)
+    timings = getattr(_current, "timings", None)
+    if timings is not None:
+        timings["execute"] += seconds
+        timings["queries"] += 1
+    if seconds * 1000 >= METRICS_CONFIG["slow_query_ms"]:
+        SLOW_QUERIES.inc(1, statement)
+        endpoint = request.endpoint if has_request_context() else None
+        slow_queries.append({"statement": statement, "sql": sql[:METRICS_CONFIG["max_sql_length"]],
+                             "duration_ms": round(seconds * 1000, 2), "rowcount": rowcount,
+                             "endpoint": endpoint, "at": time.time()})
+        log.warning("Slow query (%.1f ms, %s): %s", seconds * 1000, endpoint, sql[:METRICS_CONFIG["max_sql_length"]])
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute/fetch calls; everything else passes through."""
+
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. bulk.py setting fast_executemany on a pyodbc cursor
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _timed(self, method, sql, args):
+        started = time.perf_counter()
+        try:
+            result = method(sql, *args)
+        finally:
+            record_query(sql, time.perf_counter() - started, getattr(self._cursor, "rowcount", -1))
+        return self if result is self._cursor else result
+
+    def execute(self, sql, *args):
+        return self._timed(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._timed(self._cursor.executemany, sql, args)
+
+    def _fetch_rows(self, method, *args):
+        started = time.perf_counter()
+        rows = method(*args)
+        add_phase("fetch", time.perf_counter() - started)
+        if rows:
+            ROWS_FETCHED.inc(len(rows))
+        return rows
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        add_phase("fetch", time.perf_counter() - started)
+        if row is not None:
+            ROWS_FETCHED.inc()
+        return row
+
+    def fetchmany(self, *args):
+        return self._fetch_rows(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch_rows(self._cursor.fetchall)
+
+
+class InstrumentedConnection:
+    """Connection proxy handing out InstrumentedCursors and timing commits."""
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return InstrumentedCursor(self._conn.cursor())
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            add_phase("commit", time.perf_counter() - started)
+
+
+def instrument_connection(conn, checkout_seconds):
+    CHECKOUT_SECONDS.observe(checkout_seconds)
+    add_phase("checkout", checkout_seconds)
+    return InstrumentedConnection(conn)
+
+
+class TimedJSONProvider(serializer.FastJSONProvider):
+    """The app's JSON provider, with encoding time counted as the "serialize" phase."""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            add_phase("serialize", time.perf_counter() - started)
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            add_phase("serialize", time.perf_counter() - started)
+
+    def rows(self, fields, rows, *args):
+        started = time.perf_counter()
+        try:
+            return super().rows(fields, rows, *args)
+        finally:
+            add_phase("serialize", time.perf_counter() - started)
+
+
+def start_request():
+    timings = dict.fromkeys(PHASES, 0.0)
+    timings["queries"] = 0
+    timings["started"] = time.perf_counter()
+    _current.timings = timings
+
+
+def finish_request(response):
+    timings = getattr(_current, "timings", None)
+    if timings is None:
+        return response
+    _current.timings = None
+    total = time.perf_counter() - timings["started"]
+    current = request._get_current_object()
+    route = current.url_rule.rule if current.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(total, current.method, route, response.status_code)
+    measured = 0.0
+    for phase in PHASES:
+        if timings[phase]:
+            PHASE_SECONDS.inc(timings[phase], route, phase)
+            measured += timings[phase]
+    PHASE_SECONDS.inc(max(total - measured, 0.0), route, "app")
+
+    if METRICS_CONFIG["server_timing"]:
+        parts = []
+        for phase in PHASES:
+            if timings[phase]:
+                part = f"{SERVER_TIMING_NAMES[phase]};dur={timings[phase] * 1000:.2f}"
+                if phase == "execute":
+                    count = timings["queries"]
+                    part += f';desc="{count} quer{"y" if count == 1 else "ies"}"'
+                parts.append(part)
+        parts.append(f"app;dur={max(total - measured, 0.0) * 1000:.2f}")
+        parts.append(f"total;dur={total * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
+
+def gauge_lines(prefix, stats, help_text):
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# HELP {prefix}_{key} {help_text}")
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {value}")
+    return lines
+
+
+def render():
+    """All metrics in Prometheus text format, plus the pool/cache/notifier stats as gauges."""
+    from cache import cache
+    from notifications import notifier
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(gauge_lines("db_pool", db.pool.stats(), "Connection pool statistic"))
+    lines.extend(gauge_lines("response_cache", cache.stats(), "Response cache statistic"))
+    lines.extend(gauge_lines("notifications", notifier.stats(), "Notification pipeline statistic"))
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    if not METRICS_CONFIG["enabled"]:
+        return
+    app.json = TimedJSONProvider(app)
+    db.connection_wrapper = instrument_connection
+    app.before_request(start_request)
+    app.after_request(finish_request)
@@ -0,0 +1,124 @@
+import argparse
+import os
+import re
+import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+BASE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "P3", "Intial.sql")
+
+# 0001_name.sql runs everywhere, 0002_name.mssql.sql only on that dialect
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+?)(?:\.(mssql|sqlite))?\.sql$")
+GO = re.compile(r"^\s*GO\s*$", re.IGNORECASE | re.MULTILINE)
+
+
+def split_batches(sql):
+    # GO is a client-side batch separator, not T-SQL; the driver must get one batch at a time
+    return [batch.strip() for batch in GO.split(sql) if batch.strip()]
+
+
+def discover(dialect):
+    """Return [(version, name, path)] for this dialect, ordered by version."""
+    migrations = {}
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version, name, only = int(match.group(1)), match.group(2), match.group(3)
+        if only and only != dialect:
+            continue
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        migrations[version] = (version, name, os.path.join(MIGRATIONS_DIR, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def ensure_migrations_table(conn, dialect):
+    cursor = conn.cursor()
+    if dialect == "mssql":
+        cursor.execute(
+            "IF OBJECT_ID('schema_migrations', 'U') IS NULL "
+            "CREATE TABLE schema_migrations (version INT NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL, "
+            "applied_at DATETIME DEFAULT GETDATE())"
+        )
+    else:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (version INT NOT NULL PRIMARY KEY, "
+            "name VARCHAR(255) NOT NULL, applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        )
+    conn.commit()
+
+
+def applied_versions(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, dialect, target=None):
+    """Apply pending migrations up to target (inclusive); returns the versions applied."""
+    ensure_migrations_table(conn, dialect)
+    done = applied_versions(conn)
+    applied = []
+    for version, name, path in discover(dialect):
+        if target is not None and version > target:
+            break
+        if version in done:
+            continue
+        with open(path) as f:
+            batches = split_batches(f.read())
+        cursor = conn.cursor()
+        try:
+            for batch in batches:
+                cursor.execute(batch)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def status(conn, dialect):
+    ensure_migrations_table(conn, dialect)
+    done = applied_versions(conn)
+    return [(version, name, version in done) for version, name, _ in discover(dialect)]
+
+
+def create_base_schema(conn):
+    """Create the Intial.sql tables on sqlite (tests and benchmarks; SQL Server runs Intial.sql itself)."""
+    with open(BASE_SCHEMA) as f:
+        sql = f.read()
+    cursor = conn.cursor()
+    for batch in split_batches(sql):
+        if not batch.startswith("CREATE TABLE"):
+            continue
+        # sqlite rejects non-deterministic CHECKs and function-call defaults
+        batch = re.sub(r"CONSTRAINT\s+date_chk\s+CHECK\s*\(release_date <= GETDATE\(\)\)", "", batch)
+        batch = batch.replace("DEFAULT GETDATE()", "DEFAULT CURRENT_TIMESTAMP")
+        cursor.execute(batch)
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--backend", default=db.backend, choices=sorted(db.BACKENDS))
+    parser.add_argument("--target", type=int, help="stop after this version")
+    parser.add_argument("--status", action="store_true", help="list migrations and exit")
+    args = parser.parse_args()
+
+    dialect = db.DIALECTS[args.backend]
+    conn = db.BACKENDS[args.backend]()
+    try:
+        if args.status:
+            for version, name, is_applied in status(conn, dialect):
+                print(f"{version:04d} {name:<40} {'applied' if is_applied else 'pending'}")
+            return
+        applied = migrate(conn, dialect, args.target)
+        print(f"Applied {len(applied)} migration(s): {', '.join(map(str, applied)) or 'none'}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+-- Foreign-key indexes for the lookups and cascade deletes in the route modules.
+-- Each FK index leads with the FK column and ends with the table's primary key
+-- so filtered keyset pages (WHERE fk = ? AND pk > ? ORDER BY pk) are a range seek.
+
+-- get_songs ?artist_id= / ?album_id= / ?genre_id=, delete_artist, delete_album
+CREATE INDEX IX_Songs_artist_id ON Songs (artist_id, song_id);
+GO
+CREATE INDEX IX_Songs_album_id ON Songs (album_id, song_id);
+GO
+CREATE INDEX IX_Songs_genre_id ON Songs (genre_id, song_id);
+GO
+
+-- get_albums ?artist_id=, delete_artist
+CREATE INDEX IX_Albums_artist_id ON Albums (artist_id, album_id);
+GO
+
+-- get_playlists ?user_id=, delete_user
+CREATE INDEX IX_Playlists_user_id ON Playlists (user_id, playlist_id);
+GO
+
+-- delete_song, delete_artist, delete_album (the PK only covers playlist_song_id)
+CREATE INDEX IX_Playlist_Songs_song_id ON Playlist_Songs (song_id);
+GO
+
+-- delete_user
+CREATE INDEX IX_Follows_follower_id ON Follows (follower_id);
+GO
+CREATE INDEX IX_Likes_user_id ON Likes (user_id);
+GO
+CREATE INDEX IX_Comments_user_id ON Comments (user_id);
+GO
+CREATE INDEX IX_Reports_user_id ON Reports (user_id);
+GO
+
+-- Likes on an item (counts, cascade when a song or playlist goes away)
+CREATE INDEX IX_Likes_item ON Likes (item_type, item_id);
+GO
+
+-- delete_artist: the composite PKs lead with album_id / song_id
+CREATE INDEX IX_Contribution_Album_Table_artist_id ON Contribution_Album_Table (artist_id);
+GO
+CREATE INDEX IX_Contribution_Song_Table_artist_id ON Contribution_Song_Table (artist_id);
+GO
@@ -0,0 +1,17 @@
+-- Covering indexes (SQL Server INCLUDE columns) for the per-user and per-playlist reads.
+
+-- get_playlist_songs: seek by playlist, walk playlist_song_id, no key lookup for song_id
+CREATE INDEX IX_Playlist_Songs_playlist_id ON Playlist_Songs (playlist_id, playlist_song_id) INCLUDE (song_id);
+GO
+
+-- Follower lists / counts and delete_user
+CREATE INDEX IX_Follows_followed_id ON Follows (followed_id) INCLUDE (follower_id);
+GO
+
+-- Recent activity for a user, newest first
+CREATE INDEX IX_Activity_Feed_user_time ON Activity_Feed (user_id, activity_time DESC) INCLUDE (action, item_id, item_type);
+GO
+
+-- Unread notifications for a user
+CREATE INDEX IX_Notifications_user_read ON Notifications (user_id, is_read) INCLUDE (type, time_sent);
+GO
@@ -0,0 +1,13 @@
+-- sqlite has no INCLUDE; widen the keys instead so the same reads stay index-only.
+
+CREATE INDEX IX_Playlist_Songs_playlist_id ON Playlist_Songs (playlist_id, playlist_song_id, song_id);
+GO
+
+CREATE INDEX IX_Follows_followed_id ON Follows (followed_id, follower_id);
+GO
+
+CREATE INDEX IX_Activity_Feed_user_time ON Activity_Feed (user_id, activity_time DESC, action, item_id, item_type);
+GO
+
+CREATE INDEX IX_Notifications_user_read ON Notifications (user_id, is_read, type, time_sent);
+GO
@@ -0,0 +1,28 @@
+-- Materialized per-user activity timelines for GET /api/users/<id>/feed.
+-- Activities are fanned out to each follower's timeline on write; authors
+-- with too many followers are listed in Feed_Pull_Users and merged in on read.
+
+CREATE TABLE User_Timeline (
+  user_id INT NOT NULL,
+  activity_id INT NOT NULL,
+  activity_time DATETIME NOT NULL,
+  CONSTRAINT User_Timeline_PK PRIMARY KEY (user_id, activity_id),
+  CONSTRAINT User_Timeline_FK1 FOREIGN KEY (user_id) REFERENCES Users(user_id),
+  CONSTRAINT User_Timeline_FK2 FOREIGN KEY (activity_id) REFERENCES Activity_Feed(activity_id)
+);
+GO
+
+-- Newest-first keyset pages of one user's timeline
+CREATE INDEX IX_User_Timeline_time ON User_Timeline (user_id, activity_time DESC, activity_id DESC);
+GO
+
+-- Cascade deletes of an activity's timeline entries
+CREATE INDEX IX_User_Timeline_activity_id ON User_Timeline (activity_id);
+GO
+
+CREATE TABLE Feed_Pull_Users (
+  user_id INT NOT NULL,
+  CONSTRAINT Feed_Pull_Users_PK PRIMARY KEY (user_id),
+  CONSTRAINT Feed_Pull_Users_FK FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+GO
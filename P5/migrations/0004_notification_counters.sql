@@ -0,0 +1,26 @@
+-- Unread notification counters maintained by the notification worker, so the
+-- unread badge is a primary-key read instead of COUNT(*) over Notifications.
+
+CREATE TABLE Notification_Counts (
+  user_id INT NOT NULL,
+  unread INT NOT NULL DEFAULT 0,
+  CONSTRAINT Notification_Counts_PK PRIMARY KEY (user_id),
+  CONSTRAINT Notification_Counts_FK FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+GO
+
+INSERT INTO Notification_Counts (user_id, unread)
+SELECT user_id, COUNT(*) FROM Notifications WHERE is_read = 'FALSE' GROUP BY user_id;
+GO
+
+-- Block id allocation for tables without IDENTITY keys that the server writes itself
+CREATE TABLE Id_Allocator (
+  name VARCHAR(50) NOT NULL,
+  next_id INT NOT NULL,
+  CONSTRAINT Id_Allocator_PK PRIMARY KEY (name)
+);
+GO
+
+INSERT INTO Id_Allocator (name, next_id)
+SELECT 'Notifications', COALESCE(MAX(notification_id), 0) + 1 FROM Notifications;
+GO
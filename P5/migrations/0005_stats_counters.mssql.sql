@@ -0,0 +1,160 @@
+-- Summary tables behind /api/stats, kept current by triggers so every write path
+-- (routes, bulk inserts, cascade deletes, background jobs) maintains them and the
+-- stats endpoints read a handful of rows instead of aggregating Songs/Follows/Likes.
+
+CREATE TABLE Stats_Counters (
+  name VARCHAR(50) NOT NULL,
+  value BIGINT NOT NULL,
+  CONSTRAINT Stats_Counters_PK PRIMARY KEY (name)
+);
+GO
+
+-- Songs per duration; the smallest key is the shortest song
+CREATE TABLE Song_Duration_Counts (
+  duration INT NOT NULL,
+  songs INT NOT NULL,
+  CONSTRAINT Song_Duration_Counts_PK PRIMARY KEY (duration)
+);
+GO
+
+CREATE TABLE Genre_Song_Counts (
+  genre_id INT NOT NULL,
+  songs INT NOT NULL,
+  CONSTRAINT Genre_Song_Counts_PK PRIMARY KEY (genre_id)
+);
+GO
+
+CREATE TABLE Follower_Counts (
+  user_id INT NOT NULL,
+  followers INT NOT NULL,
+  CONSTRAINT Follower_Counts_PK PRIMARY KEY (user_id),
+  CONSTRAINT Follower_Counts_FK FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+GO
+
+CREATE TABLE Like_Counts (
+  item_type VARCHAR(10) NOT NULL,
+  item_id INT NOT NULL,
+  likes INT NOT NULL,
+  CONSTRAINT Like_Counts_PK PRIMARY KEY (item_type, item_id)
+);
+GO
+
+CREATE INDEX IX_Follower_Counts_followers ON Follower_Counts (followers) INCLUDE (user_id);
+GO
+
+-- Titles of the shortest songs without scanning Songs
+CREATE INDEX IX_Songs_duration ON Songs (duration) INCLUDE (title);
+GO
+
+INSERT INTO Stats_Counters (name, value)
+SELECT 'artists', COUNT(*) FROM Artists
+UNION ALL SELECT 'songs', COUNT(*) FROM Songs
+UNION ALL SELECT 'timed_songs', COUNT(duration) FROM Songs
+UNION ALL SELECT 'duration_total', COALESCE(SUM(CAST(duration AS BIGINT)), 0) FROM Songs;
+GO
+
+INSERT INTO Song_Duration_Counts (duration, songs)
+SELECT duration, COUNT(*) FROM Songs WHERE duration IS NOT NULL GROUP BY duration;
+GO
+
+INSERT INTO Genre_Song_Counts (genre_id, songs)
+SELECT genre_id, COUNT(*) FROM Songs WHERE genre_id IS NOT NULL GROUP BY genre_id;
+GO
+
+INSERT INTO Follower_Counts (user_id, followers)
+SELECT followed_id, COUNT(*) FROM Follows GROUP BY followed_id;
+GO
+
+INSERT INTO Like_Counts (item_type, item_id, likes)
+SELECT item_type, item_id, COUNT(*) FROM Likes GROUP BY item_type, item_id;
+GO
+
+-- Triggers see a statement's rows all at once: +1 per inserted row, -1 per deleted
+-- row (an UPDATE is both), summed per key and applied with one MERGE; rows that
+-- drop to zero are removed.
+
+CREATE TRIGGER TR_Songs_Stats ON Songs AFTER INSERT, UPDATE, DELETE AS
+BEGIN
+  SET NOCOUNT ON;
+
+  UPDATE s SET value = s.value + d.delta
+  FROM Stats_Counters s
+  JOIN (
+    SELECT 'songs' AS name, (SELECT COUNT(*) FROM inserted) - (SELECT COUNT(*) FROM deleted) AS delta
+    UNION ALL
+    SELECT 'timed_songs', (SELECT COUNT(duration) FROM inserted) - (SELECT COUNT(duration) FROM deleted)
+    UNION ALL
+    SELECT 'duration_total', COALESCE((SELECT SUM(CAST(duration AS BIGINT)) FROM inserted), 0)
+                           - COALESCE((SELECT SUM(CAST(duration AS BIGINT)) FROM deleted), 0)
+  ) d ON d.name = s.name
+  WHERE d.delta <> 0;
+
+  MERGE Song_Duration_Counts AS t
+  USING (
+    SELECT duration, SUM(delta) AS delta FROM (
+      SELECT duration, 1 AS delta FROM inserted WHERE duration IS NOT NULL
+      UNION ALL
+      SELECT duration, -1 FROM deleted WHERE duration IS NOT NULL
+    ) changes GROUP BY duration HAVING SUM(delta) <> 0
+  ) AS c ON t.duration = c.duration
+  WHEN MATCHED AND t.songs + c.delta <= 0 THEN DELETE
+  WHEN MATCHED THEN UPDATE SET songs = t.songs + c.delta
+  WHEN NOT MATCHED AND c.delta > 0 THEN INSERT (duration, songs) VALUES (c.duration, c.delta);
+
+  MERGE Genre_Song_Counts AS t
+  USING (
+    SELECT genre_id, SUM(delta) AS delta FROM (
+      SELECT genre_id, 1 AS delta FROM inserted WHERE genre_id IS NOT NULL
+      UNION ALL
+      SELECT genre_id, -1 FROM deleted WHERE genre_id IS NOT NULL
+    ) changes GROUP BY genre_id HAVING SUM(delta) <> 0
+  ) AS c ON t.genre_id = c.genre_id
+  WHEN MATCHED AND t.songs + c.delta <= 0 THEN DELETE
+  WHEN MATCHED THEN UPDATE SET songs = t.songs + c.delta
+  WHEN NOT MATCHED AND c.delta > 0 THEN INSERT (genre_id, songs) VALUES (c.genre_id, c.delta);
+END;
+GO
+
+CREATE TRIGGER TR_Artists_Stats ON Artists AFTER INSERT, DELETE AS
+BEGIN
+  SET NOCOUNT ON;
+  UPDATE Stats_Counters
+  SET value = value + (SELECT COUNT(*) FROM inserted) - (SELECT COUNT(*) FROM deleted)
+  WHERE name = 'artists';
+END;
+GO
+
+CREATE TRIGGER TR_Follows_Stats ON Follows AFTER INSERT, DELETE AS
+BEGIN
+  SET NOCOUNT ON;
+  MERGE Follower_Counts AS t
+  USING (
+    SELECT followed_id, SUM(delta) AS delta FROM (
+      SELECT followed_id, 1 AS delta FROM inserted
+      UNION ALL
+      SELECT followed_id, -1 FROM deleted
+    ) changes GROUP BY followed_id HAVING SUM(delta) <> 0
+  ) AS c ON t.user_id = c.followed_id
+  WHEN MATCHED AND t.followers + c.delta <= 0 THEN DELETE
+  WHEN MATCHED THEN UPDATE SET followers = t.followers + c.delta
+  WHEN NOT MATCHED AND c.delta > 0 THEN INSERT (user_id, followers) VALUES (c.followed_id, c.delta);
+END;
+GO
+
+CREATE TRIGGER TR_Likes_Stats ON Likes AFTER INSERT, DELETE AS
+BEGIN
+  SET NOCOUNT ON;
+  MERGE Like_Counts AS t
+  USING (
+    SELECT item_type, item_id, SUM(delta) AS delta FROM (
+      SELECT item_type, item_id, 1 AS delta FROM inserted
+      UNION ALL
+      SELECT item_type, item_id, -1 FROM deleted
+    ) changes GROUP BY item_type, item_id HAVING SUM(delta) <> 0
+  ) AS c ON t.item_type = c.item_type AND t.item_id = c.item_id
+  WHEN MATCHED AND t.likes + c.delta <= 0 THEN DELETE
+  WHEN MATCHED THEN UPDATE SET likes = t.likes + c.delta
+  WHEN NOT MATCHED AND c.delta > 0 THEN INSERT (item_type, item_id, likes) VALUES (c.item_type, c.item_id, c.delta);
+END;
+GO
@@ -0,0 +1,153 @@
+-- sqlite version of 0005_stats_counters.mssql.sql (no INCLUDE, per-row triggers).
+
+CREATE TABLE Stats_Counters (
+  name VARCHAR(50) NOT NULL,
+  value BIGINT NOT NULL,
+  CONSTRAINT Stats_Counters_PK PRIMARY KEY (name)
+);
+GO
+
+-- Songs per duration; the smallest key is the shortest song
+CREATE TABLE Song_Duration_Counts (
+  duration INT NOT NULL,
+  songs INT NOT NULL,
+  CONSTRAINT Song_Duration_Counts_PK PRIMARY KEY (duration)
+);
+GO
+
+CREATE TABLE Genre_Song_Counts (
+  genre_id INT NOT NULL,
+  songs INT NOT NULL,
+  CONSTRAINT Genre_Song_Counts_PK PRIMARY KEY (genre_id)
+);
+GO
+
+CREATE TABLE Follower_Counts (
+  user_id INT NOT NULL,
+  followers INT NOT NULL,
+  CONSTRAINT Follower_Counts_PK PRIMARY KEY (user_id),
+  CONSTRAINT Follower_Counts_FK FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+GO
+
+CREATE TABLE Like_Counts (
+  item_type VARCHAR(10) NOT NULL,
+  item_id INT NOT NULL,
+  likes INT NOT NULL,
+  CONSTRAINT Like_Counts_PK PRIMARY KEY (item_type, item_id)
+);
+GO
+
+CREATE INDEX IX_Follower_Counts_followers ON Follower_Counts (followers, user_id);
+GO
+
+-- Titles of the shortest songs without scanning Songs
+CREATE INDEX IX_Songs_duration ON Songs (duration, title);
+GO
+
+INSERT INTO Stats_Counters (name, value)
+SELECT 'artists', COUNT(*) FROM Artists
+UNION ALL SELECT 'songs', COUNT(*) FROM Songs
+UNION ALL SELECT 'timed_songs', COUNT(duration) FROM Songs
+UNION ALL SELECT 'duration_total', COALESCE(SUM(duration), 0) FROM Songs;
+GO
+
+INSERT INTO Song_Duration_Counts (duration, songs)
+SELECT duration, COUNT(*) FROM Songs WHERE duration IS NOT NULL GROUP BY duration;
+GO
+
+INSERT INTO Genre_Song_Counts (genre_id, songs)
+SELECT genre_id, COUNT(*) FROM Songs WHERE genre_id IS NOT NULL GROUP BY genre_id;
+GO
+
+INSERT INTO Follower_Counts (user_id, followers)
+SELECT followed_id, COUNT(*) FROM Follows GROUP BY followed_id;
+GO
+
+INSERT INTO Like_Counts (item_type, item_id, likes)
+SELECT item_type, item_id, COUNT(*) FROM Likes GROUP BY item_type, item_id;
+GO
+
+-- sqlite triggers fire per row; an UPDATE of duration/genre_id undoes the old
+-- values and applies the new ones. Rows that drop to zero are removed.
+
+CREATE TRIGGER TR_Songs_Stats_Insert AFTER INSERT ON Songs
+BEGIN
+  UPDATE Stats_Counters SET value = value + 1 WHERE name = 'songs';
+  UPDATE Stats_Counters SET value = value + 1 WHERE name = 'timed_songs' AND NEW.duration IS NOT NULL;
+  UPDATE Stats_Counters SET value = value + COALESCE(NEW.duration, 0) WHERE name = 'duration_total';
+  INSERT INTO Song_Duration_Counts (duration, songs) SELECT NEW.duration, 1 WHERE NEW.duration IS NOT NULL
+    ON CONFLICT (duration) DO UPDATE SET songs = songs + 1;
+  INSERT INTO Genre_Song_Counts (genre_id, songs) SELECT NEW.genre_id, 1 WHERE NEW.genre_id IS NOT NULL
+    ON CONFLICT (genre_id) DO UPDATE SET songs = songs + 1;
+END;
+GO
+
+CREATE TRIGGER TR_Songs_Stats_Delete AFTER DELETE ON Songs
+BEGIN
+  UPDATE Stats_Counters SET value = value - 1 WHERE name = 'songs';
+  UPDATE Stats_Counters SET value = value - 1 WHERE name = 'timed_songs' AND OLD.duration IS NOT NULL;
+  UPDATE Stats_Counters SET value = value - COALESCE(OLD.duration, 0) WHERE name = 'duration_total';
+  UPDATE Song_Duration_Counts SET songs = songs - 1 WHERE duration = OLD.duration;
+  DELETE FROM Song_Duration_Counts WHERE duration = OLD.duration AND songs <= 0;
+  UPDATE Genre_Song_Counts SET songs = songs - 1 WHERE genre_id = OLD.genre_id;
+  DELETE FROM Genre_Song_Counts WHERE genre_id = OLD.genre_id AND songs <= 0;
+END;
+GO
+
+CREATE TRIGGER TR_Songs_Stats_Update AFTER UPDATE OF duration, genre_id ON Songs
+BEGIN
+  UPDATE Stats_Counters SET value = value - 1 WHERE name = 'timed_songs' AND OLD.duration IS NOT NULL;
+  UPDATE Stats_Counters SET value = value + 1 WHERE name = 'timed_songs' AND NEW.duration IS NOT NULL;
+  UPDATE Stats_Counters SET value = value - COALESCE(OLD.duration, 0) + COALESCE(NEW.duration, 0)
+    WHERE name = 'duration_total';
+  UPDATE Song_Duration_Counts SET songs = songs - 1 WHERE duration = OLD.duration;
+  DELETE FROM Song_Duration_Counts WHERE duration = OLD.duration AND songs <= 0;
+  INSERT INTO Song_Duration_Counts (duration, songs) SELECT NEW.duration, 1 WHERE NEW.duration IS NOT NULL
+    ON CONFLICT (duration) DO UPDATE SET songs = songs + 1;
+  UPDATE Genre_Song_Counts SET songs = songs - 1 WHERE genre_id = OLD.genre_id;
+  DELETE FROM Genre_Song_Counts WHERE genre_id = OLD.genre_id AND songs <= 0;
+  INSERT INTO Genre_Song_Counts (genre_id, songs) SELECT NEW.genre_id, 1 WHERE NEW.genre_id IS NOT NULL
+    ON CONFLICT (genre_id) DO UPDATE SET songs = songs + 1;
+END;
+GO
+
+CREATE TRIGGER TR_Artists_Stats_Insert AFTER INSERT ON Artists
+BEGIN
+  UPDATE Stats_Counters SET value = value + 1 WHERE name = 'artists';
+END;
+GO
+
+CREATE TRIGGER TR_Artists_Stats_Delete AFTER DELETE ON Artists
+BEGIN
+  UPDATE Stats_Counters SET value = value - 1 WHERE name = 'artists';
+END;
+GO
+
+CREATE TRIGGER TR_Follows_Stats_Insert AFTER INSERT ON Follows
+BEGIN
+  INSERT INTO Follower_Counts (user_id, followers) VALUES (NEW.followed_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET followers = followers + 1;
+END;
+GO
+
+CREATE TRIGGER TR_Follows_Stats_Delete AFTER DELETE ON Follows
+BEGIN
+  UPDATE Follower_Counts SET followers = followers - 1 WHERE user_id = OLD.followed_id;
+  DELETE FROM Follower_Counts WHERE user_id = OLD.followed_id AND followers <= 0;
+END;
+GO
+
+CREATE TRIGGER TR_Likes_Stats_Insert AFTER INSERT ON Likes
+BEGIN
+  INSERT INTO Like_Counts (item_type, item_id, likes) VALUES (NEW.item_type, NEW.item_id, 1)
+    ON CONFLICT (item_type, item_id) DO UPDATE SET likes = likes + 1;
+END;
+GO
+
+CREATE TRIGGER TR_Likes_Stats_Delete AFTER DELETE ON Likes
+BEGIN
+  UPDATE Like_Counts SET likes = likes - 1 WHERE item_type = OLD.item_type AND item_id = OLD.item_id;
+  DELETE FROM Like_Counts WHERE item_type = OLD.item_type AND item_id = OLD.item_id AND likes <= 0;
+END;
+GO
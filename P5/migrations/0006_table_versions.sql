@@ -0,0 +1,17 @@
+-- Version tokens for the tables behind the cacheable list endpoints. Write
+-- handlers bump a table's row in the same transaction as their change, so a
+-- GET can answer 304 Not Modified after a primary-key read of this table.
+
+CREATE TABLE Table_Versions (
+  name VARCHAR(50) NOT NULL,
+  version BIGINT NOT NULL DEFAULT 0,
+  CONSTRAINT Table_Versions_PK PRIMARY KEY (name)
+);
+GO
+
+INSERT INTO Table_Versions (name, version) VALUES ('Songs', 0);
+GO
+INSERT INTO Table_Versions (name, version) VALUES ('Artists', 0);
+GO
+INSERT INTO Table_Versions (name, version) VALUES ('Albums', 0);
+GO
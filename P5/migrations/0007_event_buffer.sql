@@ -0,0 +1,20 @@
+-- Tables written by the event buffer (events.py). Buffered likes and their
+-- activities take ids from Id_Allocator in blocks, one allocation per flush.
+
+INSERT INTO Id_Allocator (name, next_id)
+SELECT 'Likes', COALESCE(MAX(like_id), 0) + 1 FROM Likes;
+GO
+
+INSERT INTO Id_Allocator (name, next_id)
+SELECT 'Activity_Feed', COALESCE(MAX(activity_id), 0) + 1 FROM Activity_Feed;
+GO
+
+-- Play events are coalesced per song before they are written, so a flush adds
+-- to one row per song instead of inserting one row per play
+CREATE TABLE Play_Counts (
+  song_id INT NOT NULL,
+  plays BIGINT NOT NULL DEFAULT 0,
+  CONSTRAINT Play_Counts_PK PRIMARY KEY (song_id),
+  CONSTRAINT Play_Counts_FK FOREIGN KEY (song_id) REFERENCES Songs(song_id)
+);
+GO
@@ -0,0 +1,225 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+import db
+from config import NOTIFY_CONFIG
+
+log = logging.getLogger(__name__)
+
+VERBS = {
+    "Follow": "followed you",
+    "Like": "liked your {item}",
+    "Comment": "commented on your {item}"
+}
+
+
+def build_message(notification_type, actors, item):
+    verb = VERBS[notification_type].format(item=item)
+    if len(actors) == 1:
+        return f"User {actors[0]} {verb}"
+    return f"User {actors[0]} and {len(actors) - 1} others {verb}"
+
+
+def coalesce(events):
+    """Group (user_id, type, item, actor) events so each (user, type, item) yields one notification."""
+    groups = {}
+    for user_id, notification_type, item, actor in events:
+        actors = groups.setdefault((user_id, notification_type, item), [])
+        if actor not in actors:
+            actors.append(actor)
+    return groups
+
+
+# (user_id, count) upserts: one statement, so two workers creating the same user's counter cannot collide
+ADD_UNREAD = {
+    "mssql": ("MERGE Notification_Counts WITH (HOLDLOCK) AS counts "
+              "USING (SELECT ? AS user_id, ? AS unread) AS added ON counts.user_id = added.user_id "
+              "WHEN MATCHED THEN UPDATE SET unread = counts.unread + added.unread "
+              "WHEN NOT MATCHED THEN INSERT (user_id, unread) VALUES (added.user_id, added.unread);"),
+    "sqlite": ("INSERT INTO Notification_Counts (user_id, unread) VALUES (?, ?) "
+               "ON CONFLICT (user_id) DO UPDATE SET unread = unread + excluded.unread"),
+}
+
+
+def write_notifications(conn, groups):
+    """Insert one row per group and bump the unread counters, all in one transaction."""
+    cursor = conn.cursor()
+    ids = db.allocate_ids(cursor, "Notifications", len(groups))
+    now = datetime.now()
+    rows = [(notification_id, user_id, notification_type, build_message(notification_type, actors, item), now)
+            for notification_id, ((user_id, notification_type, item), actors) in zip(ids, groups.items())]
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+    cursor.executemany(
+        "INSERT INTO Notifications (notification_id, user_id, type, message, time_sent, is_read) "
+        "VALUES (?, ?, ?, ?, ?, 'FALSE')",
+        rows
+    )
+
+    per_user = {}
+    for user_id, _, _ in groups:
+        per_user[user_id] = per_user.get(user_id, 0) + 1
+    cursor.executemany(ADD_UNREAD[db.dialect()], list(per_user.items()))
+    conn.commit()
+    return len(rows)
+
+
+class NotificationWorker:
+    """Background thread that batches, coalesces and writes queued notifications."""
+
+    def __init__(self, flush_interval_ms=200, batch_size=500, max_queue=100000, retry_seconds=5):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.retry_seconds = retry_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats = {"queued": 0, "dropped": 0, "written": 0, "coalesced": 0, "batches": 0, "failed_batches": 0,
+                       "rejected": 0}
+        self.last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, user_id, notification_type, item, actor):
+        """Queue a notification for user_id; never blocks the request. Returns False if dropped."""
+        if user_id == actor:
+            return False
+        self.start()
+        try:
+            self._queue.put_nowait((user_id, notification_type, item, actor))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("queued")
+        return True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _drain(self):
+        # Wait for the first event, then collect until the batch fills or the window closes
+        events = []
+        deadline = None
+        while len(events) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                events.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return events
+
+    def _run(self):
+        events = None
+        while True:
+            if events is None:
+                if self._stopping.is_set() and self._queue.empty():
+                    return
+                events = self._drain() or None
+                continue
+            if self.flush(events):
+                events = None
+            elif self._stopping.is_set():
+                # Database still unreachable at shutdown; nothing more can be done with these
+                self._count("dropped", len(events))
+                return
+            else:
+                # Keep the drained batch and try it again rather than losing it
+                self._stopping.wait(self.retry_seconds)
+
+    def flush(self, events):
+        """Write a drained batch; True once it is done, False if the database could not be reached (retry later)."""
+        groups = coalesce(events)
+        try:
+            entry = db.pool.checkout()
+        except Exception as e:
+            self.last_error = str(e)
+            self._count("failed_batches")
+            return False
+        try:
+            try:
+                written = write_notifications(entry.conn, groups)
+                self._count("written", written)
+                self._count("coalesced", len(events) - written)
+                self._count("batches")
+                return True
+            except Exception as e:
+                entry.conn.rollback()
+                self.last_error = str(e)
+
+            # One bad row (e.g. a user deleted since the event was queued) fails the whole batch;
+            # write the groups one at a time so only that row is lost
+            written = 0
+            rejected = 0
+            for key, actors in groups.items():
+                try:
+                    written += write_notifications(entry.conn, {key: actors})
+                except Exception as e:
+                    entry.conn.rollback()
+                    self.last_error = str(e)
+                    rejected += 1
+            if not written and not db.reachable(entry.conn):
+                self._count("failed_batches")
+                return False
+            self._count("written", written)
+            self._count("rejected", rejected)
+            self._count("coalesced", len(events) - written - rejected)
+            self._count("batches")
+            if rejected:
+                log.warning("Dropped %d notifications the database rejected (%s)", rejected, self.last_error)
+            return True
+        finally:
+            db.pool.release(entry)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._queue.qsize(), "last_error": self.last_error, **self._stats}
+
+
+notifier = NotificationWorker(**NOTIFY_CONFIG)
+atexit.register(notifier.stop)
+
+
+def unread_count(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT unread FROM Notification_Counts WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def mark_read(conn, user_id, notification_ids=None):
+    """Mark some or all unread notifications read and move the counter down by the same amount."""
+    cursor = conn.cursor()
+    sql = "UPDATE Notifications SET is_read = 'TRUE' WHERE user_id = ? AND is_read = 'FALSE'"
+    params = [user_id]
+    if notification_ids:
+        sql += f" AND notification_id IN ({', '.join('?' for _ in notification_ids)})"
+        params.extend(notification_ids)
+    cursor.execute(sql, params)
+    changed = max(cursor.rowcount, 0)
+    if changed:
+        cursor.execute(
+            "UPDATE Notification_Counts SET unread = CASE WHEN unread > ? THEN unread - ? ELSE 0 END "
+            "WHERE user_id = ?",
+            (changed, changed, user_id)
+        )
+    conn.commit()
+    return changed
@@ -0,0 +1,119 @@
+from flask import current_app, jsonify
+from db import dialect
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class ListArgs:
+    __slots__ = ("pk", "fields", "filters", "after", "limit")
+
+    def __init__(self, pk, fields, filters, after, limit):
+        self.pk = pk
+        self.fields = fields
+        self.filters = filters
+        self.after = after
+        self.limit = limit
+
+
+def parse_list_args(args, columns, default_fields=None, filterable=()):
+    """Validate ?fields=, ?after=, ?limit= and column filters against a table's known columns.
+
+    The first entry of columns is the primary key used as the keyset cursor.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    pk = columns[0]
+    fields = list(default_fields or columns)
+    if args.get("fields"):
+        fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # The cursor column always comes back so clients can request the next page
+    if pk not in fields:
+        fields.insert(0, pk)
+
+    filters = {}
+    for column in filterable:
+        if column in args:
+            try:
+                filters[column] = int(args[column])
+            except ValueError:
+                raise ValueError(f"{column} must be an integer")
+
+    after, limit = parse_keyset_args(args)
+    return ListArgs(pk, fields, filters, after, limit)
+
+
+def parse_keyset_args(args):
+    """Validate ?after= and ?limit=; returns (after, limit)."""
+    after = None
+    if args.get("after"):
+        try:
+            after = int(args["after"])
+        except ValueError:
+            raise ValueError("after must be an integer")
+
+    try:
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    return after, limit
+
+
+def top_clause(limit):
+    # SQL Server bounds a SELECT with TOP, sqlite with a trailing LIMIT
+    return f"TOP {int(limit)} " if limit is not None and dialect() == "mssql" else ""
+
+
+def limit_clause(limit):
+    return f" LIMIT {int(limit)}" if limit is not None and dialect() != "mssql" else ""
+
+
+def build_select(table, pk, fields, filters=None, after=None, limit=None):
+    # Column names come from parse_list_args' whitelist, only values are bound
+    where = []
+    params = []
+    if after is not None:
+        where.append(f"{pk} > ?")
+        params.append(after)
+    for column, value in (filters or {}).items():
+        where.append(f"{column} = ?")
+        params.append(value)
+
+    sql = f"SELECT {top_clause(limit)}{', '.join(fields)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {pk}" + limit_clause(limit)
+    return sql, params
+
+
+def fetch_page(cursor, table, list_args):
+    """Run one keyset page; returns (rows, next_after)."""
+    sql, params = build_select(table, list_args.pk, list_args.fields, list_args.filters,
+                               list_args.after, list_args.limit + 1)
+    cursor.execute(sql, params)
+    rows = cursor.fetchmany(list_args.limit + 1)
+    next_after = None
+    if len(rows) > list_args.limit:
+        rows = rows[:list_args.limit]
+        next_after = rows[-1][list_args.fields.index(list_args.pk)]
+    return rows, next_after
+
+
+def page_response(items, next_after):
+    # Body stays a plain JSON array; the cursor for the next page travels in headers
+    response = jsonify(items)
+    if next_after is not None:
+        response.headers["X-Next-After"] = str(next_after)
+    return response
+
+
+def rows_response(fields, rows, next_after):
+    """page_response for raw query rows, encoded straight from the tuples by the app's JSON provider."""
+    response = current_app.response_class(current_app.json.rows(fields, rows) + b"\n", mimetype="application/json")
+    if next_after is not None:
+        response.headers["X-Next-After"] = str(next_after)
+    return response
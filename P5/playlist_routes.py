@@ -1,35 +1,51 @@
-import pyodbc
-from flask import Blueprint, jsonify, request
-from config import DB_CONFIG
+import hashlib
+from flask import Blueprint, Response, jsonify, request
+import queries
+from db import get_db_connection, to_datetime
+from pagination import parse_list_args, parse_keyset_args, fetch_page, page_response, rows_response
+from streaming import stream_format, stream_rows
+from bulk import parse_bulk_body, run_bulk_insert
+from cache import cached, invalidate
+from cascade import delete_response
+import recommend
 
 playlist_routes = Blueprint('playlist_routes', __name__)
 
-def get_db_connection():
-    return pyodbc.connect(
-        f"DRIVER={{{DB_CONFIG['DRIVER']}}};SERVER={DB_CONFIG['SERVER']};"
-        f"DATABASE={DB_CONFIG['DATABASE']};UID={DB_CONFIG['UID']};PWD={DB_CONFIG['PWD']}"
-    )
+PLAYLIST_COLUMNS = ["playlist_id", "user_id", "name", "is_public", "created_at", "updated_at"]
+PLAYLIST_FILTERS = ["user_id"]
 
-# GET: Fetch all playlists
+def touch_playlists_containing(cursor, entity, entity_id):
+    """Bump updated_at on every playlist holding a song of this song/artist/album; returns their cache tags.
+
+    The playlist songs payload embeds song titles, artist names and album
+    titles, and its ETag comes from Playlists.updated_at, so any of those
+    changing has to move the timestamp.
+    """
+    playlist_ids = [row.playlist_id for row in queries.fetch_all(cursor, f"{entity}.playlists", (entity_id,))]
+    if playlist_ids:
+        queries.run(cursor, f"{entity}.touch_playlists", (entity_id,))
+    return [f"playlist:{playlist_id}" for playlist_id in playlist_ids]
+
+
+# GET: Fetch playlists, one keyset page at a time (?after=<playlist_id>&limit=N&fields=...&user_id=...)
 @playlist_routes.route("/playlists", methods=["GET"])
 def get_playlists():
+    try:
+        list_args = parse_list_args(request.args, PLAYLIST_COLUMNS, filterable=PLAYLIST_FILTERS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Playlists")
-        playlists = cursor.fetchall()
-        conn.close()
 
-        return jsonify([
-            {
-                "playlist_id": row[0],
-                "user_id": row[1],
-                "name": row[2],
-                "is_public": row[3],
-                "created_at": row[4],
-                "updated_at": row[5]
-            } for row in playlists
-        ])
+        fmt = stream_format(request)
+        if fmt:
+            limit = list_args.limit if "limit" in request.args else None
+            return stream_rows(cursor, "Playlists", list_args, fmt, limit)
+
+        playlists, next_after = fetch_page(cursor, "Playlists", list_args)
+        return rows_response(list_args.fields, playlists, next_after)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch playlists: {e}"}), 500
 
@@ -43,16 +59,69 @@ def create_playlist():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Playlists (user_id, name, is_public) VALUES (?, ?, ?)",
+        queries.run(
+            cursor, "playlists.create",
             (data["user_id"], data["name"], data.get("is_public", "TRUE"))
         )
         conn.commit()
-        conn.close()
         return jsonify({"message": "Playlist created successfully"}), 201
     except Exception as e:
         return jsonify({"error": f"Failed to create playlist: {e}"}), 500
 
+
+def bulk_playlist_params(data):
+    if data.get("name") is None:
+        raise ValueError("name is required")
+    return (int(data["playlist_id"]), int(data["user_id"]), data["name"], data.get("is_public", "TRUE"))
+
+
+# POST: Add many playlists at once (JSON array or NDJSON body)
+@playlist_routes.route("/playlists/bulk", methods=["POST"])
+def create_playlists_bulk():
+    try:
+        rows = parse_bulk_body(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db_connection()
+        report, status = run_bulk_insert(
+            conn, rows, "playlists.insert", bulk_playlist_params
+        )
+        for playlist in recommend.accepted(rows, report):
+            recommend.recommender.add_playlist(int(playlist["playlist_id"]), int(playlist["user_id"]))
+        return jsonify(report), status
+    except Exception as e:
+        return jsonify({"error": f"Failed to create playlists: {e}"}), 500
+
+
+# POST: Add many songs to a playlist at once; rows are {"playlist_song_id", "song_id"}
+@playlist_routes.route("/playlists/<int:playlist_id>/songs/bulk", methods=["POST"])
+def add_playlist_songs_bulk(playlist_id):
+    try:
+        rows = parse_bulk_body(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def playlist_song_params(data):
+        return (int(data["playlist_song_id"]), playlist_id, int(data["song_id"]))
+
+    try:
+        conn = get_db_connection()
+        report, status = run_bulk_insert(
+            conn, rows, "playlists.add_song", playlist_song_params
+        )
+        if report["inserted"]:
+            # Playlist contents changed: move updated_at so the contents ETag changes too
+            queries.run(conn.cursor(), "playlists.touch", (playlist_id,))
+            conn.commit()
+            invalidate(f"playlist:{playlist_id}")
+            recommend.recommender.add_playlist_songs(
+                playlist_id, [int(row["song_id"]) for row in recommend.accepted(rows, report)])
+        return jsonify(report), status
+    except Exception as e:
+        return jsonify({"error": f"Failed to add playlist songs: {e}"}), 500
+
 # PUT: Update an existing playlist
 @playlist_routes.route("/playlists/<int:playlist_id>", methods=["PUT"])
 def update_playlist(playlist_id):
@@ -63,12 +132,9 @@ def update_playlist(playlist_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Playlists SET name = ?, is_public = ?, updated_at = GETDATE() WHERE playlist_id = ?",
-            (data.get("name"), data.get("is_public"), playlist_id)
-        )
+        queries.run(cursor, "playlists.update", (data.get("name"), data.get("is_public"), playlist_id))
         conn.commit()
-        conn.close()
+        invalidate(f"playlist:{playlist_id}")
         return jsonify({"message": "Playlist updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Failed to update playlist: {e}"}), 500
@@ -78,37 +144,85 @@ def update_playlist(playlist_id):
 def delete_playlist(playlist_id):
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM Playlist_Songs WHERE playlist_id = ?", (playlist_id,))
-        cursor.execute("DELETE FROM Playlists WHERE playlist_id = ?", (playlist_id,))
-        
-        conn.commit()
-        conn.close()
-        return jsonify({"message": "Playlist deleted successfully"}), 200
+        return delete_response(conn, "Playlists", playlist_id, "Playlist deleted successfully",
+                               [f"playlist:{playlist_id}"], recommend.CASCADE_COLLECT, [recommend.remove_cascaded])
     except Exception as e:
         return jsonify({"error": f"Failed to delete playlist: {e}"}), 500
 
 # GET: Fetch a specific playlist
 @playlist_routes.route("/playlists/<int:playlist_id>", methods=["GET"])
+@cached("playlist", tags=lambda kwargs, playlist: [f"playlist:{kwargs['playlist_id']}", f"user:{playlist['user_id']}"])
 def get_playlist_by_id(playlist_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Playlists WHERE playlist_id = ?", (playlist_id,))
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            return jsonify({
-                "playlist_id": row[0],
-                "user_id": row[1],
-                "name": row[2],
-                "is_public": row[3],
-                "created_at": row[4],
-                "updated_at": row[5]
-            })
+        playlist = queries.fetch_one(cursor, "playlists.get", (playlist_id,))
+
+        if playlist:
+            return jsonify(playlist._asdict())
         else:
             return jsonify({"error": "Playlist not found"}), 404
     except Exception as e:
         return jsonify({"error": f"Failed to fetch playlist: {e}"}), 500
+
+
+# GET: Songs in a playlist with their artist and album, one keyset page at a time (?after=<playlist_song_id>&limit=N)
+# ETag / Last-Modified come from Playlists.updated_at so unchanged playlists answer 304; the ETag is weak
+# because the same body may go out gzip- or brotli-encoded
+@playlist_routes.route("/playlists/<int:playlist_id>/songs", methods=["GET"])
+def get_playlist_songs(playlist_id):
+    try:
+        after, limit = parse_keyset_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        playlist = queries.fetch_one(cursor, "playlists.updated_at", (playlist_id,))
+        if not playlist:
+            return jsonify({"error": "Playlist not found"}), 404
+
+        updated_at = to_datetime(playlist.updated_at)
+        version = f"{playlist_id}:{updated_at.isoformat() if updated_at else ''}:{after}:{limit}"
+        etag = hashlib.sha1(version.encode()).hexdigest()
+
+        if request.if_none_match:
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag, updated_at)
+        elif updated_at and request.if_modified_since and \
+                updated_at.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None):
+            return not_modified(etag, updated_at)
+
+        if after is not None:
+            rows = queries.fetch_all(cursor, "playlists.songs_after", (playlist_id, after), limit=limit + 1)
+        else:
+            rows = queries.fetch_all(cursor, "playlists.songs", (playlist_id,), limit=limit + 1)
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1].playlist_song_id
+
+        response = page_response([
+            {
+                "playlist_song_id": row.playlist_song_id,
+                "song_id": row.song_id,
+                "title": row.title,
+                "release_date": row.release_date,
+                "duration": row.duration,
+                "artist": {"artist_id": row.artist_id, "name": row.artist_name},
+                "album": {"album_id": row.album_id, "title": row.album_title} if row.album_id is not None else None
+            } for row in rows
+        ], next_after)
+        response.set_etag(etag, weak=True)
+        response.last_modified = updated_at
+        return response
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch playlist songs: {e}"}), 500
+
+
+def not_modified(etag, updated_at):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.last_modified = updated_at
+    return response
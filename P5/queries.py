@@ -0,0 +1,278 @@
+import threading
+import time
+from collections import namedtuple
+from pagination import top_clause, limit_clause
+
+# Every fixed-shape statement the entity routes run, registered once under a
+# dotted name. Keeping one text per statement means SQL Server sees the same
+# parameterized batch every time (one cached plan per statement), and the
+# per-statement counters below show which ones are worth tuning.
+
+# IN lists are padded (repeating the last id) to the next of these sizes, so
+# a statement has a handful of texts and plans rather than one per id count.
+IN_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class Statement:
+    """A named SQL statement, its row type and its execution counters.
+
+    SQL containing {top} / {limit} is rendered per limit with top_clause /
+    limit_clause, so a paged statement is still one registry entry. SQL
+    containing {ids} is rendered per IN list size (see fetch_in).
+    """
+
+    __slots__ = ("name", "sql", "row_type", "calls", "errors", "rows", "total_seconds", "max_seconds", "_rendered")
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.row_type = None
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._rendered = {}
+
+    def text(self, limit=None, in_size=None):
+        if limit is None and in_size is None:
+            return self.sql
+        sql = self._rendered.get((limit, in_size))
+        if sql is None:
+            if in_size is None:
+                sql = self.sql.format(top=top_clause(limit), limit=limit_clause(limit))
+            else:
+                sql = self.sql.format(ids=", ".join("?" * in_size))
+            self._rendered[(limit, in_size)] = sql
+        return sql
+
+    def make_row(self, cursor):
+        # Built from the first result's cursor.description, then reused for every row after
+        if self.row_type is None:
+            self.row_type = row_type(tuple(column[0] for column in cursor.description))
+        return self.row_type._make
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_seconds * 1000, 2),
+            "avg_ms": round(self.total_seconds * 1000 / self.calls, 3) if self.calls else None,
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "sql": self.sql,
+        }
+
+
+STATEMENTS = {}
+_ROW_TYPES = {}
+_lock = threading.Lock()
+
+
+def register(name, sql):
+    if name in STATEMENTS:
+        raise ValueError(f"Statement {name} is already registered")
+    STATEMENTS[name] = Statement(name, sql)
+    return name
+
+
+def row_type(columns):
+    """A namedtuple class for a column list, shared by every statement returning those columns."""
+    cls = _ROW_TYPES.get(columns)
+    if cls is None:
+        cls = _ROW_TYPES.setdefault(columns, namedtuple("Row", columns, rename=True))
+    return cls
+
+
+def _call(name, cursor, params, limit, consume, in_size=None):
+    statement = STATEMENTS[name]
+    started = time.perf_counter()
+    try:
+        cursor.execute(statement.text(limit, in_size), params)
+        result, rows = consume(statement, cursor)
+    except Exception:
+        _record(statement, time.perf_counter() - started, 0, failed=True)
+        raise
+    _record(statement, time.perf_counter() - started, rows)
+    return result
+
+
+def _record(statement, seconds, rows, failed=False):
+    with _lock:
+        statement.calls += 1
+        statement.errors += failed
+        statement.rows += rows
+        statement.total_seconds += seconds
+        if seconds > statement.max_seconds:
+            statement.max_seconds = seconds
+
+
+def _rowcount(statement, cursor):
+    return cursor.rowcount, max(cursor.rowcount, 0)
+
+
+def _one(statement, cursor):
+    row = cursor.fetchone()
+    if row is None:
+        return None, 0
+    return statement.make_row(cursor)(row), 1
+
+
+def _all(statement, cursor):
+    rows = cursor.fetchall()
+    if not rows:
+        return [], 0
+    make = statement.make_row(cursor)
+    return [make(row) for row in rows], len(rows)
+
+
+def run(cursor, name, params=(), limit=None):
+    """Execute an INSERT/UPDATE/DELETE statement; returns cursor.rowcount."""
+    return _call(name, cursor, params, limit, _rowcount)
+
+
+def fetch_one(cursor, name, params=(), limit=None):
+    """Execute a SELECT and return its first row as a namedtuple, or None."""
+    return _call(name, cursor, params, limit, _one)
+
+
+def fetch_all(cursor, name, params=(), limit=None):
+    """Execute a SELECT and return every row as a namedtuple."""
+    return _call(name, cursor, params, limit, _all)
+
+
+def fetch_in(cursor, name, ids):
+    """Execute a SELECT ... IN ({ids}) for every id, IN_SIZES[-1] at a time; returns the rows found."""
+    rows = []
+    chunk = IN_SIZES[-1]
+    for start in range(0, len(ids), chunk):
+        part = tuple(ids[start:start + chunk])
+        in_size = next(size for size in IN_SIZES if size >= len(part))
+        params = part + part[-1:] * (in_size - len(part))
+        rows.extend(_call(name, cursor, params, None, _all, in_size))
+    return rows
+
+
+def run_many(cursor, name, param_rows):
+    """executemany over a list of parameter tuples; counts every tuple as a row."""
+    statement = STATEMENTS[name]
+    started = time.perf_counter()
+    try:
+        cursor.executemany(statement.sql, param_rows)
+    except Exception:
+        _record(statement, time.perf_counter() - started, 0, failed=True)
+        raise
+    _record(statement, time.perf_counter() - started, len(param_rows))
+
+
+def stats():
+    """Counters for every statement that has run, most total time first."""
+    with _lock:
+        entries = [statement.stats() for statement in STATEMENTS.values() if statement.calls]
+    return sorted(entries, key=lambda entry: entry["total_ms"], reverse=True)
+
+
+def reset_stats():
+    with _lock:
+        for statement in STATEMENTS.values():
+            statement.calls = statement.errors = statement.rows = 0
+            statement.total_seconds = statement.max_seconds = 0.0
+
+
+# Playlists holding a song by an artist / on an album (their songs payload embeds those names)
+_PLAYLISTS_WITH_SONGS_OF = ("SELECT DISTINCT ps.playlist_id FROM Playlist_Songs ps "
+                            "JOIN Songs s ON s.song_id = ps.song_id WHERE s.%s = ?")
+
+# Songs
+register("songs.insert",
+         "INSERT INTO Songs (song_id, title, artist_id, album_id, genre_id, release_date, duration) "
+         "VALUES (?, ?, ?, ?, ?, ?, ?)")
+register("songs.update",
+         "UPDATE Songs SET title = ?, artist_id = ?, album_id = ?, genre_id = ?, release_date = ?, duration = ? "
+         "WHERE song_id = ?")
+register("songs.by_ids",
+         "SELECT song_id, title, artist_id, album_id, genre_id, release_date, duration FROM Songs "
+         "WHERE song_id IN ({ids})")
+register("songs.playlists", "SELECT DISTINCT playlist_id FROM Playlist_Songs WHERE song_id = ?")
+register("songs.touch_playlists",
+         "UPDATE Playlists SET updated_at = GETDATE() "
+         "WHERE playlist_id IN (SELECT playlist_id FROM Playlist_Songs WHERE song_id = ?)")
+
+# Artists
+register("artists.insert",
+         "INSERT INTO Artists (artist_id, name, bio, image_url, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)")
+register("artists.update",
+         "UPDATE Artists SET name = ?, bio = ?, image_url = ?, updated_at = GETDATE() WHERE artist_id = ?")
+register("artists.playlists", _PLAYLISTS_WITH_SONGS_OF % "artist_id")
+register("artists.touch_playlists",
+         "UPDATE Playlists SET updated_at = GETDATE() WHERE playlist_id IN (%s)"
+         % (_PLAYLISTS_WITH_SONGS_OF % "artist_id"))
+register("artists.by_ids",
+         "SELECT artist_id, name, bio, image_url, created_at, updated_at FROM Artists WHERE artist_id IN ({ids})")
+
+# Albums
+register("albums.get",
+         "SELECT album_id, title, artist_id, release_date, cover_image_url FROM Albums WHERE album_id = ?")
+register("albums.by_ids",
+         "SELECT album_id, title, artist_id, release_date, cover_image_url FROM Albums WHERE album_id IN ({ids})")
+register("albums.playlists", _PLAYLISTS_WITH_SONGS_OF % "album_id")
+register("albums.touch_playlists",
+         "UPDATE Playlists SET updated_at = GETDATE() WHERE playlist_id IN (%s)"
+         % (_PLAYLISTS_WITH_SONGS_OF % "album_id"))
+register("albums.insert",
+         "INSERT INTO Albums (album_id, title, artist_id, release_date, cover_image_url) VALUES (?, ?, ?, ?, ?)")
+register("albums.update",
+         "UPDATE Albums SET title = COALESCE(?, title), artist_id = COALESCE(?, artist_id), "
+         "release_date = COALESCE(?, release_date), cover_image_url = COALESCE(?, cover_image_url) "
+         "WHERE album_id = ?")
+
+# Users
+register("users.insert",
+         "INSERT INTO Users (user_id, username, email, password, profile_picture, bio, permission) "
+         "VALUES (?, ?, ?, ?, ?, ?, ?)")
+register("users.update", "UPDATE Users SET username = ?, email = ? WHERE user_id = ?")
+register("users.like", "INSERT INTO Likes (like_id, user_id, item_id, item_type) VALUES (?, ?, ?, ?)")
+_NOTIFICATIONS = ("SELECT {top}notification_id, type, message, time_sent, is_read FROM Notifications "
+                  "WHERE user_id = ?%s ORDER BY notification_id DESC{limit}")
+register("users.notifications", _NOTIFICATIONS % "")
+register("users.notifications_before", _NOTIFICATIONS % " AND notification_id < ?")
+
+# Playlists
+register("playlists.get",
+         "SELECT playlist_id, user_id, name, is_public, created_at, updated_at FROM Playlists WHERE playlist_id = ?")
+register("playlists.by_ids",
+         "SELECT playlist_id, user_id, name, is_public, created_at, updated_at FROM Playlists "
+         "WHERE playlist_id IN ({ids})")
+register("playlists.owner", "SELECT user_id FROM Playlists WHERE playlist_id = ?")
+register("playlists.updated_at", "SELECT updated_at FROM Playlists WHERE playlist_id = ?")
+register("playlists.create", "INSERT INTO Playlists (user_id, name, is_public) VALUES (?, ?, ?)")
+register("playlists.insert", "INSERT INTO Playlists (playlist_id, user_id, name, is_public) VALUES (?, ?, ?, ?)")
+register("playlists.update",
+         "UPDATE Playlists SET name = ?, is_public = ?, updated_at = GETDATE() WHERE playlist_id = ?")
+register("playlists.touch", "UPDATE Playlists SET updated_at = GETDATE() WHERE playlist_id = ?")
+register("playlists.add_song", "INSERT INTO Playlist_Songs (playlist_song_id, playlist_id, song_id) VALUES (?, ?, ?)")
+_PLAYLIST_SONGS = ("SELECT {top}ps.playlist_song_id, s.song_id, s.title, s.release_date, s.duration, "
+                   "ar.artist_id, ar.name AS artist_name, al.album_id, al.title AS album_title "
+                   "FROM Playlist_Songs ps "
+                   "JOIN Songs s ON s.song_id = ps.song_id "
+                   "JOIN Artists ar ON ar.artist_id = s.artist_id "
+                   "LEFT JOIN Albums al ON al.album_id = s.album_id "
+                   "WHERE ps.playlist_id = ?%s ORDER BY ps.playlist_song_id{limit}")
+register("playlists.songs", _PLAYLIST_SONGS % "")
+register("playlists.songs_after", _PLAYLIST_SONGS % " AND ps.playlist_song_id > ?")
+
+# Play counts (migration 0007), written by the event buffer as one (song_id, plays) upsert per song,
+# so two processes counting a song's first plays cannot both insert its row
+register("plays.add.mssql",
+         "MERGE Play_Counts WITH (HOLDLOCK) AS counts USING (SELECT ? AS song_id, ? AS plays) AS added "
+         "ON counts.song_id = added.song_id WHEN MATCHED THEN UPDATE SET plays = counts.plays + added.plays "
+         "WHEN NOT MATCHED THEN INSERT (song_id, plays) VALUES (added.song_id, added.plays);")
+register("plays.add.sqlite",
+         "INSERT INTO Play_Counts (song_id, plays) VALUES (?, ?) "
+         "ON CONFLICT (song_id) DO UPDATE SET plays = plays + excluded.plays")
+
+# Table versions (migration 0006)
+register("table_versions.get", "SELECT version FROM Table_Versions WHERE name = ?")
+register("table_versions.all", "SELECT name, version FROM Table_Versions")
+register("table_versions.bump", "UPDATE Table_Versions SET version = version + 1 WHERE name = ?")
@@ -0,0 +1,352 @@
+import heapq
+import math
+import threading
+import time
+from array import array
+from collections import Counter
+from itertools import islice
+from operator import mul
+from flask import jsonify
+import db
+from config import RECOMMEND_CONFIG
+from jobs import jobs
+
+# Baskets are sets of songs that belong together: a playlist's songs, or the
+# songs one user liked. Keyed by a single int like search.doc_key.
+PLAYLIST, LIKES = 0, 1
+SOURCES = {
+    PLAYLIST: "SELECT playlist_id, song_id FROM Playlist_Songs ORDER BY playlist_id, playlist_song_id",
+    LIKES: "SELECT user_id, item_id FROM Likes WHERE item_type = 'Song' ORDER BY user_id, like_id",
+}
+OWNERS = "SELECT playlist_id, user_id FROM Playlists"
+# What cascade deletes must report back so the matrix can drop the same songs and baskets
+CASCADE_COLLECT = {"Songs": "song_id", "Playlists": "playlist_id", "Users": "user_id"}
+
+
+EMPTY = (array("q"), array("f"))
+
+
+def basket_key(kind, owner_id):
+    return int(owner_id) * 2 + kind
+
+
+class Recommender:
+    """Item-item co-occurrence over playlist and like baskets, with each song's top-k neighbours precomputed.
+
+    Similarity is cosine over basket membership: the number of baskets two
+    songs share divided by the geometric mean of the baskets each is in.
+    Inserts mark the songs of the touched basket dirty and their neighbour
+    lists are recomputed on next read. Deleted playlists and users take
+    their baskets out of the matrix the same way; deleted songs are dropped
+    from results immediately and from the matrix at the next rebuild. Writes
+    that land while a rebuild is scanning are journalled and replayed onto
+    the fresh matrix before it is swapped in.
+    """
+
+    def __init__(self, top_k=50, max_basket=500, max_seeds=50):
+        self.top_k = top_k
+        self.max_basket = max_basket
+        self.max_seeds = max_seeds
+        self._baskets = {}          # basket key -> array of song ids, oldest first
+        self._song_baskets = {}     # song id -> array of basket keys
+        self._weights = {}          # song id -> 1 / sqrt(number of baskets it is in)
+        self._owners = {}           # playlist id -> owning user id
+        self._user_playlists = {}   # user id -> playlist ids
+        self._neighbours = {}       # song id -> (array of song ids, array of scores), best first
+        self._dirty = set()
+        self._removed = set()
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._journal = None        # (method, args) recorded while a rebuild scans
+        self._refreshing = False
+        self.built_at = None
+        self.build_seconds = None
+
+    def _basket_songs(self, key):
+        # Very long playlists would dominate the pair count; only their newest entries take part
+        songs = self._baskets[key]
+        return songs[-self.max_basket:] if len(songs) > self.max_basket else songs
+
+    def _compute(self, song_id):
+        baskets = self._song_baskets.get(song_id)
+        if not baskets:
+            return EMPTY
+        counts = Counter()
+        for key in baskets:
+            counts.update(self._basket_songs(key))
+        counts.pop(song_id, None)
+        candidates = self.top_k * 4
+        if len(counts) > candidates:
+            # Raw counts pick the candidates (sorted in C); only those get normalized
+            cutoff = sorted(counts.values(), reverse=True)[candidates - 1]
+            kept = {other: count for other, count in counts.items() if count > cutoff}
+            # Ties at the cutoff (usually a count of 1) fill the remaining places in basket order
+            ties = (other for other, count in counts.items() if count == cutoff)
+            kept.update(dict.fromkeys(islice(ties, candidates - len(kept)), cutoff))
+            counts = kept
+        # Scored and ranked with map/sorted so the per-candidate work stays in C
+        others = list(counts)
+        scores = list(map(mul, counts.values(), map(self._weights.__getitem__, others)))
+        best = sorted(range(len(others)), key=scores.__getitem__, reverse=True)[:self.top_k]
+        scale = self._weights[song_id]
+        return array("q", map(others.__getitem__, best)), array("f", [scores[i] * scale for i in best])
+
+    def _weigh(self, song_id):
+        self._weights[song_id] = 1 / math.sqrt(len(self._song_baskets[song_id]))
+
+    def neighbours(self, song_id):
+        """(song ids, scores) arrays for song_id, best first."""
+        with self._lock:
+            if song_id in self._dirty:
+                self._neighbours[song_id] = self._compute(song_id)
+                self._dirty.discard(song_id)
+            return self._neighbours.get(song_id, EMPTY)
+
+    def similar(self, song_id, limit=20):
+        """[(song id, score)] for the songs most often found alongside song_id."""
+        removed = self._removed
+        song_ids, scores = self.neighbours(song_id)
+        return [(other, round(score, 4)) for other, score in zip(song_ids, scores) if other not in removed][:limit]
+
+    def recommend(self, user_id, limit=20):
+        """[(song id, score)] summed over the neighbours of the user's most recent liked and playlisted songs."""
+        with self._lock:
+            seeds = list(self._baskets.get(basket_key(LIKES, user_id), ()))
+            for playlist_id in self._user_playlists.get(user_id, ()):
+                seeds.extend(self._baskets.get(basket_key(PLAYLIST, playlist_id), ()))
+            seeds = list(dict.fromkeys(reversed(seeds)))[:self.max_seeds]
+            scores = {}
+            for seed in seeds:
+                for other, score in zip(*self.neighbours(seed)):
+                    scores[other] = scores.get(other, 0.0) + score
+        for song_id in seeds:
+            scores.pop(song_id, None)
+        for song_id in self._removed.intersection(scores):
+            del scores[song_id]
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(song_id, round(score, 4)) for song_id, score in best]
+
+    def _add(self, key, song_ids, replay=False):
+        # A basket holds each song once: a song liked twice, or on a playlist twice, counts once.
+        # This also skips rows a rebuild's scan already read when its journal is replayed
+        songs = self._baskets.get(key)
+        present = set(songs) if songs is not None else set()
+        song_ids = [song_id for song_id in dict.fromkeys(song_ids) if song_id not in present]
+        if not song_ids:
+            return
+        if songs is None:
+            songs = self._baskets[key] = array("q")
+        for song_id in song_ids:
+            songs.append(song_id)
+            baskets = self._song_baskets.get(song_id)
+            if baskets is None:
+                baskets = self._song_baskets[song_id] = array("q")
+            if key not in baskets:
+                baskets.append(key)
+                self._weigh(song_id)
+            self._removed.discard(song_id)
+        # Every song sharing this basket now has a different row
+        self._dirty.update(self._basket_songs(key))
+
+    def _record(self, name, *args):
+        # Called with the lock held. A running rebuild may have read past this write, so it is
+        # journalled for replay; the live matrix only takes it once there is one
+        if self._journal is not None:
+            self._journal.append((name, args))
+        return self.built_at is not None
+
+    def _add_playlist(self, playlist_id, user_id, replay=False):
+        if playlist_id not in self._owners:
+            self._owners[playlist_id] = user_id
+            self._user_playlists.setdefault(user_id, []).append(playlist_id)
+
+    def _add_playlist_songs(self, playlist_id, song_ids, replay=False):
+        self._add(basket_key(PLAYLIST, playlist_id), song_ids, replay)
+
+    def _add_like(self, user_id, song_id, replay=False):
+        self._add(basket_key(LIKES, user_id), [song_id], replay)
+
+    def _remove_songs(self, song_ids, replay=False):
+        self._removed.update(song_ids)
+
+    def _remove_baskets(self, keys, replay=False):
+        for key in keys:
+            songs = self._baskets.pop(key, None)
+            if songs is None:
+                continue
+            self._dirty.update(songs)
+            for song_id in set(songs):
+                baskets = self._song_baskets[song_id]
+                if len(baskets) == 1:
+                    del self._song_baskets[song_id], self._weights[song_id]
+                    self._neighbours.pop(song_id, None)
+                else:
+                    baskets.remove(key)
+                    self._weigh(song_id)
+
+    def _remove_owners(self, playlist_ids, user_ids, replay=False):
+        for playlist_id in playlist_ids:
+            user_id = self._owners.pop(playlist_id, None)
+            if playlist_id in self._user_playlists.get(user_id, ()):
+                self._user_playlists[user_id].remove(playlist_id)
+        for user_id in user_ids:
+            self._user_playlists.pop(user_id, None)
+
+    def add_playlist(self, playlist_id, user_id):
+        with self._lock:
+            if self._record("add_playlist", playlist_id, user_id):
+                self._add_playlist(playlist_id, user_id)
+
+    def add_playlist_songs(self, playlist_id, song_ids):
+        song_ids = list(song_ids)
+        with self._lock:
+            if self._record("add_playlist_songs", playlist_id, song_ids):
+                self._add_playlist_songs(playlist_id, song_ids)
+
+    def add_like(self, user_id, song_id):
+        with self._lock:
+            if self._record("add_like", user_id, song_id):
+                self._add_like(user_id, song_id)
+
+    def remove_songs(self, song_ids):
+        song_ids = list(song_ids)
+        with self._lock:
+            # Removals apply even before the first build, so they survive into it via the journal
+            self._record("remove_songs", song_ids)
+            self._remove_songs(song_ids)
+
+    def remove_baskets(self, playlist_ids=(), user_ids=()):
+        """Drop deleted playlists and the liked songs of deleted users from the matrix."""
+        playlist_ids, user_ids = list(playlist_ids), list(user_ids)
+        keys = [basket_key(PLAYLIST, playlist_id) for playlist_id in playlist_ids] + \
+               [basket_key(LIKES, user_id) for user_id in user_ids]
+        with self._lock:
+            if self._record("remove_baskets", keys):
+                self._remove_baskets(keys)
+            if self._record("remove_owners", playlist_ids, user_ids):
+                self._remove_owners(playlist_ids, user_ids)
+
+    def rebuild(self, conn, batch_size=10000):
+        """Replace the matrix with a fresh scan of Playlist_Songs and Likes, then precompute every row.
+
+        One rebuild runs at a time; writes made during the scan are replayed
+        onto the fresh matrix under the lock, just before it is swapped in.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                return self._rebuild(conn, batch_size)
+            finally:
+                with self._lock:
+                    self._journal = None
+
+    def _rebuild(self, conn, batch_size):
+        started = time.perf_counter()
+        fresh = Recommender(self.top_k, self.max_basket, self.max_seeds)
+        cursor = conn.cursor()
+        for kind, sql in SOURCES.items():
+            cursor.execute(sql)
+            current_owner = None
+            songs = None
+            seen = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for owner_id, song_id in rows:
+                    if owner_id != current_owner:
+                        current_owner = owner_id
+                        songs = fresh._baskets[basket_key(kind, owner_id)] = array("q")
+                        seen = set()
+                    if song_id not in seen:
+                        seen.add(song_id)
+                        songs.append(song_id)
+        for key, songs in fresh._baskets.items():
+            for song_id in fresh._basket_songs(key):
+                baskets = fresh._song_baskets.get(song_id)
+                if baskets is None:
+                    baskets = fresh._song_baskets[song_id] = array("q")
+                baskets.append(key)
+        for song_id in fresh._song_baskets:
+            fresh._weigh(song_id)
+        cursor.execute(OWNERS)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for playlist_id, user_id in rows:
+                fresh._owners[playlist_id] = user_id
+                fresh._user_playlists.setdefault(user_id, []).append(playlist_id)
+        fresh._neighbours = {song_id: fresh._compute(song_id) for song_id in fresh._song_baskets}
+
+        with self._lock:
+            # The scan may or may not have seen these writes; replayed adds skip what it already read
+            for name, args in self._journal:
+                getattr(fresh, "_" + name)(*args, replay=True)
+            self._baskets, self._song_baskets, self._weights = fresh._baskets, fresh._song_baskets, fresh._weights
+            self._owners, self._user_playlists = fresh._owners, fresh._user_playlists
+            self._neighbours = fresh._neighbours
+            self._dirty = fresh._dirty
+            self._removed = fresh._removed
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - started
+            return len(self._neighbours)
+
+    def stats(self):
+        with self._lock:
+            return {"songs": len(self._song_baskets), "baskets": len(self._baskets),
+                    "pairs": sum(len(song_ids) for song_ids, _ in self._neighbours.values()),
+                    "dirty": len(self._dirty), "removed": len(self._removed), "refreshing": self._refreshing,
+                    "built_at": self.built_at, "build_seconds": self.build_seconds}
+
+
+recommender = Recommender(RECOMMEND_CONFIG["top_k"], RECOMMEND_CONFIG["max_basket"], RECOMMEND_CONFIG["max_seeds"])
+
+
+def refresh_job():
+    # Runs outside a request, so it checks out its own connection
+    entry = db.pool.checkout()
+    try:
+        return {"songs": recommender.rebuild(entry.conn)}
+    finally:
+        recommender._refreshing = False
+        db.pool.release(entry)
+
+
+def ensure_fresh():
+    """Queue a build when there is none yet or it is older than refresh_seconds.
+
+    Returns whether a matrix is serving; the old one keeps serving while a
+    refresh runs, and callers answer 503 until the first build finishes.
+    """
+    built_at = recommender.built_at
+    if (built_at is None or time.time() - built_at > RECOMMEND_CONFIG["refresh_seconds"]) \
+            and not recommender._refreshing:
+        with recommender._lock:
+            if recommender._refreshing:
+                return recommender.built_at is not None
+            recommender._refreshing = True
+        jobs.submit("refresh recommendations", refresh_job)
+    return recommender.built_at is not None
+
+
+def building_response():
+    """503 for reads that arrive before the first build has finished."""
+    response = jsonify({"error": "Recommendations are still being built, retry shortly", **recommender.stats()})
+    response.headers["Retry-After"] = str(RECOMMEND_CONFIG["retry_after"])
+    return response, 503
+
+
+def accepted(rows, report):
+    """The rows of a bulk insert that were not rejected."""
+    failed = {error["index"] for error in report["errors"]}
+    return [row for position, row in enumerate(rows) if position not in failed]
+
+
+def remove_cascaded(removed):
+    """on_removed callback for cascade.delete_response."""
+    if removed.get("Songs"):
+        recommender.remove_songs(removed["Songs"])
+    if removed.get("Playlists") or removed.get("Users"):
+        recommender.remove_baskets(removed.get("Playlists", ()), removed.get("Users", ()))
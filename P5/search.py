@@ -0,0 +1,274 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+import db
+import versions
+from config import SEARCH_CONFIG
+from jobs import jobs
+
+# Documents are keyed by a single int: entity id * len(KINDS) + kind code
+KINDS = ("song", "artist", "album")
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+SOURCES = {
+    "song": "SELECT song_id, title FROM Songs",
+    "artist": "SELECT artist_id, name FROM Artists",
+    "album": "SELECT album_id, title FROM Albums",
+}
+TABLE_KINDS = {"Songs": "song", "Artists": "artist", "Albums": "album"}
+# What cascade deletes must report back so the index can drop the same documents
+CASCADE_COLLECT = {"Songs": "song_id", "Artists": "artist_id", "Albums": "album_id"}
+TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower()) if text else []
+
+
+def doc_key(kind, entity_id):
+    return int(entity_id) * len(KINDS) + KIND_CODES[kind]
+
+
+class SearchIndex:
+    """Inverted index over song, artist and album titles with prefix matching and idf ranking.
+
+    Each worker keeps its own copy: its own writes are applied as they
+    happen, and other workers' writes are picked up by a background rebuild
+    once Table_Versions moves past the versions the index was built from.
+    Writes that land while a rebuild is scanning are journalled and
+    replayed onto the fresh index before it is swapped in.
+    """
+
+    def __init__(self, min_prefix=2, max_prefix_expansions=200):
+        self.min_prefix = min_prefix
+        self.max_prefix_expansions = max_prefix_expansions
+        self._postings = {}     # token -> set of doc keys
+        self._vocabulary = []   # sorted tokens, for prefix ranges
+        self._titles = {}       # doc key -> original title
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._journal = None    # (doc key, title or None) recorded while a rebuild scans
+        self._refreshing = False
+        self.versions = None    # Table_Versions read just before the last build's scan
+        self.checked_at = 0.0
+        self.built_at = None
+        self.build_seconds = None
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _add(self, key, title):
+        self._titles[key] = title
+        for token in set(tokenize(title)):
+            docs = self._postings.get(token)
+            if docs is None:
+                docs = self._postings[token] = set()
+                bisect.insort(self._vocabulary, token)
+            docs.add(key)
+
+    def _remove(self, key):
+        title = self._titles.pop(key, None)
+        if title is None:
+            return
+        for token in set(tokenize(title)):
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            docs.discard(key)
+            if not docs:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                    del self._vocabulary[index]
+
+    def put(self, kind, entity_id, title):
+        """Add or replace one document; a None title removes it."""
+        key = doc_key(kind, entity_id)
+        with self._lock:
+            self._put(key, title)
+            if self._journal is not None:
+                self._journal.append((key, title))
+
+    def remove(self, kind, *entity_ids):
+        with self._lock:
+            for entity_id in entity_ids:
+                key = doc_key(kind, entity_id)
+                self._remove(key)
+                if self._journal is not None:
+                    self._journal.append((key, None))
+
+    def _put(self, key, title):
+        self._remove(key)
+        if title is not None:
+            self._add(key, title)
+
+    def rebuild(self, conn, batch_size=10000):
+        """Replace the index with a fresh scan of Songs, Artists and Albums.
+
+        One rebuild runs at a time; puts and removes made during the scan are
+        replayed onto the fresh index under the lock, just before the swap.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                return self._rebuild(conn, batch_size)
+            finally:
+                with self._lock:
+                    self._journal = None
+
+    def _rebuild(self, conn, batch_size):
+        started = time.perf_counter()
+        fresh = SearchIndex(self.min_prefix, self.max_prefix_expansions)
+        cursor = conn.cursor()
+        # Read first: a write committed during the scan leaves the index behind, never ahead
+        built_versions = versions.snapshot(cursor)
+        for kind, sql in SOURCES.items():
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for entity_id, title in rows:
+                    if title is not None:
+                        key = doc_key(kind, entity_id)
+                        fresh._titles[key] = title
+                        for token in set(tokenize(title)):
+                            fresh._postings.setdefault(token, set()).add(key)
+        # Sorting once is far cheaper than insort per new token during a full build
+        fresh._vocabulary = sorted(fresh._postings)
+        with self._lock:
+            for key, title in self._journal:
+                fresh._put(key, title)
+            self._postings, self._vocabulary, self._titles = fresh._postings, fresh._vocabulary, fresh._titles
+            self.versions = built_versions
+            self.checked_at = time.time()
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - started
+            return len(self._titles)
+
+    def _expand(self, token):
+        """Vocabulary words matching token exactly or (if long enough) as a prefix."""
+        if len(token) < self.min_prefix:
+            return [token] if token in self._postings else []
+        start = bisect.bisect_left(self._vocabulary, token)
+        limit = min(len(self._vocabulary), start + self.max_prefix_expansions)
+        end = bisect.bisect_left(self._vocabulary, token + "\uffff", start, limit)
+        return self._vocabulary[start:end]
+
+    def search(self, query, kinds=KINDS, limit=20):
+        """Return [(kind, id, title, score)] containing every query token (as a word or word prefix).
+
+        A document scores the idf of the best word it matches for each token
+        (prefix matches count 0.6), plus 2 if its title is exactly the query
+        or 1 if the title starts with it; ties go to the shorter title.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        codes = {KIND_CODES[kind] for kind in kinds}
+        normalized_query = " ".join(tokens)
+
+        with self._lock:
+            total = len(self._titles) or 1
+            groups = []
+            for token in tokens:
+                words = self._expand(token)
+                if not words:
+                    return []
+                groups.append([(math.log(1 + total / len(self._postings[word])) * (1.0 if word == token else 0.6),
+                                self._postings[word]) for word in words])
+
+            # Set intersection runs in C; only the survivors are scored in Python
+            matching = sorted((group[0][1] if len(group) == 1 else set().union(*(docs for _, docs in group))
+                               for group in groups), key=len)
+            candidates = matching[0].intersection(*matching[1:])
+            if len(codes) < len(KINDS):
+                candidates = {key for key in candidates if key % len(KINDS) in codes}
+            if not candidates:
+                return []
+
+            scores = dict.fromkeys(candidates, 0.0)
+            for group in groups:
+                if len(group) == 1:
+                    weight = group[0][0]
+                    for key in scores:
+                        scores[key] += weight
+                    continue
+                best = {}
+                for weight, docs in sorted(group, key=lambda item: item[0]):
+                    for key in candidates.intersection(docs):
+                        best[key] = weight
+                for key, weight in best.items():
+                    scores[key] += weight
+
+            titles = self._titles
+
+            def rank(key):
+                title = titles[key]
+                lowered = title.lower()
+                if lowered == normalized_query:
+                    bonus = 2.0
+                elif lowered.startswith(normalized_query):
+                    bonus = 1.0
+                else:
+                    bonus = 0.0
+                return scores[key] + bonus, -len(title)
+
+            ranked = [(key, rank(key)[0]) for key in heapq.nlargest(limit, candidates, key=rank)]
+            return [(KINDS[key % len(KINDS)], key // len(KINDS), titles[key], round(score, 3))
+                    for key, score in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {"documents": len(self._titles), "tokens": len(self._vocabulary),
+                    "refreshing": self._refreshing, "versions": self.versions,
+                    "built_at": self.built_at, "build_seconds": self.build_seconds}
+
+
+index = SearchIndex(SEARCH_CONFIG["min_prefix"], SEARCH_CONFIG["max_prefix_expansions"])
+
+
+def refresh_job():
+    # Runs outside a request, so it checks out its own connection
+    entry = db.pool.checkout()
+    try:
+        return {"documents": index.rebuild(entry.conn)}
+    finally:
+        index._refreshing = False
+        db.pool.release(entry)
+
+
+def ensure_built(conn):
+    """Build on first use; then, every refresh_seconds, queue a rebuild if Table_Versions has moved."""
+    if index.built_at is None:
+        if SEARCH_CONFIG["build_on_first_search"]:
+            index.rebuild(conn)
+        return
+    if time.time() - index.checked_at < SEARCH_CONFIG["refresh_seconds"] or index._refreshing:
+        return
+    index.checked_at = time.time()
+    # This worker's own writes move the versions too; they cost one extra rebuild per interval at most
+    if versions.snapshot(conn.cursor()) == index.versions:
+        return
+    with index._lock:
+        if index._refreshing:
+            return
+        index._refreshing = True
+    jobs.submit("refresh search index", refresh_job)
+
+
+def index_bulk(kind, rows, report, id_field, title_field):
+    """Index the rows of a bulk insert that were not rejected."""
+    failed = {error["index"] for error in report["errors"]}
+    for position, row in enumerate(rows):
+        if position not in failed:
+            index.put(kind, row[id_field], row[title_field])
+
+
+def remove_cascaded(removed):
+    """on_removed callback for cascade.delete_response."""
+    for table, keys in removed.items():
+        index.remove(TABLE_KINDS[table], *keys)
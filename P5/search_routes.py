@@ -0,0 +1,54 @@
+from flask import Blueprint, jsonify, request
+from db import get_db_connection
+from jobs import jobs
+from config import SEARCH_CONFIG
+import search
+
+search_routes = Blueprint('search_routes', __name__)
+
+
+# GET: Search song, artist and album titles (?q=<words>&type=song,artist&limit=N)
+# Every word must match a title word; words of 2+ characters also match as prefixes ("bohem rhap")
+@search_routes.route("/", methods=["GET"])
+def search_titles():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    kinds = [kind.strip() for kind in request.args.get("type", ",".join(search.KINDS)).split(",") if kind.strip()]
+    if not kinds or any(kind not in search.KINDS for kind in kinds):
+        return jsonify({"error": f"type must be one or more of {', '.join(search.KINDS)}"}), 400
+    try:
+        limit = int(request.args.get("limit", SEARCH_CONFIG["default_limit"]))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1 or limit > SEARCH_CONFIG["max_limit"]:
+        return jsonify({"error": f"limit must be between 1 and {SEARCH_CONFIG['max_limit']}"}), 400
+
+    try:
+        search.ensure_built(get_db_connection())
+        results = search.index.search(query, kinds, limit)
+        return jsonify([
+            {"type": kind, "id": entity_id, "title": title, "score": score}
+            for kind, entity_id, title, score in results
+        ])
+    except Exception as e:
+        return jsonify({"error": f"Search failed: {e}"}), 500
+
+
+# POST: Rebuild the search index from the database (?async=1 queues it as a job)
+@search_routes.route("/rebuild", methods=["POST"])
+def rebuild_index():
+    try:
+        if request.args.get("async", "").lower() in ("1", "true"):
+            job_id = jobs.submit("rebuild search index", search.refresh_job)
+            return jsonify({"message": "Rebuild queued", "job_id": job_id}), 202
+        documents = search.index.rebuild(get_db_connection())
+        return jsonify({"message": "Search index rebuilt", **search.index.stats(), "documents": documents}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to rebuild search index: {e}"}), 500
+
+
+# GET: Index size and last build time
+@search_routes.route("/stats", methods=["GET"])
+def get_search_stats():
+    return jsonify(search.index.stats())
@@ -0,0 +1,193 @@
+import dataclasses
+import decimal
+import json
+import math
+import uuid
+from datetime import date, datetime, time
+from json.encoder import encode_basestring_ascii
+from flask.json.provider import JSONProvider
+from config import SERIALIZER_CONFIG
+
+
+def default(value):
+    """Types neither encoder handles natively. Dates come out as ISO 8601 on both backends."""
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _quoted_isoformat(value):
+    return '"' + value.isoformat() + '"'
+
+
+def _float(value):
+    return float.__repr__(value) if math.isfinite(value) else json.dumps(value)
+
+
+# Scalar encoders by exact type; anything else goes through json.dumps with default()
+SCALARS = {
+    int: int.__repr__,
+    str: encode_basestring_ascii,
+    float: _float,
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "null",
+    date: _quoted_isoformat,
+    datetime: _quoted_isoformat,
+    time: _quoted_isoformat,
+    decimal.Decimal: lambda value: '"' + str(value) + '"',
+}
+
+
+def _generic(value):
+    return json.dumps(value, default=default, separators=(",", ":"))
+
+
+def encode_column(column):
+    # A column nearly always holds one type plus NULLs, so pick its encoder once
+    types = set(map(type, column))
+    has_null = type(None) in types
+    types.discard(type(None))
+    if not types:
+        return ["null"] * len(column)
+    if len(types) == 1:
+        encode = SCALARS.get(types.pop(), _generic)
+        if not has_null:
+            return list(map(encode, column))
+        return ["null" if value is None else encode(value) for value in column]
+    return [SCALARS.get(type(value), _generic)(value) for value in column]
+
+
+class StdlibBackend:
+    """json module encoding; rows are encoded a column at a time into per-field templates."""
+
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(default=default, separators=(",", ":"))
+        self._templates = {}
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj)
+
+    def dumps_bytes(self, obj):
+        return self._encoder.encode(obj).encode()
+
+    def loads(self, s):
+        return json.loads(s)
+
+    def _template(self, fields):
+        template = self._templates.get(fields)
+        if template is None:
+            template = "{" + ",".join(encode_basestring_ascii(field).replace("%", "%%") + ":%s"
+                                      for field in fields) + "}"
+            self._templates[fields] = template
+        return template
+
+    def join_rows(self, fields, rows, separator, prefix, suffix):
+        if not rows:
+            return (prefix + suffix).encode()
+        template = self._template(tuple(fields))
+        columns = [encode_column(column) for column in zip(*rows)]
+        return (prefix + separator.join(map(template.__mod__, zip(*columns))) + suffix).encode()
+
+
+# Types orjson writes without a comma inside, so one column-wide dumps can be split on b","
+COMMA_FREE = {int, float, bool, type(None), date, datetime, time, uuid.UUID}
+
+
+class OrjsonBackend:
+    """orjson encoding; dates, datetimes, UUIDs and dataclasses are handled in C.
+
+    Rows are encoded from their tuples a chunk at a time: each column goes
+    through a single dumps call and is split back into cells, and the cells
+    fill a per-chunk template that spells out the field names once.
+    """
+
+    name = "orjson"
+    chunk_size = 2000
+
+    def __init__(self, orjson):
+        self._dumps = orjson.dumps
+        self._option = orjson.OPT_NON_STR_KEYS
+        self.loads = orjson.loads
+
+    def dumps(self, obj):
+        return self._dumps(obj, default=default, option=self._option).decode()
+
+    def dumps_bytes(self, obj):
+        return self._dumps(obj, default=default, option=self._option)
+
+    def _encode_column(self, column):
+        """(template placeholder, encoded cells) for one column of a chunk."""
+        dumps = self._dumps
+        types = set(map(type, column))
+        if types == {str}:
+            # A quote inside an encoded string is always escaped, so '","' only ever falls between cells
+            return b'"%b"', dumps(column)[2:-2].split(b'","')
+        if types <= COMMA_FREE:
+            return b"%b", dumps(column)[1:-1].split(b",")
+        if types <= {str, type(None)}:
+            return b"%b", list(map(dumps, column))
+        return b"%b", [dumps(value, default=default, option=self._option) for value in column]
+
+    def join_rows(self, fields, rows, separator, prefix, suffix):
+        names = [self._dumps(field).replace(b"%", b"%%") + b":" for field in fields]
+        chunks = []
+        for start in range(0, len(rows), self.chunk_size):
+            placeholders, columns = zip(*map(self._encode_column, zip(*rows[start:start + self.chunk_size])))
+            template = b"{" + b",".join(map(bytes.__add__, names, placeholders)) + b"}"
+            chunks.append(separator.encode().join(map(template.__mod__, zip(*columns))))
+        return prefix.encode() + separator.encode().join(chunks) + suffix.encode()
+
+
+def load_backend(name):
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+        except ImportError:
+            if name == "orjson":
+                raise
+        else:
+            return OrjsonBackend(orjson)
+    return StdlibBackend()
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by SERIALIZER_CONFIG["backend"].
+
+    Besides dumps/loads it encodes query rows straight from their tuples
+    (rows()), so list endpoints skip building a dict per row.
+    """
+
+    mimetype = "application/json"
+
+    def __init__(self, app, backend=None):
+        super().__init__(app)
+        self.backend = backend or load_backend(SERIALIZER_CONFIG["backend"])
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault("default", default)
+            return json.dumps(obj, **kwargs)
+        return self.backend.dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return self.backend.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.backend.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+    def rows(self, fields, rows, separator=",", prefix="[", suffix="]"):
+        """Rows as JSON objects keyed by fields, joined by separator; returns bytes."""
+        return self.backend.join_rows(fields, rows, separator, prefix, suffix)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
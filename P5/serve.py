@@ -0,0 +1,35 @@
+import argparse
+from config import SERVER_CONFIG
+
+# Production entry points (app.py's app.run is the single-threaded dev server):
+#   python serve.py                          uvicorn, SERVER_CONFIG["workers"] processes
+#   gunicorn -c gunicorn.conf.py asgi:app    same ASGI app under gunicorn's process manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the MusicMedia API behind uvicorn's event loop")
+    parser.add_argument("--host", default=SERVER_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=SERVER_CONFIG["port"])
+    parser.add_argument("--workers", type=int, default=SERVER_CONFIG["workers"])
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is required for serve.py: pip install 'uvicorn[standard]'")
+
+    uvicorn.run(
+        "asgi:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=SERVER_CONFIG["backlog"],
+        limit_concurrency=SERVER_CONFIG["limit_concurrency"],
+        timeout_keep_alive=SERVER_CONFIG["keep_alive"],
+        lifespan="on",
+        access_log=False
+    )
+
+
+if __name__ == "__main__":
+    main()
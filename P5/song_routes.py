@@ -1,35 +1,47 @@
-import pyodbc
 from flask import Blueprint, jsonify, request
-from config import DB_CONFIG
+import queries
+from db import get_db_connection
+from jobs import jobs
+from config import RECOMMEND_CONFIG
+from pagination import parse_list_args, fetch_page, rows_response
+from streaming import stream_format, stream_rows
+from bulk import parse_bulk_body, run_bulk_insert
+from cache import cached, invalidate
+from cascade import delete_response
+from search import index, index_bulk, remove_cascaded, CASCADE_COLLECT
+from versions import bump, versioned
+from playlist_routes import touch_playlists_containing
+import recommend
 
 song_routes = Blueprint('song_routes', __name__)
 
-def get_db_connection():
-    return pyodbc.connect(
-        f"DRIVER={{{DB_CONFIG['DRIVER']}}};SERVER={DB_CONFIG['SERVER']};"
-        f"DATABASE={DB_CONFIG['DATABASE']};UID={DB_CONFIG['UID']};PWD={DB_CONFIG['PWD']}"
-    )
+SONG_COLUMNS = ["song_id", "title", "artist_id", "album_id", "genre_id", "release_date", "duration"]
+SONG_FILTERS = ["artist_id", "album_id", "genre_id"]
 
-# GET: Fetch all songs
+
+# GET: Fetch songs, one keyset page at a time (?after=<song_id>&limit=N&fields=...&artist_id=...)
+# Add ?stream=1 or Accept: application/x-ndjson to export the whole result set as NDJSON
 @song_routes.route("/", methods=["GET"])
+@versioned("Songs")
+@cached("songs")
 def get_songs():
+    try:
+        list_args = parse_list_args(request.args, SONG_COLUMNS, filterable=SONG_FILTERS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Songs")
-        songs = cursor.fetchall()
-        conn.close()
-        return jsonify([
-            {
-                "song_id": row[0],
-                "title": row[1],
-                "artist_id": row[2],
-                "album_id": row[3],
-                "genre_id": row[4],
-                "release_date": row[5].strftime("%Y-%m-%d") if row[5] else None,
-                "duration": row[6]
-            } for row in songs
-        ])
+
+        fmt = stream_format(request)
+        if fmt:
+            # Full export: rows are encoded as they are fetched instead of built up in memory
+            limit = list_args.limit if "limit" in request.args else None
+            return stream_rows(cursor, "Songs", list_args, fmt, limit)
+
+        songs, next_after = fetch_page(cursor, "Songs", list_args)
+        return rows_response(list_args.fields, songs, next_after)
     except Exception as e:
         return jsonify({"error": f"Database Connection Error: {e}"}), 500
 
@@ -44,18 +56,50 @@ def add_song():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Songs (song_id, title, artist_id, album_id, genre_id, release_date, duration) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        queries.run(
+            cursor, "songs.insert",
             (data["song_id"], data["title"], data["artist_id"], data.get("album_id"),
              data.get("genre_id"), data["release_date"], data["duration"])
         )
+        bump(cursor, "Songs")
         conn.commit()
-        conn.close()
+        invalidate("songs")
+        index.put("song", data["song_id"], data["title"])
         return jsonify({"message": "Song added successfully"}), 201
     except Exception as e:
         return jsonify({"error": f"Failed to add song: {e}"}), 500
 
+
+def bulk_song_params(data):
+    if data.get("title") is None:
+        raise ValueError("title is required")
+    return (int(data["song_id"]), data["title"], int(data["artist_id"]), data.get("album_id"),
+            data.get("genre_id"), data["release_date"], int(data["duration"]))
+
+
+# POST: Add many songs at once (JSON array or NDJSON body)
+@song_routes.route("/bulk", methods=["POST"])
+def add_songs_bulk():
+    try:
+        rows = parse_bulk_body(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db_connection()
+        report, status = run_bulk_insert(
+            conn, rows, "songs.insert", bulk_song_params
+        )
+        if report["inserted"]:
+            bump(conn.cursor(), "Songs")
+            conn.commit()
+            invalidate("songs")
+            index_bulk("song", rows, report, "song_id", "title")
+        return jsonify(report), status
+    except Exception as e:
+        return jsonify({"error": f"Failed to add songs: {e}"}), 500
+
+
 # PUT: Update a song
 @song_routes.route("/<int:song_id>", methods=["PUT"])
 def update_song(song_id):
@@ -67,14 +111,18 @@ def update_song(song_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Songs SET title = ?, artist_id = ?, album_id = ?, genre_id = ?, release_date = ?, duration = ? "
-            "WHERE song_id = ?",
+        updated = queries.run(
+            cursor, "songs.update",
             (data.get("title"), data.get("artist_id"), data.get("album_id"), data.get("genre_id"),
              data.get("release_date"), data.get("duration"), song_id)
         )
+        playlist_tags = touch_playlists_containing(cursor, "songs", song_id)
+        if updated:
+            bump(cursor, "Songs")
         conn.commit()
-        conn.close()
+        invalidate("songs", *playlist_tags)
+        if updated:
+            index.put("song", song_id, data.get("title"))
         return jsonify({"message": "Song updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Failed to update song: {e}"}), 500
@@ -85,13 +133,46 @@ def update_song(song_id):
 def delete_song(song_id):
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Playlist_Songs WHERE song_id = ?", (song_id,))
-        cursor.execute("DELETE FROM Contribution_Song_Table WHERE song_id = ?", (song_id,))
-        cursor.execute("DELETE FROM Songs WHERE song_id = ?", (song_id,))
-
-        conn.commit()
-        conn.close()
-        return jsonify({"message": "Song deleted successfully"}), 200
+        return delete_response(conn, "Songs", song_id, "Song deleted successfully", ["songs"],
+                               CASCADE_COLLECT, [remove_cascaded, recommend.remove_cascaded])
     except Exception as e:
         return jsonify({"error": f"Failed to delete song: {e}"}), 500
+
+
+# GET: Songs most often found in the same playlists and like lists as this one (?limit=N)
+@song_routes.route("/<int:song_id>/similar", methods=["GET"])
+def get_similar_songs(song_id):
+    try:
+        limit = int(request.args.get("limit", RECOMMEND_CONFIG["default_limit"]))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1 or limit > RECOMMEND_CONFIG["max_limit"]:
+        return jsonify({"error": f"limit must be between 1 and {RECOMMEND_CONFIG['max_limit']}"}), 400
+
+    try:
+        if not recommend.ensure_fresh():
+            return recommend.building_response()
+        similar = recommend.recommender.similar(song_id, limit)
+        return jsonify({"song_id": song_id,
+                        "similar": [{"song_id": other, "score": score} for other, score in similar]})
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch similar songs: {e}"}), 500
+
+
+# POST: Rebuild the co-occurrence matrix behind /similar and /recommendations (?async=1 queues it as a job)
+@song_routes.route("/similar/rebuild", methods=["POST"])
+def rebuild_recommendations():
+    try:
+        if request.args.get("async", "").lower() in ("1", "true"):
+            job_id = jobs.submit("rebuild recommendations", recommend.refresh_job)
+            return jsonify({"message": "Rebuild queued", "job_id": job_id}), 202
+        recommend.recommender.rebuild(get_db_connection())
+        return jsonify({"message": "Recommendations rebuilt", **recommend.recommender.stats()}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to rebuild recommendations: {e}"}), 500
+
+
+# GET: Co-occurrence matrix size, pending recomputes and last build time
+@song_routes.route("/similar/stats", methods=["GET"])
+def get_recommendation_stats():
+    return jsonify(recommend.recommender.stats())
@@ -0,0 +1,143 @@
+from flask import Blueprint, jsonify, request
+from db import get_db_connection
+from pagination import top_clause, limit_clause
+
+stats_routes = Blueprint('stats_routes', __name__)
+
+# Every read here hits the summary tables from migration 0005, which triggers keep
+# current on each insert/update/delete, so none of them aggregates Songs/Follows/Likes.
+
+SHORTEST_SONGS_LIMIT = 50
+
+
+def read_counters(cursor):
+    cursor.execute("SELECT name, value FROM Stats_Counters")
+    return {name: value for name, value in cursor.fetchall()}
+
+
+# GET: All headline counters (artists, songs, average song duration)
+@stats_routes.route("/", methods=["GET"])
+def get_stats():
+    try:
+        conn = get_db_connection()
+        counters = read_counters(conn.cursor())
+        timed = counters.get("timed_songs", 0)
+        return jsonify({
+            "artists": counters.get("artists", 0),
+            "songs": counters.get("songs", 0),
+            "average_duration": round(counters.get("duration_total", 0) / timed, 2) if timed else None
+        })
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch stats: {e}"}), 500
+
+
+# GET: Total number of artists
+@stats_routes.route("/artists/count", methods=["GET"])
+def get_artist_count():
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM Stats_Counters WHERE name = 'artists'")
+        row = cursor.fetchone()
+        return jsonify({"artists": row[0] if row else 0})
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch artist count: {e}"}), 500
+
+
+# GET: Shortest and average song duration, with the shortest songs' titles
+@stats_routes.route("/songs/duration", methods=["GET"])
+def get_song_duration_stats():
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        counters = read_counters(cursor)
+        timed = counters.get("timed_songs", 0)
+
+        # The first key of the duration histogram is the minimum
+        cursor.execute(f"SELECT {top_clause(1)}duration, songs FROM Song_Duration_Counts "
+                       f"ORDER BY duration{limit_clause(1)}")
+        shortest = cursor.fetchone()
+        shortest_songs = []
+        if shortest:
+            cursor.execute(
+                f"SELECT {top_clause(SHORTEST_SONGS_LIMIT)}song_id, title FROM Songs WHERE duration = ? "
+                f"ORDER BY song_id{limit_clause(SHORTEST_SONGS_LIMIT)}",
+                (shortest[0],)
+            )
+            shortest_songs = [{"song_id": row[0], "title": row[1]} for row in cursor.fetchall()]
+
+        return jsonify({
+            "songs_with_duration": timed,
+            "shortest_duration": shortest[0] if shortest else None,
+            "shortest_songs": shortest_songs,
+            "average_duration": round(counters.get("duration_total", 0) / timed, 2) if timed else None
+        })
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch duration stats: {e}"}), 500
+
+
+# GET: Number of songs in each genre (genres without songs report 0)
+@stats_routes.route("/genres", methods=["GET"])
+def get_genre_stats():
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT g.genre_id, g.name, COALESCE(c.songs, 0) FROM Genres g "
+            "LEFT JOIN Genre_Song_Counts c ON c.genre_id = g.genre_id ORDER BY g.genre_id"
+        )
+        return jsonify([{"genre_id": row[0], "name": row[1], "songs": row[2]} for row in cursor.fetchall()])
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch genre stats: {e}"}), 500
+
+
+# GET: Users with more than ?more_than=N followers (default 2), most followed first
+@stats_routes.route("/users/followers", methods=["GET"])
+def get_follower_stats():
+    try:
+        more_than = int(request.args.get("more_than", 2))
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        return jsonify({"error": "more_than and limit must be integers"}), 400
+    if limit < 1 or limit > 1000:
+        return jsonify({"error": "limit must be between 1 and 1000"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT {top_clause(limit)}u.user_id, u.username, c.followers FROM Follower_Counts c "
+            "JOIN Users u ON u.user_id = c.user_id WHERE c.followers > ? "
+            f"ORDER BY c.followers DESC, u.user_id{limit_clause(limit)}",
+            (more_than,)
+        )
+        return jsonify([{"user_id": row[0], "username": row[1], "followers": row[2]} for row in cursor.fetchall()])
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch follower stats: {e}"}), 500
+
+
+# GET: Follower count for one user
+@stats_routes.route("/users/<int:user_id>/followers", methods=["GET"])
+def get_user_follower_count(user_id):
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT followers FROM Follower_Counts WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        return jsonify({"user_id": user_id, "followers": row[0] if row else 0})
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch follower count: {e}"}), 500
+
+
+# GET: Like count for one song or playlist
+@stats_routes.route("/<any(songs, playlists):kind>/<int:item_id>/likes", methods=["GET"])
+def get_like_count(kind, item_id):
+    item_type = "Song" if kind == "songs" else "Playlist"
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT likes FROM Like_Counts WHERE item_type = ? AND item_id = ?", (item_type, item_id))
+        row = cursor.fetchone()
+        return jsonify({"item_type": item_type, "item_id": item_id, "likes": row[0] if row else 0})
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch like count: {e}"}), 500
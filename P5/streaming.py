@@ -0,0 +1,56 @@
+from flask import Response, current_app, stream_with_context
+from pagination import build_select
+
+STREAM_BATCH_SIZE = 1000
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def stream_format(request):
+    """Return "ndjson" or "json" when the client asked for a streamed export, else None."""
+    mode = request.args.get("stream", "").lower()
+    if mode in ("1", "true", "ndjson"):
+        return "ndjson"
+    if mode == "json":
+        return "json"
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return "ndjson"
+    return None
+
+
+def iter_batches(cursor, batch_size=STREAM_BATCH_SIZE):
+    # fetchmany keeps at most one batch of rows in memory at a time
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def stream_rows(cursor, table, list_args, fmt="ndjson", limit=None):
+    """Stream every row matching list_args as NDJSON lines or a single JSON array.
+
+    Unlike fetch_page the query is unbounded unless limit is given. Each
+    fetched batch is encoded in one call to the app's JSON provider. The
+    request context (and with it the pooled connection) stays open until the
+    generator is exhausted.
+    """
+    sql, params = build_select(table, list_args.pk, list_args.fields, list_args.filters,
+                               list_args.after, limit)
+    cursor.execute(sql, params)
+    fields = list_args.fields
+
+    def generate():
+        encode = current_app.json.rows
+        if fmt == "ndjson":
+            for rows in iter_batches(cursor):
+                yield encode(fields, rows, "\n", "", "\n")
+            return
+
+        prefix = "["
+        for rows in iter_batches(cursor):
+            yield encode(fields, rows, ",", prefix, "")
+            prefix = ","
+        yield b"[]\n" if prefix == "[" else b"]\n"
+
+    mimetype = NDJSON_MIMETYPE if fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
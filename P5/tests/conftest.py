@@ -0,0 +1,94 @@
+import os
+import sys
+import uuid
+import pytest
+
+# The app's modules are flat files in P5, imported by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import events  # noqa: E402
+import migrate  # noqa: E402
+import recommend  # noqa: E402
+import search  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from cache import cache  # noqa: E402
+from config import REPLICA_CONFIG, SQLITE_CONFIG  # noqa: E402
+from notifications import notifier  # noqa: E402
+
+
+def memory_database(name):
+    # Shared-cache so every pooled connection sees the same database
+    return f"file:{name}?mode=memory&cache=shared"
+
+
+def create_database(name):
+    """Open a fresh in-memory database with Intial.sql and every migration; returns a connection to it.
+
+    An in-memory database lives only as long as a connection to it, so the
+    caller keeps this one open for the duration of the test.
+    """
+    conn = db.connect_sqlite({"DATABASE": memory_database(name)})
+    migrate.create_base_schema(conn)
+    migrate.migrate(conn, "sqlite")
+    return conn
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """A fresh primary database behind db.pool, with the in-process caches and indexes emptied."""
+    name = f"test_{uuid.uuid4().hex}"
+    conn = create_database(name)
+    monkeypatch.setitem(SQLITE_CONFIG, "DATABASE", memory_database(name))
+    monkeypatch.setitem(REPLICA_CONFIG, "replicas", [])
+    db.configure_pool("sqlite", max_size=4, checkout_timeout=5)
+    cache.clear()
+    search.index.__init__(search.index.min_prefix, search.index.max_prefix_expansions)
+    recommend.recommender.__init__(recommend.recommender.top_k, recommend.recommender.max_basket,
+                                   recommend.recommender.max_seeds)
+    yield conn
+    # Background writers finish against this test's database; they restart on their next event
+    notifier.stop()
+    events.buffer.stop()
+    db.pool.close_all()
+    conn.close()
+
+
+@pytest.fixture
+def client(database):
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def catalog(client):
+    """Three users, two artists, two albums, six songs and two playlists, created through the bulk endpoints.
+
+    Playlist 1 (user 1) holds songs 1-3, playlist 2 (user 2) holds songs 3-5;
+    song 6 is on no playlist. Artist 1 made songs 1-4 (album 1), artist 2
+    made songs 5-6 (album 2).
+    """
+    responses = [
+        client.post("/api/users/bulk", json=[
+            {"user_id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+             "password": "secret"} for user_id in (1, 2, 3)]),
+        client.post("/api/artists/bulk", json=[{"artist_id": 1, "name": "Queen"},
+                                               {"artist_id": 2, "name": "Blur"}]),
+        client.post("/api/albums/albums/bulk", json=[
+            {"album_id": 1, "title": "A Night at the Opera", "artist_id": 1},
+            {"album_id": 2, "title": "Parklife", "artist_id": 2}]),
+        client.post("/api/songs/bulk", json=[
+            {"song_id": song_id, "title": title, "artist_id": 1 if song_id <= 4 else 2,
+             "album_id": 1 if song_id <= 4 else 2, "release_date": "1975-11-21", "duration": 120 + song_id}
+            for song_id, title in enumerate(["Bohemian Rhapsody", "Love of My Life", "Death on Two Legs",
+                                             "Seaside Rendezvous", "Girls and Boys", "Parklife"], 1)]),
+        client.post("/api/playlists/playlists/bulk", json=[
+            {"playlist_id": 1, "user_id": 1, "name": "Classics"},
+            {"playlist_id": 2, "user_id": 2, "name": "Mixed"}]),
+        client.post("/api/playlists/playlists/1/songs/bulk", json=[
+            {"playlist_song_id": song_id, "song_id": song_id} for song_id in (1, 2, 3)]),
+        client.post("/api/playlists/playlists/2/songs/bulk", json=[
+            {"playlist_song_id": 10 + song_id, "song_id": song_id} for song_id in (3, 4, 5)]),
+    ]
+    for response in responses:
+        assert response.status_code == 201, response.get_json()
+    return client
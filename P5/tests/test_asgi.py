@@ -0,0 +1,240 @@
+import asyncio
+import json
+import pytest
+import asgi
+import events
+from app import app as flask_app
+from jobs import JobQueue
+from notifications import notifier
+
+
+@pytest.fixture
+def bridge():
+    bridge = asgi.WsgiBridge(flask_app, threads=4)
+    yield bridge
+    bridge._executor.shutdown(wait=True)
+
+
+def request(bridge, method, path, body=b"", query=b"", headers=(), receive=None, send=None):
+    """Run one HTTP request through the bridge; returns every message it sent."""
+    sent = []
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def default_receive():
+        if messages:
+            return messages.pop(0)
+        # The client stays connected until the response is done
+        await asyncio.sleep(3600)
+
+    async def default_send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query, "http_version": "1.1",
+             "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+             "headers": [(b"content-type", b"application/json"), *headers]}
+    asyncio.run(bridge(scope, receive or default_receive, send or default_send))
+    return sent
+
+
+def response(sent):
+    """(status, headers, body) from the messages of a complete response."""
+    start, *bodies = sent
+    assert start["type"] == "http.response.start"
+    assert all(message["type"] == "http.response.body" for message in bodies)
+    assert bodies[-1].get("more_body", False) is False
+    return start["status"], dict(start["headers"]), b"".join(message["body"] for message in bodies)
+
+
+def test_request_and_response(bridge, catalog):
+    status, headers, body = response(request(bridge, "POST", "/api/artists/",
+                                             json.dumps({"artist_id": 3, "name": "Pulp"}).encode()))
+    assert status == 201
+    status, headers, body = response(request(bridge, "GET", "/api/albums/albums/2"))
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    assert json.loads(body)["title"] == "Parklife"
+
+
+def test_query_string_and_headers_reach_flask(bridge, catalog):
+    status, headers, body = response(request(bridge, "GET", "/api/songs/", query=b"limit=2"))
+    assert [song["song_id"] for song in json.loads(body)] == [1, 2]
+    status, _, body = response(request(bridge, "GET", "/api/songs/", query=b"limit=2",
+                                       headers=[(b"if-none-match", headers[b"etag"])]))
+    assert status == 304 and body == b""
+    status, headers, body = response(request(bridge, "GET", "/api/artists/",
+                                             headers=[(b"accept", b"application/x-ndjson")]))
+    assert headers[b"content-type"] == b"application/x-ndjson"
+    assert len(body.splitlines()) == 2
+
+
+def test_request_bodies_arrive_in_chunks(bridge, catalog):
+    payload = json.dumps({"artist_id": 3, "name": "Pulp"}).encode()
+    messages = [{"type": "http.request", "body": payload[:5], "more_body": True},
+                {"type": "http.request", "body": payload[5:], "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    status, _, _ = response(request(bridge, "POST", "/api/artists/", receive=receive))
+    assert status == 201
+
+
+def test_streamed_export_is_sent_in_chunks(bridge, catalog):
+    catalog.post("/api/songs/bulk", json=[
+        {"song_id": song_id, "title": f"Song {song_id}", "artist_id": 2, "release_date": "1994-03-14",
+         "duration": 180} for song_id in range(10, 2510)])
+    sent = request(bridge, "GET", "/api/songs/", query=b"stream=1")
+    status, headers, body = response(sent)
+    assert status == 200
+    assert headers[b"content-type"] == b"application/x-ndjson"
+    # One body message per fetched batch, each flagged as more to come, then the closing empty one
+    assert [message["more_body"] for message in sent[1:]] == [True, True, True, False]
+    lines = body.splitlines()
+    assert len(lines) == 2506
+    assert json.loads(lines[-1])["song_id"] == 2509
+
+
+def test_client_disconnect_stops_a_stream(bridge, catalog, database):
+    catalog.post("/api/songs/bulk", json=[
+        {"song_id": song_id, "title": f"Song {song_id}", "artist_id": 2, "release_date": "1994-03-14",
+         "duration": 180} for song_id in range(10, 5010)])
+    sent = []
+    gone = asyncio.Event()
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body":
+            gone.set()
+            await asyncio.sleep(0.01)
+
+    request(bridge, "GET", "/api/songs/", query=b"stream=1", receive=receive, send=send)
+    assert len([message for message in sent if message["type"] == "http.response.body"]) < 5
+    assert sent[-1].get("more_body") is not False
+    # Flask's teardown still ran and gave the connection back
+    assert catalog.get("/api/db/stats").get_json()["in_use"] == 0
+
+
+def test_unknown_route_is_a_404(bridge, database):
+    status, _, body = response(request(bridge, "GET", "/api/nope"))
+    assert status == 404
+
+
+def test_exception_in_a_view_is_a_500(bridge, catalog, monkeypatch):
+    def broken(album_id):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(flask_app.view_functions, "albums_routes.get_album_by_id", broken)
+    status, _, _ = response(request(bridge, "GET", "/api/albums/albums/1"))
+    assert status == 500
+    # The worker thread and the pooled connection survive for the next request
+    monkeypatch.undo()
+    assert response(request(bridge, "GET", "/api/albums/albums/1"))[0] == 200
+
+
+def test_wsgi_app_that_fails_before_responding_is_a_500():
+    def failing(environ, start_response):
+        raise RuntimeError("boom")
+
+    bridge = asgi.WsgiBridge(failing, threads=1)
+    status, headers, body = response(request(bridge, "GET", "/"))
+    assert status == 500 and body == b"Internal Server Error"
+
+
+def test_wsgi_app_that_fails_mid_stream_raises():
+    def failing(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        yield b"partial"
+        raise RuntimeError("boom")
+
+    bridge = asgi.WsgiBridge(failing, threads=1)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    # Headers are already out, so the server sees the error and closes the connection
+    with pytest.raises(RuntimeError):
+        request(bridge, "GET", "/", send=send)
+    assert sent[0]["status"] == 200 and sent[1]["body"] == b"partial"
+
+
+def test_failing_send_does_not_strand_the_worker_thread():
+    closed = []
+
+    class Chunks:
+        # Far more chunks than the bridge's queue holds
+        def __iter__(self):
+            return (b"x" for _ in range(100))
+
+        def close(self):
+            closed.append(True)
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return Chunks()
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            raise RuntimeError("send failed")
+
+    bridge = asgi.WsgiBridge(app, threads=1)
+    with pytest.raises(RuntimeError, match="send failed"):
+        request(bridge, "GET", "/", send=send)
+    assert closed == [True]
+    # The only worker thread is free again
+    assert bridge._executor.submit(lambda: "free").result(timeout=5) == "free"
+    bridge._executor.shutdown(wait=True)
+
+
+def test_oversized_bodies_are_rejected(bridge):
+    bridge.max_body_bytes = 10
+    status, _, body = response(request(bridge, "POST", "/api/artists/", b"x" * 100))
+    assert status == 413
+
+
+def test_busy_server_answers_503(bridge):
+    bridge.max_pending = 0
+    assert response(request(bridge, "GET", "/api/songs/"))[0] == 503
+
+
+def test_lifespan_starts_and_stops_the_background_writers(catalog, monkeypatch):
+    # Shutdown stops the job queue for good, so it gets one of its own
+    queue = JobQueue(1, 10)
+    monkeypatch.setattr(asgi, "jobs", queue)
+    bridge = asgi.WsgiBridge(flask_app, threads=1)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+    running = []
+
+    async def receive():
+        message = messages.pop(0)
+        if message["type"] == "lifespan.shutdown":
+            running.append(events.buffer._thread.is_alive())
+            # A follow queues a notification, which starts the notification writer
+            catalog.post("/api/users/2/follows", json={"follow_id": 1, "followed_id": 1})
+        return message
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(bridge({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert running == [True]
+    assert not events.buffer._thread.is_alive() and not notifier._thread.is_alive()
+    assert catalog.get("/api/users/1/notifications/unread_count").get_json()["unread"] == 1
+    with pytest.raises(RuntimeError):
+        queue.submit("late", lambda: None)
+
+
+def test_unsupported_scope_type(bridge):
+    with pytest.raises(RuntimeError):
+        asyncio.run(bridge({"type": "websocket"}, None, None))
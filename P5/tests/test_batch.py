@@ -0,0 +1,26 @@
+def test_one_request_for_several_types(catalog):
+    body = catalog.post("/api/batch/", json={"songs": [2, 1, 99], "artists": [2], "playlists": [1]}).get_json()
+    assert sorted(body["songs"]) == ["1", "2"]
+    assert body["songs"]["2"]["title"] == "Love of My Life"
+    assert body["artists"]["2"]["name"] == "Blur"
+    assert body["playlists"]["1"]["name"] == "Classics"
+    assert body["missing"] == {"songs": [99]}
+
+
+def test_query_string_form(catalog):
+    body = catalog.get("/api/batch/?albums=1,2&songs=6").get_json()
+    assert sorted(body["albums"]) == ["1", "2"] and list(body["songs"]) == ["6"]
+    assert body["missing"] == {}
+
+
+def test_duplicates_are_fetched_once(catalog):
+    body = catalog.post("/api/batch/", json={"songs": [3, 3, "3"]}).get_json()
+    assert list(body["songs"]) == ["3"]
+
+
+def test_bad_requests(catalog):
+    assert catalog.post("/api/batch/", json={"genres": [1]}).status_code == 400
+    assert catalog.post("/api/batch/", json={"songs": ["x"]}).status_code == 400
+    assert catalog.post("/api/batch/", json={"songs": []}).status_code == 400
+    assert catalog.post("/api/batch/", json={"songs": list(range(1001))}).status_code == 400
+    assert catalog.post("/api/batch/", json=[1, 2]).status_code == 400
@@ -0,0 +1,21 @@
+import random
+import pytest
+import bench_load
+
+# Row counts of the catalog fixture
+COUNTS = {"users": 3, "songs": 6, "artists": 2, "albums": 2, "playlists": 2}
+
+
+@pytest.mark.parametrize("scenario", bench_load.SCENARIOS, ids=lambda scenario: scenario[0])
+def test_every_scenario_gets_an_accepted_status(catalog, scenario):
+    name, method, path, body, accepted = scenario
+    ids = bench_load.random_ids(random.Random(1), COUNTS)
+    response = catalog.open(path.format(**ids), method=method, json=body(ids) if body else None)
+    assert response.status_code in accepted, response.get_data(as_text=True)
+
+
+def test_percentile():
+    latencies = list(range(1, 101))
+    assert [bench_load.percentile(latencies, fraction) for fraction in (0.5, 0.95, 0.99, 1.0)] == [50, 95, 99, 100]
+    assert bench_load.percentile([7], 0.99) == 7
+    assert bench_load.percentile([], 0.5) is None
@@ -0,0 +1,62 @@
+def song(song_id, **overrides):
+    row = {"song_id": song_id, "title": f"Song {song_id}", "artist_id": 1, "release_date": "2001-01-01",
+           "duration": 200}
+    row.update(overrides)
+    return row
+
+
+def test_all_rows_inserted(catalog):
+    response = catalog.post("/api/songs/bulk", json=[song(song_id) for song_id in range(10, 20)])
+    assert response.status_code == 201
+    report = response.get_json()
+    assert report["inserted"] == 10 and report["failed"] == 0 and report["errors"] == []
+    assert len(catalog.get("/api/songs/?artist_id=1").get_json()) == 14
+
+
+def test_partial_failure_reports_207_with_row_indexes(catalog):
+    rows = [song(10), song(1), song(11, title=None), "not an object", song(12, duration="long")]
+    response = catalog.post("/api/songs/bulk", json=rows)
+    assert response.status_code == 207
+    report = response.get_json()
+    assert report["received"] == 5 and report["inserted"] == 1 and report["failed"] == 4
+    # Validation errors and the duplicate key from the database are merged in row order
+    assert [error["index"] for error in report["errors"]] == [1, 2, 3, 4]
+    assert report["errors"][1]["error"] == "title is required"
+    assert [row["song_id"] for row in catalog.get("/api/songs/?after=6").get_json()] == [10]
+
+
+def test_failed_chunk_is_retried_row_by_row(catalog):
+    rows = [song(song_id) for song_id in range(10, 15)] + [song(3)]
+    report = catalog.post("/api/songs/bulk", json=rows).get_json()
+    assert report["inserted"] == 5
+    assert report["errors"] == [{"index": 5, "error": report["errors"][0]["error"]}]
+
+
+def test_nothing_inserted_is_400(catalog):
+    response = catalog.post("/api/songs/bulk", json=[song(1), song(2)])
+    assert response.status_code == 400
+    assert response.get_json()["inserted"] == 0
+
+
+def test_bad_bodies_are_rejected(client):
+    assert client.post("/api/songs/bulk", json={"song_id": 1}).status_code == 400
+    assert client.post("/api/songs/bulk", json=[]).status_code == 400
+    response = client.post("/api/users/bulk", data='{"user_id": 1}\n{broken',
+                           content_type="application/x-ndjson")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid JSON on line 2"
+
+
+def test_ndjson_body(client):
+    body = "\n".join(f'{{"user_id": {user_id}, "username": "u{user_id}", "email": "e{user_id}", "password": "p"}}'
+                     for user_id in (1, 2, 3)) + "\n\n"
+    response = client.post("/api/users/bulk", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 201
+    assert response.get_json()["inserted"] == 3
+
+
+def test_bulk_inserts_are_searchable(catalog):
+    catalog.post("/api/songs/bulk", json=[song(10, title="Under Pressure"), song(1, title="Duplicate")])
+    results = catalog.get("/api/search/?q=pressure").get_json()
+    assert [(result["type"], result["id"]) for result in results] == [("song", 10)]
+    assert catalog.get("/api/search/?q=duplicate").get_json() == []
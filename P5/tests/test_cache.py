@@ -0,0 +1,68 @@
+import time
+from cache import LRUCache, cache
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_entries=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_lru_entries_expire():
+    lru = LRUCache(ttl=0.01)
+    lru.set("a", 1)
+    time.sleep(0.02)
+    assert lru.get("a") is None
+    assert lru.stats()["expirations"] == 1
+
+
+def test_lru_invalidates_by_tag():
+    lru = LRUCache()
+    lru.set("album 1", 1, tags=["album:1", "artist:1"])
+    lru.set("album 2", 2, tags=["album:2", "artist:1"])
+    lru.set("album 3", 3, tags=["album:3", "artist:2"])
+    lru.invalidate("artist:1")
+    assert lru.get("album 1") is None and lru.get("album 2") is None
+    assert lru.get("album 3") == 3
+    assert lru.recently_invalidated(5)
+
+
+def test_lookup_is_served_from_cache_until_a_write(catalog, database):
+    assert catalog.get("/api/albums/albums/1").get_json()["title"] == "A Night at the Opera"
+    # Changed behind the API's back: the cached body keeps being served
+    database.execute("UPDATE Albums SET title = 'Direct' WHERE album_id = 1")
+    database.commit()
+    assert catalog.get("/api/albums/albums/1").get_json()["title"] == "A Night at the Opera"
+    assert cache.stats()["hits"] >= 1
+
+    assert catalog.put("/api/albums/albums/1", json={"title": "A Day at the Races"}).status_code == 200
+    assert catalog.get("/api/albums/albums/1").get_json()["title"] == "A Day at the Races"
+
+
+def test_errors_are_not_cached(catalog):
+    assert catalog.get("/api/albums/albums/9").status_code == 404
+    catalog.post("/api/albums/albums/bulk", json=[{"album_id": 9, "title": "Late", "artist_id": 1}])
+    assert catalog.get("/api/albums/albums/9").status_code == 200
+
+
+def test_entity_tags_evict_related_entries(catalog):
+    catalog.get("/api/playlists/playlists/1")
+    assert catalog.put("/api/playlists/playlists/1", json={"name": "Renamed"}).status_code == 200
+    assert catalog.get("/api/playlists/playlists/1").get_json()["name"] == "Renamed"
+
+
+def test_delete_evicts_the_lookup(catalog):
+    assert catalog.get("/api/albums/albums/2").status_code == 200
+    assert catalog.delete("/api/albums/albums/2").status_code == 200
+    assert catalog.get("/api/albums/albums/2").status_code == 404
+
+
+def test_versioned_lists_are_cached_per_table_version(catalog):
+    assert len(catalog.get("/api/artists/").get_json()) == 2
+    catalog.post("/api/artists/", json={"artist_id": 3, "name": "Pulp"})
+    assert len(catalog.get("/api/artists/").get_json()) == 3
@@ -0,0 +1,142 @@
+import time
+import cascade
+import db
+from search import CASCADE_COLLECT
+
+
+def count(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def delete(table, key, **options):
+    # A pooled connection has the GETDATE() the playlist touch uses
+    entry = db.pool.checkout()
+    try:
+        return cascade.cascade_delete(entry.conn, table, key, **options)
+    finally:
+        db.pool.release(entry)
+
+
+def test_plan_deletes_children_before_parents(database):
+    steps = cascade.plan_delete("Artists")
+    tables = [table for table, _ in steps]
+    assert steps[-1] == ("Artists", "artist_id = ?")
+    assert tables.index("Playlist_Songs") < tables.index("Songs") < tables.index("Albums") < len(tables) - 1
+    assert all(where.count("?") == 1 for _, where in steps)
+    # Soft references carry their item_type
+    assert ("Likes", "item_type = 'Song' AND item_id IN (SELECT song_id FROM Songs WHERE artist_id = ?)") in steps
+
+
+def test_plan_follows_migration_tables(database):
+    tables = {table for table, _ in cascade.plan_delete("Songs")}
+    assert {"Playlist_Songs", "Likes", "Activity_Feed", "User_Timeline"} <= tables
+
+
+def test_artist_delete_removes_everything_that_depends_on_it(catalog, database):
+    database.executemany("INSERT INTO Likes (like_id, user_id, item_id, item_type) VALUES (?, 3, ?, 'Song')",
+                         [(1, 1), (2, 6)])
+    database.commit()
+    response = catalog.delete("/api/artists/1")
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary["mode"] == "batched" and summary["found"]
+    assert summary["deleted"] == {"Playlist_Songs": 5, "Likes": 1, "Songs": 4, "Albums": 1, "Artists": 1}
+    assert summary["touched_playlists"] == [1, 2]
+    assert count(database, "Songs") == 2
+    assert [row[0] for row in database.execute("SELECT song_id FROM Playlist_Songs")] == [5]
+    assert [row[0] for row in database.execute("SELECT item_id FROM Likes")] == [6]
+
+
+def test_user_delete_removes_their_playlists(catalog, database):
+    summary = catalog.delete("/api/users/2").get_json()
+    assert summary["deleted"] == {"Playlist_Songs": 3, "Playlists": 1, "Users": 1}
+    # The playlist itself is gone, so there is nothing left to touch
+    assert summary["touched_playlists"] == []
+    assert catalog.get("/api/playlists/playlists/2").status_code == 404
+
+
+def test_missing_row_is_reported_not_found(catalog):
+    summary = catalog.delete("/api/songs/99").get_json()
+    assert summary["found"] is False and summary["deleted"] == {}
+
+
+def test_chunked_mode_deletes_the_same_rows(catalog, database):
+    summary = delete("Artists", 1, chunk_threshold=0, chunk_size=2)
+    assert summary["mode"] == "chunked"
+    assert summary["deleted"] == {"Playlist_Songs": 5, "Songs": 4, "Albums": 1, "Artists": 1}
+    assert count(database, "Songs") == 2
+
+
+def test_collect_reports_removed_keys(catalog, database):
+    summary = delete("Albums", 2, collect=CASCADE_COLLECT)
+    assert sorted(summary["removed"]["Songs"]) == [5, 6]
+    assert summary["removed"]["Albums"] == [2]
+
+
+def test_failed_delete_rolls_back(catalog, database, monkeypatch):
+    def failing(conn, steps, key, touch):
+        conn.cursor().execute("DELETE FROM Playlist_Songs")
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(cascade, "run_batched", failing)
+    response = catalog.delete("/api/artists/1")
+    assert response.status_code == 500
+    assert count(database, "Playlist_Songs") == 6
+
+
+def test_version_bumps_commit_with_the_deletes(catalog, database, monkeypatch):
+    def versions():
+        return dict(database.execute("SELECT name, version FROM Table_Versions").fetchall())
+
+    before = versions()
+    delete("Albums", 2, chunk_threshold=0, chunk_size=1)
+    after = versions()
+    # One bump per chunk that removed rows
+    assert after["Songs"] == before["Songs"] + 2 and after["Albums"] == before["Albums"] + 1
+
+    def failing(cursor, *tables):
+        raise RuntimeError("lock request time out period exceeded")
+
+    monkeypatch.setattr(cascade.versions, "bump", failing)
+    assert catalog.delete("/api/artists/1").status_code == 500
+    assert count(database, "Songs") == 4 and versions() == after
+
+
+def test_async_delete_runs_as_a_job(catalog, database):
+    response = catalog.delete("/api/albums/albums/2?async=1")
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = catalog.get(f"/api/jobs/{job_id}").get_json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.01)
+    assert job["status"] == "done", job
+    assert job["result"]["deleted"]["Songs"] == 2
+    assert catalog.get("/api/albums/albums/2").status_code == 404
+    assert catalog.get("/api/search/?q=parklife&type=song").get_json() == []
+
+
+def test_cascades_leave_no_dangling_foreign_keys(catalog, database, monkeypatch):
+    assert database.execute("PRAGMA foreign_keys").fetchone() == (1,)
+    # A row in every table that points at a user, artist, album, song or playlist
+    catalog.post("/api/users/2/follows", json={"follow_id": 1, "followed_id": 1})
+    catalog.post("/api/users/1/activity", json={"activity_id": 1, "action": "created_playlist", "item_id": 1,
+                                                "item_type": "Playlist"})
+    catalog.post("/api/users/3/likes", json={"like_id": 1, "item_id": 3, "item_type": "Song"})
+    catalog.post("/api/users/3/likes", json={"like_id": 2, "item_id": 1, "item_type": "Playlist"})
+    database.executescript("""
+        INSERT INTO Comments (comment_id, user_id, item_id, item_type, comment_text) VALUES (1, 3, 1, 'Playlist', 'x');
+        INSERT INTO Reports (report_id, user_id, item_id, item_type, reason) VALUES (1, 2, 1, 'Comment', 'spam');
+        INSERT INTO Notifications (notification_id, user_id, type) VALUES (1, 1, 'Follow');
+        INSERT INTO Contribution_Album_Table (album_id, artist_id) VALUES (2, 1);
+        INSERT INTO Contribution_Song_Table (song_id, artist_id) VALUES (5, 1);
+    """)
+    for url, chunked in [("/api/songs/3", False), ("/api/albums/albums/2", True), ("/api/playlists/playlists/1", False),
+                         ("/api/artists/1", True), ("/api/users/1", False), ("/api/users/3", True)]:
+        monkeypatch.setitem(cascade.CASCADE_CONFIG, "chunk_threshold", 0 if chunked else 1000)
+        response = catalog.delete(url)
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()["found"]
+        assert database.execute("PRAGMA foreign_key_check").fetchall() == [], url
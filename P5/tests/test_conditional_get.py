@@ -0,0 +1,126 @@
+import gzip
+import json
+
+
+def song(title, artist_id, album_id):
+    # PUT /api/songs/<id> replaces every column
+    return {"title": title, "artist_id": artist_id, "album_id": album_id, "release_date": "1975-11-21",
+            "duration": 200}
+
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={"If-None-Match": etag})
+
+
+def test_playlist_songs_answer_304_while_unchanged(catalog):
+    first = catalog.get("/api/playlists/playlists/1/songs")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert first.last_modified is not None
+    again = revalidate(catalog, "/api/playlists/playlists/1/songs", etag)
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    # A strong copy of the same validator matches too
+    assert revalidate(catalog, "/api/playlists/playlists/1/songs", etag[2:]).status_code == 304
+
+
+def test_playlist_songs_etag_depends_on_the_page(catalog):
+    etag = catalog.get("/api/playlists/playlists/1/songs").headers["ETag"]
+    assert revalidate(catalog, "/api/playlists/playlists/1/songs?limit=1", etag).status_code == 200
+
+
+def test_adding_a_song_changes_the_etag(catalog):
+    etag = catalog.get("/api/playlists/playlists/1/songs").headers["ETag"]
+    catalog.post("/api/playlists/playlists/1/songs/bulk", json=[{"playlist_song_id": 50, "song_id": 6}])
+    response = revalidate(catalog, "/api/playlists/playlists/1/songs", etag)
+    assert response.status_code == 200
+    assert [song["song_id"] for song in response.get_json()] == [1, 2, 3, 6]
+
+
+def test_song_rename_changes_the_etag(catalog):
+    etag = catalog.get("/api/playlists/playlists/2/songs").headers["ETag"]
+    assert catalog.put("/api/songs/4", json=song("Seaside", 1, 1)).status_code == 200
+    response = revalidate(catalog, "/api/playlists/playlists/2/songs", etag)
+    assert response.status_code == 200
+    assert response.get_json()[1]["title"] == "Seaside"
+
+
+def test_artist_rename_is_not_answered_with_a_stale_304(catalog):
+    etag = catalog.get("/api/playlists/playlists/1/songs").headers["ETag"]
+    assert catalog.put("/api/artists/1", json={"name": "Queen + Adam Lambert"}).status_code == 200
+    response = revalidate(catalog, "/api/playlists/playlists/1/songs", etag)
+    assert response.status_code == 200
+    assert {song["artist"]["name"] for song in response.get_json()} == {"Queen + Adam Lambert"}
+
+
+def test_album_rename_is_not_answered_with_a_stale_304(catalog):
+    etag = catalog.get("/api/playlists/playlists/2/songs").headers["ETag"]
+    assert catalog.put("/api/albums/albums/2", json={"title": "The Great Escape"}).status_code == 200
+    response = revalidate(catalog, "/api/playlists/playlists/2/songs", etag)
+    assert response.status_code == 200
+    assert response.get_json()[2]["album"]["title"] == "The Great Escape"
+    # Playlist 1 has none of album 2's songs and keeps its validator
+    etag = catalog.get("/api/playlists/playlists/1/songs").headers["ETag"]
+    catalog.put("/api/albums/albums/2", json={"title": "Modern Life Is Rubbish"})
+    assert revalidate(catalog, "/api/playlists/playlists/1/songs", etag).status_code == 304
+
+
+def test_deleting_a_song_changes_the_playlists_holding_it(catalog):
+    etag = catalog.get("/api/playlists/playlists/2/songs").headers["ETag"]
+    catalog.delete("/api/songs/3")
+    response = revalidate(catalog, "/api/playlists/playlists/2/songs", etag)
+    assert response.status_code == 200
+    assert [song["song_id"] for song in response.get_json()] == [4, 5]
+
+
+def test_if_modified_since(catalog):
+    last_modified = catalog.get("/api/playlists/playlists/1/songs").headers["Last-Modified"]
+    response = catalog.get("/api/playlists/playlists/1/songs", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+
+def test_versioned_list_revalidates_on_table_version(catalog):
+    etag = catalog.get("/api/songs/?limit=2").headers["ETag"]
+    assert catalog.get("/api/songs/?limit=2").headers["Cache-Control"] == "no-cache"
+    assert revalidate(catalog, "/api/songs/?limit=2", etag).status_code == 304
+    assert revalidate(catalog, "/api/songs/?limit=3", etag).status_code == 200
+    assert catalog.put("/api/songs/6", json=song("Parklife (Live)", 2, 2)).status_code == 200
+    assert revalidate(catalog, "/api/songs/?limit=2", etag).status_code == 200
+
+
+def test_versioned_etag_depends_on_the_format(catalog):
+    page = catalog.get("/api/songs/")
+    assert "Accept" in page.headers["Vary"]
+    ndjson = {"Accept": "application/x-ndjson"}
+    export = catalog.get("/api/songs/", headers=ndjson)
+    assert export.mimetype == "application/x-ndjson" and export.headers["ETag"] != page.headers["ETag"]
+    # The page's validator does not answer an NDJSON request with a 304, nor the other way round
+    assert catalog.get("/api/songs/", headers={**ndjson, "If-None-Match": page.headers["ETag"]}).status_code == 200
+    assert revalidate(catalog, "/api/songs/", export.headers["ETag"]).status_code == 200
+    response = catalog.get("/api/songs/", headers={**ndjson, "If-None-Match": export.headers["ETag"]})
+    assert response.status_code == 304 and "Accept" in response.headers["Vary"]
+
+
+def test_large_bodies_are_gzipped_and_keep_their_etag(catalog):
+    catalog.post("/api/songs/bulk", json=[
+        {"song_id": song_id, "title": f"Filler song number {song_id}", "artist_id": 2, "release_date": "1994-03-14",
+         "duration": 180} for song_id in range(10, 60)])
+    plain = catalog.get("/api/songs/")
+    zipped = catalog.get("/api/songs/", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in zipped.headers["Vary"]
+    assert json.loads(gzip.decompress(zipped.get_data())) == plain.get_json()
+    assert zipped.headers["ETag"] == plain.headers["ETag"]
+    assert revalidate(catalog, "/api/songs/", zipped.headers["ETag"]).status_code == 304
+
+
+def test_small_bodies_are_not_compressed(catalog):
+    response = catalog.get("/api/albums/albums/1", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_streamed_exports_are_compressed(catalog):
+    response = catalog.get("/api/songs/?stream=1", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    assert len(lines) == 6
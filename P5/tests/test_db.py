@@ -0,0 +1,138 @@
+import threading
+import pytest
+import db
+import migrate
+import queries
+
+
+def make_pool(**options):
+    return db.ConnectionPool(db.connect_sqlite, **options)
+
+
+def test_checkout_reuses_released_connections(database):
+    pool = make_pool(max_size=2)
+    entry = pool.checkout()
+    conn = entry.conn
+    pool.release(entry)
+    again = pool.checkout()
+    assert again.conn is conn
+    pool.release(again)
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["in_use"] == 0 and stats["idle"] == 1
+
+
+def test_checkout_times_out_when_pool_is_exhausted(database):
+    pool = make_pool(max_size=1, checkout_timeout=0.05)
+    entry = pool.checkout()
+    with pytest.raises(db.PoolTimeout):
+        pool.checkout()
+    assert pool.stats()["timeouts"] == 1
+    pool.release(entry)
+    pool.release(pool.checkout())
+
+
+def test_waiter_gets_the_released_connection(database):
+    pool = make_pool(max_size=1, checkout_timeout=5)
+    entry = pool.checkout()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout()))
+    waiter.start()
+    pool.release(entry)
+    waiter.join(5)
+    assert got and got[0].conn is entry.conn
+    pool.release(got[0])
+
+
+def test_broken_connection_is_replaced(database):
+    pool = make_pool(max_size=1)
+    entry = pool.checkout()
+    broken = entry.conn
+    pool.release(entry)
+    broken.close()
+    entry = pool.checkout()
+    assert entry.conn is not broken
+    assert entry.conn.execute("SELECT 1").fetchone() == (1,)
+    assert pool.stats()["failed_health_checks"] == 1
+    pool.release(entry)
+
+
+def test_release_rolls_back_uncommitted_work(database):
+    pool = make_pool(max_size=1)
+    entry = pool.checkout()
+    entry.conn.execute("INSERT INTO Artists (artist_id, name) VALUES (1, 'Uncommitted')")
+    pool.release(entry)
+    assert database.execute("SELECT COUNT(*) FROM Artists").fetchone()[0] == 0
+
+
+def test_expired_idle_connections_are_evicted(database):
+    pool = make_pool(max_size=1, max_idle=0.01)
+    entry = pool.checkout()
+    first = entry.conn
+    pool.release(entry)
+    entry.last_used -= 1
+    entry = pool.checkout()
+    assert entry.conn is not first
+    assert pool.stats()["evicted"] == 1
+    pool.release(entry)
+
+
+def test_request_connection_is_returned_on_teardown(client):
+    assert client.get("/api/artists/").status_code == 200
+    stats = client.get("/api/db/stats").get_json()
+    assert stats["in_use"] == 0 and stats["idle"] == 1
+    assert stats["checkouts"] == 1
+
+
+def test_every_blueprint_shares_the_pool(catalog):
+    before = catalog.get("/api/db/stats").get_json()["checkouts"]
+    for url in ("/api/users", "/api/artists/", "/api/albums/albums", "/api/songs/",
+                "/api/playlists/playlists"):
+        assert catalog.get(url).status_code == 200, url
+    stats = catalog.get("/api/db/stats").get_json()
+    assert stats["created"] == 1 and stats["checkouts"] == before + 5
+
+
+def test_migrations_are_applied_once(database):
+    versions = [version for version, _, _ in migrate.discover("sqlite")]
+    assert all(applied for _, _, applied in migrate.status(database, "sqlite"))
+    assert migrate.migrate(database, "sqlite") == []
+    assert sorted(migrate.applied_versions(database)) == versions
+
+
+def test_dialect_specific_migrations_are_skipped(database):
+    names = [name for _, name, path in migrate.discover("sqlite")]
+    assert all(not path.endswith(".mssql.sql") for _, _, path in migrate.discover("sqlite"))
+    assert "covering_indexes" in names
+
+
+def test_split_batches_on_go():
+    assert migrate.split_batches("CREATE TABLE a (x INT);\nGO\n\nCREATE INDEX i ON a (x);\ngo\n") == [
+        "CREATE TABLE a (x INT);", "CREATE INDEX i ON a (x);"]
+
+
+def test_fetch_in_pads_to_a_fixed_size(catalog, database):
+    cursor = database.cursor()
+    rows = queries.fetch_in(cursor, "songs.by_ids", [1, 3, 5])
+    assert sorted(row.song_id for row in rows) == [1, 3, 5]
+    assert "?, ?, ?, ?)" in queries.STATEMENTS["songs.by_ids"].text(in_size=4)
+
+
+def test_fetch_in_chunks_long_id_lists(catalog, database):
+    ids = list(range(1, 1200))
+    rows = queries.fetch_in(database.cursor(), "songs.by_ids", ids)
+    assert sorted(row.song_id for row in rows) == [1, 2, 3, 4, 5, 6]
+
+
+def test_statements_are_registered_once():
+    with pytest.raises(ValueError):
+        queries.register("albums.get", "SELECT 1")
+
+
+def test_statement_counters(catalog):
+    catalog.get("/api/db/statements?reset=1")
+    catalog.get("/api/albums/albums/1")
+    entries = {entry["name"]: entry for entry in catalog.get("/api/db/statements").get_json()}
+    assert entries["albums.get"]["calls"] == 1
+    assert entries["albums.get"]["rows"] == 1
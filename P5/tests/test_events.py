@@ -0,0 +1,107 @@
+import json
+import events
+from events import EventBuffer
+
+
+def like(user_id, item_id, item_type="Song"):
+    return {"type": "like", "user_id": user_id, "item_id": item_id, "item_type": item_type}
+
+
+def play(user_id, song_id):
+    return {"type": "play", "user_id": user_id, "song_id": song_id}
+
+
+def test_events_are_written_on_flush(catalog, database):
+    response = catalog.post("/api/events/", json=[like(1, 5), like(1, 5), play(1, 5), play(2, 5), play(1, 6)])
+    assert response.status_code == 202
+    assert catalog.post("/api/events/flush").status_code == 200
+    assert database.execute("SELECT user_id, item_id FROM Likes").fetchall() == [(1, 5)]
+    assert dict(database.execute("SELECT song_id, plays FROM Play_Counts").fetchall()) == {5: 2, 6: 1}
+    assert catalog.get("/api/stats/songs/5/likes").get_json()["likes"] == 1
+    # A later flush adds to the existing counters
+    catalog.post("/api/events/", json=[play(3, 5)])
+    catalog.post("/api/events/flush")
+    assert dict(database.execute("SELECT song_id, plays FROM Play_Counts").fetchall()) == {5: 3, 6: 1}
+
+
+def test_song_likes_reach_followers_feeds(catalog):
+    catalog.post("/api/users/2/follows", json={"follow_id": 1, "followed_id": 1})
+    catalog.post("/api/events/", json=[like(1, 4)])
+    catalog.post("/api/events/flush")
+    feed = catalog.get("/api/users/2/feed").get_json()
+    assert [(activity["action"], activity["item_id"]) for activity in feed] == [("liked_song", 4)]
+
+
+def test_invalid_events_are_reported(catalog):
+    response = catalog.post("/api/events/", json=[play(1, 5), {"type": "skip"}, like(1, 1, "Album")])
+    assert response.status_code == 207
+    assert [error["index"] for error in response.get_json()["errors"]] == [1, 2]
+    assert catalog.post("/api/events/", json=[{"type": "skip"}]).status_code == 400
+
+
+def test_full_buffer_answers_503(catalog, monkeypatch):
+    monkeypatch.setattr(events, "buffer", EventBuffer(max_buffer=2))
+    monkeypatch.setattr("events_routes.buffer", events.buffer)
+    response = catalog.post("/api/events/", json=[play(1, 1), play(1, 2), play(1, 3)])
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+    events.buffer.stop()
+
+
+def test_a_bad_row_does_not_lose_the_batch(catalog, database, monkeypatch):
+    write = events.write_events
+
+    def rejecting(conn, batch):
+        if any(event[1] == 9 for event in batch):
+            raise RuntimeError("FOREIGN KEY constraint failed")
+        return write(conn, batch)
+
+    monkeypatch.setattr(events, "write_events", rejecting)
+    buffer = EventBuffer(flush_interval_ms=10)
+    buffer.submit([events.parse_event(event) for event in (like(9, 1), like(2, 1), play(2, 1))])
+    assert buffer.flush(5)
+    buffer.stop()
+    assert database.execute("SELECT user_id FROM Likes").fetchall() == [(2,)]
+    assert database.execute("SELECT plays FROM Play_Counts WHERE song_id = 1").fetchone() == (1,)
+    assert buffer.stats()["dropped"] == 1
+
+
+def test_client_chosen_ids_are_not_handed_out_again(catalog, database):
+    dropped = catalog.get("/api/events/stats").get_json()["dropped"]
+    assert catalog.post("/api/users/1/likes", json={"like_id": 1, "item_id": 1, "item_type": "Song"}).status_code == 201
+    assert catalog.post("/api/users/1/activity", json={"activity_id": 1, "action": "commented", "item_id": 1,
+                                                       "item_type": "Playlist"}).status_code == 201
+    catalog.post("/api/events/", json=[like(2, 4), like(3, 5)])
+    response = catalog.post("/api/events/flush")
+    assert response.status_code == 200
+    assert response.get_json()["dropped"] == dropped
+    assert database.execute("SELECT like_id, user_id FROM Likes ORDER BY like_id").fetchall() == [(1, 1), (2, 2), (3, 3)]
+    assert database.execute("SELECT COUNT(*) FROM Activity_Feed").fetchone()[0] == 3
+
+
+def test_the_allocator_catches_up_with_rows_written_around_it(catalog, database):
+    dropped = catalog.get("/api/events/stats").get_json()["dropped"]
+    database.execute("INSERT INTO Likes (like_id, user_id, item_id, item_type) VALUES (1, 1, 1, 'Song')")
+    database.commit()
+    catalog.post("/api/events/", json=[like(2, 4)])
+    assert catalog.post("/api/events/flush").get_json()["dropped"] == dropped
+    catalog.post("/api/events/", json=[like(3, 4)])
+    assert catalog.post("/api/events/flush").get_json()["dropped"] == dropped
+    assert database.execute("SELECT like_id, user_id FROM Likes ORDER BY like_id").fetchall() == [(1, 1), (2, 2), (3, 3)]
+
+
+def test_logged_events_are_replayed_after_a_crash(catalog, database, tmp_path):
+    # What a process that died after acknowledging two plays and writing the first leaves behind
+    (tmp_path / "events-99999.aof").write_text(
+        json.dumps([1, *events.parse_event(play(1, 2))]) + "\n" +
+        json.dumps([2, *events.parse_event(play(1, 3))]) + "\n" +
+        json.dumps([1]) + "\n" +
+        '[3, "pla')
+
+    restarted = EventBuffer(flush_interval_ms=10, aof_dir=str(tmp_path))
+    restarted.start()
+    assert restarted.stats()["replayed"] == 1
+    assert restarted.flush(5)
+    restarted.stop()
+    assert database.execute("SELECT song_id, plays FROM Play_Counts").fetchall() == [(3, 1)]
+    assert list(tmp_path.iterdir()) == []
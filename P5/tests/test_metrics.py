@@ -0,0 +1,34 @@
+import re
+import metrics
+from config import METRICS_CONFIG
+
+
+def test_server_timing_breaks_down_the_request(catalog):
+    timing = catalog.get("/api/songs/?limit=2").headers["Server-Timing"]
+    phases = [part.split(";")[0] for part in timing.split(", ")]
+    assert phases[-2:] == ["app", "total"]
+    assert {"db-checkout", "db-execute", "db-fetch", "serialize"} <= set(phases)
+    assert re.search(r'db-execute;dur=[\d.]+;desc="\d+ quer(y|ies)"', timing)
+
+
+def test_metrics_are_labelled_by_route_and_statement(catalog):
+    catalog.get("/api/playlists/playlists/1/songs")
+    text = catalog.get("/metrics").get_data(as_text=True)
+    assert 'route="/api/playlists/playlists/<int:playlist_id>/songs"' in text
+    assert 'statement="SELECT Playlists"' in text
+    assert "db_pool_checkouts " in text
+
+
+def test_statement_labels():
+    assert metrics.statement_label("SELECT * FROM Songs WHERE song_id = ?") == "SELECT Songs"
+    assert metrics.statement_label("  -- note\nINSERT INTO Likes VALUES (?)") == "INSERT Likes"
+    assert metrics.statement_label("UPDATE Playlists SET name = ?") == "UPDATE Playlists"
+
+
+def test_slow_queries_are_kept(catalog, monkeypatch):
+    monkeypatch.setitem(METRICS_CONFIG, "slow_query_ms", 0)
+    metrics.slow_queries.clear()
+    catalog.get("/api/albums/albums/1")
+    slow = catalog.get("/api/db/slow_queries").get_json()
+    assert slow and slow[0]["endpoint"] == "albums_routes.get_album_by_id"
+    assert slow[0]["statement"] == "SELECT Albums"
@@ -0,0 +1,65 @@
+import json
+
+
+def test_keyset_pages_follow_the_cursor(catalog):
+    first = catalog.get("/api/songs/?limit=4")
+    assert [song["song_id"] for song in first.get_json()] == [1, 2, 3, 4]
+    assert first.headers["X-Next-After"] == "4"
+    last = catalog.get("/api/songs/?limit=4&after=4")
+    assert [song["song_id"] for song in last.get_json()] == [5, 6]
+    assert "X-Next-After" not in last.headers
+
+
+def test_fields_are_projected_and_keep_the_cursor_column(catalog):
+    songs = catalog.get("/api/songs/?fields=title&limit=2").get_json()
+    assert songs == [{"song_id": 1, "title": "Bohemian Rhapsody"}, {"song_id": 2, "title": "Love of My Life"}]
+
+
+def test_filters_narrow_the_page(catalog):
+    songs = catalog.get("/api/songs/?artist_id=2&fields=song_id").get_json()
+    assert songs == [{"song_id": 5}, {"song_id": 6}]
+
+
+def test_bad_list_arguments_are_rejected(catalog):
+    assert catalog.get("/api/songs/?fields=password").status_code == 400
+    assert catalog.get("/api/songs/?limit=0").status_code == 400
+    assert catalog.get("/api/songs/?after=abc").status_code == 400
+    assert catalog.get("/api/songs/?artist_id=x").status_code == 400
+
+
+def test_other_list_endpoints_paginate(catalog):
+    users = catalog.get("/api/users?limit=2&fields=username")
+    assert users.get_json() == [{"user_id": 1, "username": "user1"}, {"user_id": 2, "username": "user2"}]
+    assert users.headers["X-Next-After"] == "2"
+    assert [artist["name"] for artist in catalog.get("/api/artists/").get_json()] == ["Queen", "Blur"]
+    playlists = catalog.get("/api/playlists/playlists?user_id=2").get_json()
+    assert [playlist["playlist_id"] for playlist in playlists] == [2]
+
+
+def test_ndjson_export_streams_every_row(catalog):
+    response = catalog.get("/api/songs/?stream=1&fields=title")
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["song_id"] for line in lines] == [1, 2, 3, 4, 5, 6]
+
+
+def test_ndjson_export_by_accept_header(catalog):
+    response = catalog.get("/api/artists/", headers={"Accept": "application/x-ndjson"})
+    assert response.mimetype == "application/x-ndjson"
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+
+
+def test_json_export_is_one_array(catalog):
+    response = catalog.get("/api/songs/?stream=json&artist_id=2")
+    assert [song["song_id"] for song in json.loads(response.get_data())] == [5, 6]
+    assert json.loads(catalog.get("/api/songs/?stream=json&artist_id=9").get_data()) == []
+
+
+def test_playlist_songs_embed_artist_and_album(catalog):
+    songs = catalog.get("/api/playlists/playlists/2/songs?limit=2")
+    assert songs.headers["X-Next-After"] == "14"
+    assert songs.get_json()[1] == {
+        "playlist_song_id": 14, "song_id": 4, "title": "Seaside Rendezvous", "release_date": "1975-11-21",
+        "duration": 124, "artist": {"artist_id": 1, "name": "Queen"},
+        "album": {"album_id": 1, "title": "A Night at the Opera"}}
+    assert catalog.get("/api/playlists/playlists/99/songs").status_code == 404
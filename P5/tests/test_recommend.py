@@ -0,0 +1,114 @@
+import time
+import recommend
+
+
+def wait_for_build(client, url):
+    deadline = time.monotonic() + 5
+    response = client.get(url)
+    while response.status_code == 503:
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+        response = client.get(url)
+    return response
+
+
+def similar_ids(client, song_id):
+    return [song["song_id"] for song in client.get(f"/api/songs/{song_id}/similar").get_json()["similar"]]
+
+
+def test_reads_answer_503_until_the_first_build(catalog):
+    response = catalog.get("/api/songs/1/similar")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert wait_for_build(catalog, "/api/songs/1/similar").status_code == 200
+    assert recommend.recommender.stats()["refreshing"] is False
+
+
+def test_similar_songs_share_playlists(catalog):
+    assert catalog.post("/api/songs/similar/rebuild").status_code == 200
+    assert sorted(similar_ids(catalog, 1)) == [2, 3]
+    # Song 3 is on both playlists
+    assert sorted(similar_ids(catalog, 3)) == [1, 2, 4, 5]
+    assert similar_ids(catalog, 6) == []
+    assert catalog.get("/api/songs/1/similar?limit=0").status_code == 400
+
+
+def test_recommendations_leave_out_the_users_own_songs(catalog):
+    catalog.post("/api/songs/similar/rebuild")
+    songs = catalog.get("/api/users/1/recommendations").get_json()["recommendations"]
+    assert sorted(song["song_id"] for song in songs) == [4, 5]
+
+
+def test_writes_update_the_matrix(catalog):
+    catalog.post("/api/songs/similar/rebuild")
+    catalog.post("/api/playlists/playlists/1/songs/bulk", json=[{"playlist_song_id": 50, "song_id": 6}])
+    assert 6 in similar_ids(catalog, 1)
+    catalog.post("/api/users/3/likes", json={"like_id": 1, "item_id": 6, "item_type": "Song"})
+    catalog.post("/api/users/3/likes", json={"like_id": 2, "item_id": 5, "item_type": "Song"})
+    assert 5 in similar_ids(catalog, 6)
+
+
+def test_deleted_songs_are_not_recommended(catalog):
+    catalog.post("/api/songs/similar/rebuild")
+    assert catalog.delete("/api/songs/2").status_code == 200
+    assert similar_ids(catalog, 1) == [3]
+    songs = catalog.get("/api/users/2/recommendations").get_json()["recommendations"]
+    assert 2 not in [song["song_id"] for song in songs]
+
+
+def test_a_like_during_a_rebuild_is_kept(catalog, database):
+    recommender = recommend.recommender
+
+    class LikeMidScan:
+        # Stands in for another request liking a song between the rebuild's scan and its swap
+        def __init__(self, conn):
+            self.conn = conn
+
+        def cursor(self):
+            cursor = self.conn.cursor()
+            execute = cursor.execute
+
+            class Cursor:
+                def execute(self, sql, *args):
+                    result = execute(sql, *args)
+                    if "Likes" in sql:
+                        recommender.add_like(3, 6)
+                        recommender.add_like(3, 1)
+                    return result
+
+                def fetchmany(self, size):
+                    return cursor.fetchmany(size)
+
+            return Cursor()
+
+    recommender.rebuild(LikeMidScan(database))
+    assert 1 in [other for other, _ in recommender.similar(6)]
+    # The journal is only kept while a rebuild runs
+    assert recommender._journal is None
+
+
+def test_repeated_likes_count_once(catalog):
+    catalog.post("/api/songs/similar/rebuild")
+    for like_id, song_id in enumerate((6, 1, 1), 1):
+        catalog.post("/api/users/3/likes", json={"like_id": like_id, "item_id": song_id, "item_type": "Song"})
+    similar = catalog.get("/api/songs/6/similar").get_json()["similar"]
+    assert similar == [{"song_id": 1, "score": 0.7071}]
+    # The rebuild's scan agrees with the incremental update
+    catalog.post("/api/songs/similar/rebuild")
+    assert catalog.get("/api/songs/6/similar").get_json()["similar"] == similar
+
+
+def test_deleted_playlists_and_users_leave_the_matrix(catalog):
+    catalog.post("/api/songs/similar/rebuild")
+    catalog.post("/api/users/3/likes", json={"like_id": 1, "item_id": 6, "item_type": "Song"})
+    catalog.post("/api/users/3/likes", json={"like_id": 2, "item_id": 1, "item_type": "Song"})
+    assert similar_ids(catalog, 6) == [1]
+    assert catalog.delete("/api/playlists/playlists/2").status_code == 200
+    assert sorted(similar_ids(catalog, 3)) == [1, 2]
+    assert similar_ids(catalog, 4) == []
+    assert catalog.delete("/api/users/3").status_code == 200
+    assert similar_ids(catalog, 6) == []
+    assert sorted(similar_ids(catalog, 1)) == [2, 3]
+    # User 2's only playlist is gone, so nothing seeds their recommendations
+    assert catalog.get("/api/users/2/recommendations").get_json()["recommendations"] == []
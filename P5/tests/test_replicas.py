@@ -0,0 +1,81 @@
+import uuid
+import pytest
+import db
+from config import REPLICA_CONFIG
+from conftest import create_database, memory_database
+
+
+def seed(conn, title):
+    conn.execute("INSERT INTO Artists (artist_id, name) VALUES (1, 'Queen')")
+    conn.execute("INSERT INTO Albums (album_id, title, artist_id) VALUES (1, ?, 1)", (title,))
+    conn.commit()
+
+
+@pytest.fixture
+def replica(database, monkeypatch):
+    """A second in-memory database registered as the only replica; album 1's title says which one answered."""
+    name = f"replica_{uuid.uuid4().hex}"
+    conn = create_database(name)
+    seed(database, "Primary")
+    seed(conn, "Replica")
+    monkeypatch.setitem(REPLICA_CONFIG, "replicas", [{"name": "r1", "DATABASE": memory_database(name)}])
+    db.configure_replicas()
+    yield conn
+    db.configure_replicas([])
+    conn.close()
+
+
+def batch_title(client):
+    return client.get("/api/batch/?albums=1").get_json()["albums"]["1"]["title"]
+
+
+def test_reads_go_to_the_replica(client, replica):
+    assert client.get("/api/albums/albums/1").get_json()["title"] == "Replica"
+    assert batch_title(client) == "Replica"
+    stats = client.get("/api/db/replicas").get_json()
+    assert stats[0]["name"] == "r1" and stats[0]["reads"] == 2
+
+
+def test_read_only_posts_use_the_replica(client, replica):
+    response = client.post("/api/batch/", json={"albums": [1]})
+    assert response.get_json()["albums"]["1"]["title"] == "Replica"
+    assert db.replicas[0].reads == 1
+
+
+def test_a_write_makes_the_clients_reads_sticky(client, replica):
+    response = client.put("/api/albums/albums/1", json={"title": "Written"})
+    assert response.status_code == 200
+    assert REPLICA_CONFIG["sticky_cookie"] in response.headers["Set-Cookie"]
+    assert batch_title(client) == "Written"
+    # Another client has not written, so it still reads the (lagging) replica
+    other = client.application.test_client()
+    assert batch_title(other) == "Replica"
+
+
+def test_failed_writes_are_not_sticky(client, replica):
+    response = client.put("/api/albums/albums/1", json=["not", "an", "object"])
+    assert response.status_code == 400
+    assert "Set-Cookie" not in response.headers
+    assert batch_title(client) == "Replica"
+
+
+def test_cache_is_filled_from_the_primary_after_an_invalidation(client, replica):
+    writer = client.application.test_client()
+    assert client.get("/api/albums/albums/1").get_json()["title"] == "Replica"
+    assert writer.put("/api/albums/albums/1", json={"title": "Written"}).status_code == 200
+    # The lagging replica would put the old title back into the shared cache
+    assert client.get("/api/albums/albums/1").get_json()["title"] == "Written"
+    assert client.get("/api/albums/albums/1").get_json()["title"] == "Written"
+
+
+def test_a_broken_replica_is_ejected(client, database, monkeypatch):
+    seed(database, "Primary")
+    monkeypatch.setitem(REPLICA_CONFIG, "eject_after", 2)
+    db.configure_replicas([{"name": "broken", "DATABASE": "/nonexistent/dir/replica.db"}])
+    try:
+        for _ in range(3):
+            assert batch_title(client) == "Primary"
+        stats = client.get("/api/db/replicas").get_json()[0]
+        assert stats["ejected"] and stats["ejections"] == 1 and stats["failures"] == 2
+    finally:
+        db.configure_replicas([])
@@ -0,0 +1,82 @@
+import time
+import search
+
+
+def hits(client, query, **args):
+    params = "&".join([f"q={query}"] + [f"{name}={value}" for name, value in args.items()])
+    return [(result["type"], result["id"]) for result in client.get(f"/api/search/?{params}").get_json()]
+
+
+def test_words_and_prefixes_match(catalog):
+    assert hits(catalog, "bohemian rhapsody") == [("song", 1)]
+    assert hits(catalog, "bohem rhap") == [("song", 1)]
+    assert hits(catalog, "rhapsody bohemian") == [("song", 1)]
+    assert hits(catalog, "bohemian polka") == []
+
+
+def test_exact_title_ranks_first(catalog):
+    catalog.post("/api/songs/", json={"song_id": 7, "title": "Parklife Revisited", "artist_id": 2,
+                                      "release_date": "2012-01-01", "duration": 200})
+    catalog.post("/api/songs/", json={"song_id": 8, "title": "Live at Parklife", "artist_id": 2,
+                                      "release_date": "2012-01-01", "duration": 200})
+    ranked = hits(catalog, "parklife")
+    assert set(ranked[:2]) == {("album", 2), ("song", 6)}
+    assert ranked[2:] == [("song", 7), ("song", 8)]
+    assert hits(catalog, "parklife", type="album") == [("album", 2)]
+    assert hits(catalog, "queen", type="artist,song") == [("artist", 1)]
+
+
+def test_single_letters_only_match_whole_words(catalog):
+    assert hits(catalog, "o") == []
+    assert ("song", 2) in hits(catalog, "of")
+
+
+def test_bad_arguments(catalog):
+    assert catalog.get("/api/search/").status_code == 400
+    assert catalog.get("/api/search/?q=x&type=genre").status_code == 400
+    assert catalog.get("/api/search/?q=x&limit=0").status_code == 400
+
+
+def test_writes_update_the_index(catalog):
+    catalog.post("/api/artists/", json={"artist_id": 3, "name": "Pulp"})
+    assert hits(catalog, "pulp") == [("artist", 3)]
+    catalog.put("/api/artists/3", json={"name": "Suede"})
+    assert hits(catalog, "pulp") == [] and hits(catalog, "suede") == [("artist", 3)]
+    response = catalog.post("/api/albums/albums", json={"album_id": 3, "title": "Coming Up", "artist_id": 3})
+    assert response.status_code == 201
+    assert hits(catalog, "coming") == [("album", 3)]
+    catalog.delete("/api/artists/2")
+    assert hits(catalog, "girls") == [] and hits(catalog, "blur") == []
+
+
+def test_rebuild_keeps_writes_made_during_the_scan(catalog, monkeypatch):
+    snapshot = search.versions.snapshot
+
+    def racing(cursor):
+        # Lands after the rebuild started but before its scan reads Songs
+        search.index.put("song", 77, "Killer Queen")
+        search.index.remove("song", 1)
+        return snapshot(cursor)
+
+    monkeypatch.setattr(search.versions, "snapshot", racing)
+    assert catalog.post("/api/search/rebuild").status_code == 200
+    monkeypatch.setattr(search.versions, "snapshot", snapshot)
+    assert ("song", 77) in hits(catalog, "killer")
+    assert hits(catalog, "bohemian") == []
+
+
+def test_other_workers_writes_are_picked_up(catalog, database, monkeypatch):
+    assert hits(catalog, "bohemian") == [("song", 1)]
+    # Another worker renames the song: the row and Table_Versions change, this process's index does not
+    database.execute("UPDATE Songs SET title = 'Bicycle Race' WHERE song_id = 1")
+    database.execute("UPDATE Table_Versions SET version = version + 1 WHERE name = 'Songs'")
+    database.commit()
+    assert hits(catalog, "bicycle") == []
+    monkeypatch.setitem(search.SEARCH_CONFIG, "refresh_seconds", 0)
+    # This search notices the new version and queues a rebuild; the next ones see its result
+    hits(catalog, "bicycle")
+    deadline = time.monotonic() + 5
+    while search.index._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert hits(catalog, "bicycle") == [("song", 1)]
+    assert hits(catalog, "bohemian") == []
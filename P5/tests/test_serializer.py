@@ -0,0 +1,55 @@
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+import pytest
+from serializer import OrjsonBackend, StdlibBackend, default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = [StdlibBackend()] + ([OrjsonBackend(orjson)] if orjson else [])
+needs_orjson = pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+
+FIELDS = ["id", "title", "note", "price", "released", "played_at", "length", "key", "tags", "live"]
+ROWS = [
+    (1, 'Say "Hi", Bye', None, decimal.Decimal("1.10"), date(1975, 11, 21), datetime(2024, 1, 2, 3, 4, 5),
+     time(0, 3, 21), uuid.UUID(int=1), ["a", "b,c"], True),
+    (2, "back\\slash", "x", decimal.Decimal("0"), None, datetime(2024, 1, 2, 3, 4, 5, 600), None,
+     uuid.UUID(int=2), [], False),
+    (3, "100% ünïcode,\n", None, None, date(2000, 1, 1), None, time(12, 0), None, None, None),
+]
+
+
+@pytest.mark.parametrize("backend", BACKENDS, ids=lambda backend: backend.name)
+def test_rows_are_encoded_like_dicts(backend):
+    want = [{field: json.loads(json.dumps(value, default=default)) for field, value in zip(FIELDS, row)}
+            for row in ROWS]
+    assert json.loads(backend.join_rows(FIELDS, ROWS, ",", "[", "]")) == want
+
+
+@needs_orjson
+def test_backends_agree():
+    stdlib, fast = BACKENDS
+    assert json.loads(stdlib.join_rows(FIELDS, ROWS, ",", "[", "]")) == \
+        json.loads(fast.join_rows(FIELDS, ROWS, ",", "[", "]"))
+
+
+@pytest.mark.parametrize("backend", BACKENDS, ids=lambda backend: backend.name)
+def test_ndjson_and_empty_rows(backend):
+    body = backend.join_rows(["id", "title"], [(1, "a"), (2, "b")], "\n", "", "\n")
+    assert body.splitlines() == [b'{"id":1,"title":"a"}', b'{"id":2,"title":"b"}']
+    assert backend.join_rows(["id"], [], ",", "[", "]") == b"[]"
+    # A field name with a % in it is not a template placeholder
+    assert json.loads(backend.join_rows(["100%s"], [(1,)], ",", "[", "]")) == [{"100%s": 1}]
+
+
+@needs_orjson
+def test_orjson_rows_span_chunks():
+    backend = OrjsonBackend(orjson)
+    backend.chunk_size = 2
+    rows = [(song_id, f"song {song_id}", None if song_id % 2 else song_id * 1.5) for song_id in range(5)]
+    decoded = json.loads(backend.join_rows(["id", "title", "score"], rows, ",", "[", "]"))
+    assert decoded == [{"id": a, "title": b, "score": c} for a, b, c in rows]
@@ -0,0 +1,140 @@
+import time
+import notifications
+from config import FEED_CONFIG
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def follow(client, follower_id, followed_id, follow_id=None):
+    return client.post(f"/api/users/{follower_id}/follows",
+                       json={"follow_id": follow_id or follower_id * 10 + followed_id, "followed_id": followed_id})
+
+
+def post_activity(client, user_id, activity_id, item_id, action="liked_song", item_type="Song"):
+    return client.post(f"/api/users/{user_id}/activity",
+                       json={"activity_id": activity_id, "action": action, "item_id": item_id, "item_type": item_type})
+
+
+def feed_ids(client, user_id, query=""):
+    return [activity["activity_id"] for activity in client.get(f"/api/users/{user_id}/feed{query}").get_json()]
+
+
+def test_activity_is_fanned_out_to_followers(catalog):
+    follow(catalog, 2, 1)
+    follow(catalog, 3, 1)
+    response = post_activity(catalog, 1, 1, 5)
+    assert response.status_code == 201
+    assert response.get_json()["timelines_updated"] == 2
+    assert feed_ids(catalog, 2) == [1]
+    assert feed_ids(catalog, 1) == []
+
+
+def test_feed_pages_newest_first(catalog):
+    follow(catalog, 2, 1)
+    for activity_id in (1, 2, 3):
+        post_activity(catalog, 1, activity_id, activity_id)
+    first = catalog.get("/api/users/2/feed?limit=2")
+    assert [activity["activity_id"] for activity in first.get_json()] == [3, 2]
+    assert feed_ids(catalog, 2, "?limit=2&before=" + first.headers["X-Next-Before"]) == [1]
+    assert catalog.get("/api/users/2/feed?before=garbage").status_code == 400
+
+
+def test_follow_backfills_and_unfollow_removes(catalog):
+    post_activity(catalog, 1, 1, 1)
+    assert follow(catalog, 2, 1).status_code == 201
+    assert follow(catalog, 2, 1, follow_id=99).status_code == 409
+    assert feed_ids(catalog, 2) == [1]
+    assert catalog.delete("/api/users/2/follows/1").status_code == 200
+    assert catalog.delete("/api/users/2/follows/1").status_code == 404
+    assert feed_ids(catalog, 2) == []
+
+
+def test_popular_authors_are_merged_on_read(catalog, monkeypatch):
+    monkeypatch.setitem(FEED_CONFIG, "fanout_limit", 1)
+    follow(catalog, 2, 1)
+    follow(catalog, 3, 1)
+    post_activity(catalog, 2, 1, 4)
+    follow(catalog, 3, 2)
+    assert post_activity(catalog, 1, 2, 5).get_json()["timelines_updated"] == 0
+    assert feed_ids(catalog, 3) == [2, 1]
+
+
+def test_activity_validation(catalog):
+    assert post_activity(catalog, 1, 1, 1, action="danced").status_code == 400
+    assert catalog.post("/api/users/1/activity", json={"action": "liked_song"}).status_code == 400
+
+
+def test_follow_and_playlist_like_notify_in_the_background(catalog):
+    follow(catalog, 2, 1)
+    catalog.post("/api/users/3/likes", json={"like_id": 1, "item_id": 1, "item_type": "Playlist"})
+    # Liking your own playlist notifies nobody
+    catalog.post("/api/users/1/likes", json={"like_id": 2, "item_id": 1, "item_type": "Playlist"})
+    wait_for(lambda: catalog.get("/api/users/1/notifications/unread_count").get_json()["unread"] == 2)
+    messages = [notification["message"] for notification in catalog.get("/api/users/1/notifications").get_json()]
+    assert messages == ["User 3 liked your playlist 1", "User 2 followed you"]
+
+    read = catalog.post("/api/users/1/notifications/read", json={})
+    assert read.get_json()["updated"] == 2
+    assert catalog.get("/api/users/1/notifications/unread_count").get_json()["unread"] == 0
+
+
+def test_notification_bursts_are_coalesced(catalog):
+    worker = notifications.NotificationWorker(flush_interval_ms=50)
+    for actor in (2, 3):
+        worker.enqueue(1, "Like", "playlist 1", actor)
+    worker.enqueue(1, "Like", "playlist 1", 1)
+    worker.stop()
+    assert worker.stats()["written"] == 1
+    messages = [notification["message"] for notification in catalog.get("/api/users/1/notifications").get_json()]
+    assert len(messages) == 1 and "playlist 1" in messages[0]
+
+
+def test_unread_counters_are_upserted(catalog, database):
+    database.execute("INSERT INTO Notification_Counts (user_id, unread) VALUES (2, 5)")
+    database.commit()
+    groups = notifications.coalesce([(1, "Follow", None, 2), (1, "Like", "playlist 1", 3), (2, "Follow", None, 1)])
+    assert notifications.write_notifications(database, groups) == 3
+    assert notifications.write_notifications(database, notifications.coalesce([(1, "Follow", None, 3)])) == 1
+    assert dict(database.execute("SELECT user_id, unread FROM Notification_Counts").fetchall()) == {1: 3, 2: 6}
+
+
+def test_notifications_survive_an_unavailable_pool(catalog, monkeypatch):
+    worker = notifications.NotificationWorker(flush_interval_ms=10, retry_seconds=0.05)
+    checkout = notifications.db.pool.checkout
+    failures = []
+
+    def flaky():
+        if len(failures) < 2:
+            failures.append(1)
+            raise notifications.db.PoolTimeout("no connection")
+        return checkout()
+
+    monkeypatch.setattr(notifications.db.pool, "checkout", flaky)
+    worker.enqueue(1, "Follow", None, 2)
+    wait_for(lambda: worker.stats()["written"] == 1)
+    worker.stop()
+    assert len(failures) == 2
+    assert catalog.get("/api/users/1/notifications/unread_count").get_json()["unread"] == 1
+
+
+def test_one_rejected_notification_does_not_lose_the_batch(catalog, monkeypatch):
+    worker = notifications.NotificationWorker(flush_interval_ms=50)
+    write = notifications.write_notifications
+
+    def rejecting(conn, groups):
+        if any(key[0] == 3 for key in groups):
+            raise RuntimeError("FOREIGN KEY constraint failed")
+        return write(conn, groups)
+
+    monkeypatch.setattr(notifications, "write_notifications", rejecting)
+    worker.enqueue(3, "Follow", None, 1)
+    worker.enqueue(2, "Follow", None, 1)
+    worker.stop()
+    assert worker.stats()["rejected"] == 1
+    assert catalog.get("/api/users/2/notifications/unread_count").get_json()["unread"] == 1
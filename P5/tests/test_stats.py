@@ -0,0 +1,25 @@
+def test_headline_counters_follow_writes(catalog):
+    assert catalog.get("/api/stats/").get_json() == {"artists": 2, "songs": 6, "average_duration": 123.5}
+    catalog.delete("/api/albums/albums/2")
+    assert catalog.get("/api/stats/").get_json() == {"artists": 2, "songs": 4, "average_duration": 122.5}
+    assert catalog.get("/api/stats/artists/count").get_json() == {"artists": 2}
+
+
+def test_shortest_songs(catalog):
+    stats = catalog.get("/api/stats/songs/duration").get_json()
+    assert stats["shortest_duration"] == 121
+    assert stats["shortest_songs"] == [{"song_id": 1, "title": "Bohemian Rhapsody"}]
+    catalog.delete("/api/songs/1")
+    assert catalog.get("/api/stats/songs/duration").get_json()["shortest_duration"] == 122
+
+
+def test_follower_and_like_counts(catalog):
+    for follower_id in (2, 3):
+        catalog.post(f"/api/users/{follower_id}/follows", json={"follow_id": follower_id, "followed_id": 1})
+    catalog.post("/api/users/2/likes", json={"like_id": 1, "item_id": 5, "item_type": "Song"})
+    assert catalog.get("/api/stats/users/1/followers").get_json()["followers"] == 2
+    assert catalog.get("/api/stats/users/followers?more_than=1").get_json() == [
+        {"user_id": 1, "username": "user1", "followers": 2}]
+    assert catalog.get("/api/stats/songs/5/likes").get_json()["likes"] == 1
+    catalog.delete("/api/users/3/follows/1")
+    assert catalog.get("/api/stats/users/1/followers").get_json()["followers"] == 1
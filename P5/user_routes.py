@@ -1,26 +1,40 @@
-import pyodbc
 from flask import Blueprint, jsonify, request
-from config import DB_CONFIG  
+import queries
+from db import get_db_connection, advance_ids
+from pagination import parse_list_args, fetch_page, rows_response, DEFAULT_LIMIT, MAX_LIMIT
+from streaming import stream_format, stream_rows
+from bulk import parse_bulk_body, run_bulk_insert
+from cascade import delete_response
+from config import FEED_CONFIG, RECOMMEND_CONFIG
+from feed import ACTIONS, ITEM_TYPES, record_activity, follow, unfollow, read_feed, parse_cursor
+from notifications import notifier, unread_count, mark_read
+import recommend
 
 api = Blueprint('api', __name__)  
 
-def get_db_connection():
-    return pyodbc.connect(
-        f"DRIVER={{{DB_CONFIG['DRIVER']}}};SERVER={DB_CONFIG['SERVER']};"
-        f"DATABASE={DB_CONFIG['DATABASE']};UID={DB_CONFIG['UID']};PWD={DB_CONFIG['PWD']}"
-    )
+# password is deliberately not selectable
+USER_COLUMNS = ["user_id", "username", "email", "profile_picture", "bio", "permission"]
+USER_DEFAULT_FIELDS = ["user_id", "username", "email"]
 
-# GET: Fetch all users
+# GET: Fetch users, one keyset page at a time (?after=<user_id>&limit=N&fields=...)
 @api.route("/users", methods=["GET"])
 def get_users():
+    try:
+        list_args = parse_list_args(request.args, USER_COLUMNS, default_fields=USER_DEFAULT_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Users")
-        users = cursor.fetchall()
-        conn.close()
 
-        return jsonify([{"user_id": user[0], "username": user[1], "email": user[2]} for user in users])
+        fmt = stream_format(request)
+        if fmt:
+            limit = list_args.limit if "limit" in request.args else None
+            return stream_rows(cursor, "Users", list_args, fmt, limit)
+
+        users, next_after = fetch_page(cursor, "Users", list_args)
+        return rows_response(list_args.fields, users, next_after)
     except Exception as e:
         return jsonify({"error": f"Database connection error: {e}"}), 500
 
@@ -36,20 +50,41 @@ def create_user():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Users (user_id, username, email, password, profile_picture, bio, permission) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        queries.run(
+            cursor, "users.insert",
             (data["user_id"], data["username"], data["email"], data["password"], 
              data.get("profile_picture"), data.get("bio"), data.get("permission", "user"))
         )
         conn.commit()
-        conn.close()
 
         return jsonify({"message": "User added successfully"}), 201
     except Exception as e:
         return jsonify({"error": f"Failed to add user: {e}"}), 500
 
 
+def bulk_user_params(data):
+    return (int(data["user_id"]), data["username"], data["email"], data["password"],
+            data.get("profile_picture"), data.get("bio"), data.get("permission", "user"))
+
+
+# POST: Add many users at once (JSON array or NDJSON body)
+@api.route("/users/bulk", methods=["POST"])
+def create_users_bulk():
+    try:
+        rows = parse_bulk_body(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db_connection()
+        report, status = run_bulk_insert(
+            conn, rows, "users.insert", bulk_user_params
+        )
+        return jsonify(report), status
+    except Exception as e:
+        return jsonify({"error": f"Failed to add users: {e}"}), 500
+
+
 # PUT: Update a user
 @api.route("/users/<int:user_id>", methods=["PUT"])
 def update_user(user_id):
@@ -57,12 +92,8 @@ def update_user(user_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Users SET username = ?, email = ? WHERE user_id = ?",
-            (data["username"], data["email"], user_id)
-        )
+        queries.run(cursor, "users.update", (data["username"], data["email"], user_id))
         conn.commit()
-        conn.close()
         return jsonify({"message": "User updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Failed to update user: {e}"}), 500
@@ -72,38 +103,176 @@ def update_user(user_id):
 def delete_user(user_id):
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
+        return delete_response(conn, "Users", user_id, "User and related records deleted successfully",
+                               [f"user:{user_id}"], recommend.CASCADE_COLLECT, [recommend.remove_cascaded])
+    except Exception as e:
+        return jsonify({"error": f"Failed to delete user: {e}"}), 500
 
-        # Delete related records in Likes table
-        cursor.execute("DELETE FROM Likes WHERE user_id = ?", user_id)
 
-        # Delete related records in Follows table
-        cursor.execute("DELETE FROM Follows WHERE follower_id = ? OR followed_id = ?", user_id, user_id)
+# GET: Activity of everyone the user follows, newest first (?before=<cursor>&limit=N)
+@api.route("/users/<int:user_id>/feed", methods=["GET"])
+def get_feed(user_id):
+    try:
+        before = parse_cursor(request.args.get("before"))
+        limit = int(request.args.get("limit", FEED_CONFIG["default_limit"]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if limit < 1 or limit > FEED_CONFIG["max_limit"]:
+        return jsonify({"error": f"limit must be between 1 and {FEED_CONFIG['max_limit']}"}), 400
 
-        # Delete related records in Activity_Feed table
-        cursor.execute("DELETE FROM Activity_Feed WHERE user_id = ?", user_id)
+    try:
+        conn = get_db_connection()
+        activities, next_before = read_feed(conn, user_id, before, limit)
+        response = jsonify(activities)
+        if next_before:
+            response.headers["X-Next-Before"] = next_before
+        return response
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch feed: {e}"}), 500
 
-        # Delete related records in Playlist_Songs table
-        cursor.execute("DELETE FROM Playlist_Songs WHERE playlist_id IN (SELECT playlist_id FROM Playlists WHERE user_id = ?)", user_id)
 
-        # Delete related records in Playlists table
-        cursor.execute("DELETE FROM Playlists WHERE user_id = ?", user_id)
+# POST: Record an activity and fan it out to the user's followers
+@api.route("/users/<int:user_id>/activity", methods=["POST"])
+def create_activity(user_id):
+    data = request.get_json()
+    if not data or "activity_id" not in data or "item_id" not in data:
+        return jsonify({"error": "activity_id, action, item_id and item_type are required"}), 400
+    if data.get("action") not in ACTIONS or data.get("item_type") not in ITEM_TYPES:
+        return jsonify({"error": f"action must be one of {ACTIONS} and item_type one of {ITEM_TYPES}"}), 400
 
-        # Delete related records in Comments table
-        cursor.execute("DELETE FROM Comments WHERE user_id = ?", user_id)
+    try:
+        conn = get_db_connection()
+        fanned_out = record_activity(conn, data["activity_id"], user_id, data["action"],
+                                     data["item_id"], data["item_type"])
+        if data["action"] == "commented" and data["item_type"] == "Playlist":
+            notify_playlist_owner(conn, data["item_id"], "Comment", user_id)
+        return jsonify({"message": "Activity recorded", "timelines_updated": fanned_out}), 201
+    except Exception as e:
+        return jsonify({"error": f"Failed to record activity: {e}"}), 500
 
-        # Delete related records in Notifications table
-        cursor.execute("DELETE FROM Notifications WHERE user_id = ?", user_id)
 
-        # Delete related records in Reports table
-        cursor.execute("DELETE FROM Reports WHERE user_id = ?", user_id)
+# POST: Follow another user
+@api.route("/users/<int:user_id>/follows", methods=["POST"])
+def create_follow(user_id):
+    data = request.get_json()
+    if not data or "follow_id" not in data or "followed_id" not in data:
+        return jsonify({"error": "follow_id and followed_id are required"}), 400
 
-        # Now delete the user from the Users table
-        cursor.execute("DELETE FROM Users WHERE user_id = ?", user_id)
+    try:
+        conn = get_db_connection()
+        if not follow(conn, data["follow_id"], user_id, data["followed_id"]):
+            return jsonify({"error": "Already following"}), 409
+        notifier.enqueue(data["followed_id"], "Follow", None, user_id)
+        return jsonify({"message": "Followed successfully"}), 201
+    except Exception as e:
+        return jsonify({"error": f"Failed to follow user: {e}"}), 500
+
+
+# DELETE: Unfollow a user
+@api.route("/users/<int:user_id>/follows/<int:followed_id>", methods=["DELETE"])
+def delete_follow(user_id, followed_id):
+    try:
+        conn = get_db_connection()
+        if not unfollow(conn, user_id, followed_id):
+            return jsonify({"error": "Not following"}), 404
+        return jsonify({"message": "Unfollowed successfully"}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to unfollow user: {e}"}), 500
 
+
+def notify_playlist_owner(conn, playlist_id, notification_type, actor):
+    playlist = queries.fetch_one(conn.cursor(), "playlists.owner", (playlist_id,))
+    if playlist:
+        notifier.enqueue(playlist.user_id, notification_type, f"playlist {playlist_id}", actor)
+
+
+# POST: Like a song or playlist (the playlist owner is notified in the background)
+@api.route("/users/<int:user_id>/likes", methods=["POST"])
+def create_like(user_id):
+    data = request.get_json()
+    if not data or "like_id" not in data or "item_id" not in data:
+        return jsonify({"error": "like_id, item_id and item_type are required"}), 400
+    if data.get("item_type") not in ("Song", "Playlist"):
+        return jsonify({"error": "item_type must be Song or Playlist"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        advance_ids(cursor, "Likes", int(data["like_id"]))
+        queries.run(
+            cursor, "users.like",
+            (data["like_id"], user_id, data["item_id"], data["item_type"])
+        )
         conn.commit()
-        conn.close()
+        if data["item_type"] == "Playlist":
+            notify_playlist_owner(conn, data["item_id"], "Like", user_id)
+        else:
+            recommend.recommender.add_like(user_id, int(data["item_id"]))
+        return jsonify({"message": "Like added successfully"}), 201
+    except Exception as e:
+        return jsonify({"error": f"Failed to add like: {e}"}), 500
+
+
+# GET: Songs for a user, from the neighbours of their recently liked and playlisted songs (?limit=N)
+@api.route("/users/<int:user_id>/recommendations", methods=["GET"])
+def get_recommendations(user_id):
+    try:
+        limit = int(request.args.get("limit", RECOMMEND_CONFIG["default_limit"]))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1 or limit > RECOMMEND_CONFIG["max_limit"]:
+        return jsonify({"error": f"limit must be between 1 and {RECOMMEND_CONFIG['max_limit']}"}), 400
 
-        return jsonify({"message": "User and related records deleted successfully"}), 200
+    try:
+        if not recommend.ensure_fresh():
+            return recommend.building_response()
+        songs = recommend.recommender.recommend(user_id, limit)
+        return jsonify({"user_id": user_id,
+                        "recommendations": [{"song_id": song_id, "score": score} for song_id, score in songs]})
     except Exception as e:
-        return jsonify({"error": f"Failed to delete user: {e}"}), 500
+        return jsonify({"error": f"Failed to fetch recommendations: {e}"}), 500
+
+
+# GET: Unread notification count, read from the maintained counter
+@api.route("/users/<int:user_id>/notifications/unread_count", methods=["GET"])
+def get_unread_count(user_id):
+    try:
+        conn = get_db_connection()
+        return jsonify({"user_id": user_id, "unread": unread_count(conn, user_id)})
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch unread count: {e}"}), 500
+
+
+# GET: A user's notifications, newest first (?before=<notification_id>&limit=N)
+@api.route("/users/<int:user_id>/notifications", methods=["GET"])
+def get_notifications(user_id):
+    try:
+        before = int(request.args["before"]) if request.args.get("before") else None
+        limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "before and limit must be integers"}), 400
+    if limit < 1 or limit > MAX_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MAX_LIMIT}"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        if before is not None:
+            notifications = queries.fetch_all(cursor, "users.notifications_before", (user_id, before), limit=limit)
+        else:
+            notifications = queries.fetch_all(cursor, "users.notifications", (user_id,), limit=limit)
+        return jsonify([notification._asdict() for notification in notifications])
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch notifications: {e}"}), 500
+
+
+# POST: Mark notifications read ({"notification_ids": [...]} or an empty body for all)
+@api.route("/users/<int:user_id>/notifications/read", methods=["POST"])
+def read_notifications(user_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        conn = get_db_connection()
+        changed = mark_read(conn, user_id, data.get("notification_ids"))
+        return jsonify({"message": "Notifications marked read", "updated": changed}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to mark notifications read: {e}"}), 500
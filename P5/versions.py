@@ -0,0 +1,64 @@
+import hashlib
+from functools import wraps
+from flask import Response, g, jsonify, request
+import queries
+from db import get_db_connection
+from streaming import stream_format
+
+# Tables with a row in Table_Versions (migration 0006)
+VERSIONED_TABLES = ("Songs", "Artists", "Albums")
+
+
+def bump(cursor, *tables):
+    """Advance the version of every tracked table among tables. Runs in the caller's transaction."""
+    bumped = [table for table in tables if table in VERSIONED_TABLES]
+    for table in bumped:
+        queries.run(cursor, "table_versions.bump", (table,))
+    return bumped
+
+
+def current(cursor, table):
+    row = queries.fetch_one(cursor, "table_versions.get", (table,))
+    return row.version if row else 0
+
+
+def snapshot(cursor):
+    """{table: version} for every tracked table, in one read."""
+    return {row.name: row.version for row in queries.fetch_all(cursor, "table_versions.all")}
+
+
+def versioned(table):
+    """ETag / 304 Not Modified for a GET view whose body depends only on table and the query string.
+
+    The ETag hashes the table's version with the request's path and
+    arguments and the response format (a JSON page, or a JSON or NDJSON
+    export, which Accept can choose), so a client holding a current one
+    gets a 304 after one primary-key read, before the list query runs. The version is left in
+    g.table_version so @cached entries are keyed by it as well. ETags are
+    weak because the same body may go out gzip- or brotli-encoded.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                version = current(get_db_connection().cursor(), table)
+            except Exception as e:
+                return jsonify({"error": f"Failed to read {table} version: {e}"}), 500
+
+            g.table_version = version
+            query = "&".join(f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+            fmt = stream_format(request) or "page"
+            etag = hashlib.sha1(f"{table}:{version}:{fmt}:{request.path}?{query}".encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.vary.add("Accept")
+            # Cacheable, but only after revalidating against the current version
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
+    return decorator